@@ -1,12 +1,20 @@
 import argparse
 import os
 import sys
-from pathlib import Path
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 import colorama
-from colorama import Fore, Style, Back
+from colorama import Fore, Style
 
-from app.controller.convert import ImageFormatConverter
+# tqdm, the cache, the manifest and the size model are imported where they are used:
+# a single-file run pays only for the modules its options need
+from app.controller.backends import AUTO_BACKEND, DEFAULT_BACKEND, get_backend, parse_backend_spec
+from app.controller.convert import DEFAULT_OUTPUT_DIR, DEFAULT_PYRAMID_WIDTHS, ImageFormatConverter
+from app.controller.options import ConverterOptions
+from app.controller.presets import PRESETS
+from app.controller.resample import DEFAULT_TIER, RESAMPLE_TIERS
+from app.controller.batch import EXECUTION_MODES, resolve_workers
+from app.controller.stats import StatsAccumulator
+from app.controller.writer import DEFAULT_DURABILITY, DURABILITY_MODES, OutputWriter
 
 # Initialize colorama for colored output
 colorama.init()
@@ -38,6 +46,11 @@ def print_info(message):
     """Print info message"""
     print(f"{Fore.CYAN}ℹ {message}{Style.RESET_ALL}")
 
+def progress_bar(**kwargs):
+    """Create a tqdm progress bar, importing tqdm on first use"""
+    from tqdm import tqdm
+    return tqdm(**kwargs)
+
 def validate_input_path(path):
     """Validate input path exists"""
     if not os.path.exists(path):
@@ -67,12 +80,67 @@ def format_file_size(size_bytes):
     
     return f"{size_bytes:.2f} {size_names[i]}"
 
-def print_statistics(results):
-    """Print conversion statistics in a beautiful format"""
-    successful = [r for r in results if r.get("success")]
-    failed = [r for r in results if not r.get("success")]
+def parse_size(value):
+    """Parse a human readable size such as 500M or 2G into bytes"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    text = value.strip().upper().rstrip("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r} (use e.g. 500M, 2G)")
+
+OUTPUT_FORMATS = ("jpeg", "jpg", "png", "webp", "avif", "bmp", "tiff", "gif")
+
+def parse_formats(value):
+    """Parse a comma-separated list of output formats such as webp,avif,jpeg"""
+    formats = [fmt.strip().lower() for fmt in value.split(",") if fmt.strip()]
+    invalid = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if not formats or invalid:
+        raise argparse.ArgumentTypeError(
+            f"invalid format: {value!r} (choose from {', '.join(OUTPUT_FORMATS)}, comma-separated)"
+        )
+    # Bỏ trùng nhưng giữ thứ tự
+    return list(dict.fromkeys(formats))
+
+def parse_backend(value):
+    """Parse --backend: a backend name, auto, or per-format choices such as webp:vips,jpeg:pillow"""
+    try:
+        choices = parse_backend_spec(value)
+        for name in set(choices.values()) - {AUTO_BACKEND}:
+            get_backend(name)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+def parse_widths(value):
+    """Parse pyramid widths such as 320,640,1024,original ("original" keeps the source width)"""
+    widths = []
+    for item in value.split(","):
+        item = item.strip().lower()
+        if item == "original":
+            widths.append(None)
+            continue
+        try:
+            width = int(item.rstrip("w"))
+        except ValueError:
+            width = 0
+        if width <= 0:
+            raise argparse.ArgumentTypeError(f"invalid width: {item!r} (use e.g. 320,640,1024,original)")
+        widths.append(width)
+    return tuple(widths)
+
+def job_format(formats):
+    """A single format is passed through as-is, several formats become one decode-once job per file"""
+    return formats[0] if len(formats) == 1 else formats
+
+def print_statistics(stats):
+    """Print conversion statistics in a beautiful format
     
-    if not results:
+    :param stats: StatsAccumulator filled while the results were streaming in
+    """
+    if not stats.total_files:
         print_warning("No files processed")
         return
     
@@ -80,45 +148,50 @@ def print_statistics(results):
     print(f"{Fore.CYAN}                           CONVERSION RESULTS")
     print(f"{Fore.CYAN}{'='*80}{Style.RESET_ALL}")
     
-    print(f"{Fore.BLUE}Total files:{Style.RESET_ALL} {len(results)}")
-    print(f"{Fore.GREEN}Successful:{Style.RESET_ALL} {len(successful)}")
-    print(f"{Fore.RED}Failed:{Style.RESET_ALL} {len(failed)}")
+    print(f"{Fore.BLUE}Total files:{Style.RESET_ALL} {stats.total_files}")
+    print(f"{Fore.GREEN}Successful:{Style.RESET_ALL} {stats.successful}")
+    print(f"{Fore.RED}Failed:{Style.RESET_ALL} {stats.failed}")
     
-    if successful:
-        # Phân loại files theo loại thay đổi
-        compressed_files = [r for r in successful if r.get("change_type") == "compressed"]
-        expanded_files = [r for r in successful if r.get("change_type") == "expanded"]
-        unchanged_files = [r for r in successful if r.get("change_type") == "unchanged"]
-        
-        total_original = sum(r["original_size"] for r in successful)
-        total_new = sum(r["new_size"] for r in successful)
-        
+    if stats.successful:
         print(f"\n{Fore.CYAN}📊 SIZE STATISTICS:{Style.RESET_ALL}")
-        print(f"{Fore.BLUE}Original size:{Style.RESET_ALL} {format_file_size(total_original)}")
-        print(f"{Fore.BLUE}New size:{Style.RESET_ALL} {format_file_size(total_new)}")
+        print(f"{Fore.BLUE}Original size:{Style.RESET_ALL} {format_file_size(stats.total_original_size)}")
+        print(f"{Fore.BLUE}New size:{Style.RESET_ALL} {format_file_size(stats.total_new_size)}")
         
         # Hiển thị thông tin compression
-        if compressed_files:
-            total_saved = sum(r.get("space_change", 0) for r in compressed_files)
-            avg_compression = sum(r["compression_ratio"] for r in compressed_files) / len(compressed_files)
-            print(f"{Fore.GREEN}📉 Compressed files:{Style.RESET_ALL} {len(compressed_files)}")
-            print(f"{Fore.GREEN}💾 Space saved:{Style.RESET_ALL} {format_file_size(total_saved)}")
-            print(f"{Fore.YELLOW}📊 Average compression:{Style.RESET_ALL} {avg_compression:.2f}%")
+        if stats.compressed_files:
+            print(f"{Fore.GREEN}📉 Compressed files:{Style.RESET_ALL} {stats.compressed_files}")
+            print(f"{Fore.GREEN}💾 Space saved:{Style.RESET_ALL} {format_file_size(stats.total_space_saved)}")
+            print(f"{Fore.YELLOW}📊 Average compression:{Style.RESET_ALL} {stats.average_compression:.2f}%")
         
         # Hiển thị thông tin expansion
-        if expanded_files:
-            total_increased = sum(r.get("space_change", 0) for r in expanded_files)
-            print(f"{Fore.YELLOW}📈 Expanded files:{Style.RESET_ALL} {len(expanded_files)}")
-            print(f"{Fore.YELLOW}📈 Space increased:{Style.RESET_ALL} {format_file_size(total_increased)}")
+        if stats.expanded_files:
+            print(f"{Fore.YELLOW}📈 Expanded files:{Style.RESET_ALL} {stats.expanded_files}")
+            print(f"{Fore.YELLOW}📈 Space increased:{Style.RESET_ALL} {format_file_size(stats.total_space_increased)}")
         
         # Hiển thị files không thay đổi
-        if unchanged_files:
-            print(f"{Fore.BLUE}➡️ Unchanged files:{Style.RESET_ALL} {len(unchanged_files)}")
+        if stats.unchanged_files:
+            print(f"{Fore.BLUE}➡️ Unchanged files:{Style.RESET_ALL} {stats.unchanged_files}")
+        
+        if stats.skipped_files:
+            print(f"{Fore.BLUE}⏭️ Up to date (skipped):{Style.RESET_ALL} {stats.skipped_files}")
+        
+        # Cache
+        if stats.cache_hits or stats.cache_misses:
+            lookups = stats.cache_hits + stats.cache_misses
+            print(f"{Fore.BLUE}♻️ Cache:{Style.RESET_ALL} {stats.cache_hits} hits, {stats.cache_misses} misses "
+                  f"({stats.cache_hits / lookups * 100:.1f}% hit rate)")
+        
+        # Target size search
+        if stats.encoded_to_target:
+            print(f"{Fore.BLUE}🎯 Encodes per file:{Style.RESET_ALL} {stats.average_encode_trials:.2f}")
+        if stats.predicted_files:
+            print(f"{Fore.BLUE}🎯 Size prediction error:{Style.RESET_ALL} {stats.average_prediction_error:.1f}% "
+                  f"({stats.predicted_files} files)")
+        
+        print_timings(stats.timings)
         
         # Tổng kết
-        total_saved = sum(r.get("space_change", 0) for r in compressed_files)
-        total_increased = sum(r.get("space_change", 0) for r in expanded_files)
-        net_change = total_saved - total_increased
+        net_change = stats.net_change
         
         print(f"\n{Fore.CYAN}📋 SUMMARY:{Style.RESET_ALL}")
         if net_change > 0:
@@ -128,14 +201,35 @@ def print_statistics(results):
         else:
             print_info("No net change in space")
     
-    if failed:
+    if stats.failed_results:
         print(f"\n{Fore.RED}{'='*50}")
         print(f"{Fore.RED}FAILED FILES:")
         print(f"{Fore.RED}{'='*50}{Style.RESET_ALL}")
-        for result in failed:
+        for result in stats.failed_results:
             filename = os.path.basename(result.get('input_path', 'Unknown'))
             error = result.get('error', 'Unknown error')
             print_error(f"{filename}: {error}")
+        if stats.omitted_failures:
+            print_error(f"... and {stats.omitted_failures} more")
+
+def print_timings(timings):
+    """Print per-stage totals and percentiles of a TimingStats"""
+    rows = timings.rows()
+    if not rows:
+        return
+    
+    print(f"\n{Fore.CYAN}⏱️ STAGE TIMINGS:{Style.RESET_ALL}")
+    print(f"{'Stage':<14}{'Count':>7}{'Total':>12}{'p50':>10}{'p90':>10}{'p99':>10}{'Max':>10}")
+    for stage, summary in rows:
+        print(f"{Fore.BLUE}{stage:<14}{Style.RESET_ALL}{summary['count']:>7}{format_duration(summary['total_ms']):>12}"
+              f"{format_duration(summary['p50']):>10}{format_duration(summary['p90']):>10}"
+              f"{format_duration(summary['p99']):>10}{format_duration(summary['max_ms']):>10}")
+
+def format_duration(ms):
+    """Format a duration given in milliseconds"""
+    if ms >= 1000:
+        return f"{ms / 1000:.2f} s"
+    return f"{ms:.1f} ms"
 
 def convert_single_file(args, converter):
     """Convert a single file"""
@@ -147,26 +241,62 @@ def convert_single_file(args, converter):
         print_error(f"'{input_file}' is not a file")
         sys.exit(1)
     
-    # Determine output path
-    output_path = None
+    # Determine output paths
+    output_paths = [None] * len(args.format)
     if args.output:
         validate_output_path(args.output)
         base = os.path.splitext(os.path.basename(input_file))[0]
-        output_path = os.path.join(args.output, f"{base}.{args.format}")
+        output_paths = [os.path.join(args.output, f"{base}.{fmt}") for fmt in args.format]
     
     print_info(f"Converting: {os.path.basename(input_file)}")
     
-    # Convert with progress
-    with tqdm(total=1, desc="Converting", unit="file") as pbar:
-        # Map jpg to jpeg for PIL compatibility
-        output_format = "jpeg" if args.format == "jpg" else args.format
-        result = converter.convert(input_file, output_format, output_path=output_path)
-        pbar.update(1)
+    if args.pyramid or args.deepzoom:
+        results = convert_layout(args, converter, input_file, args.output)
+        record_metrics(converter, results)
+        for result in results:
+            if result.get("width"):
+                print_info(f"Level {result['width']}w:")
+            print_file_result(result)
+            if result.get("tiles"):
+                print_info(f"Deep Zoom: {result['tiles']} tiles in {result['levels']} levels")
+        if not all(result["success"] for result in results):
+            sys.exit(1)
+        return
+    
+    # Map jpg to jpeg for PIL compatibility
+    output_formats = ["jpeg" if fmt == "jpg" else fmt for fmt in args.format]
+    # The image is decoded and resized once, then encoded to every format
+    results = converter.convert_formats(input_file, output_formats, output_paths)
+    record_metrics(converter, results)
+    
+    for result in results:
+        print_file_result(result)
     
+    if not all(result["success"] for result in results):
+        sys.exit(1)
+
+def record_metrics(converter, results):
+    """Record results that did not go through the batch engine (which records its own) in --metrics-file"""
+    if converter.metrics is not None:
+        for result in results:
+            converter.metrics.observe(result)
+
+def print_file_result(result):
+    """Print the outcome of a single conversion"""
     if result["success"]:
         print_success(f"Converted successfully!")
         print_info(f"Output: {result['output_path']}")
         print_info(f"Size: {format_file_size(result['original_size'])} → {format_file_size(result['new_size'])}")
+        if result.get("frames"):
+            print_info(f"Frames: {result['frames']}")
+        if result.get("timings"):
+            stages = ", ".join(f"{stage} {ms:.1f}" for stage, ms in result["timings"].items())
+            print_info(f"Timings (ms): {stages}")
+        # Chỉ liệt kê từng lần encode khi phải thử nhiều quality
+        encodes = result.get("encode_timings", [])
+        if len(encodes) > 1:
+            for trial in encodes:
+                print_info(f"  encode q{trial['quality']}: {format_duration(trial['ms'])} → {format_file_size(trial['bytes'])}")
         
         # Hiển thị thông tin theo loại thay đổi
         change_type = result.get("change_type", "unknown")
@@ -182,7 +312,6 @@ def convert_single_file(args, converter):
             print_info(f"Compression ratio: {result['compression_ratio']:.2f}%")
     else:
         print_error(f"Conversion failed: {result['error']}")
-        sys.exit(1)
 
 def convert_folder(args, converter):
     """Convert all images in a folder"""
@@ -198,49 +327,29 @@ def convert_folder(args, converter):
     
     print_info(f"Scanning folder: {input_folder}")
     
-    # Get all image files
-    image_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.avif', '.bmp', '.tiff', '.gif')
-    image_files = []
-    
-    if args.recursive:
-        for root, _, files in os.walk(input_folder):
-            for file in files:
-                if file.lower().endswith(image_extensions):
-                    image_files.append(os.path.join(root, file))
-    else:
-        for file in os.listdir(input_folder):
-            if file.lower().endswith(image_extensions):
-                image_files.append(os.path.join(input_folder, file))
+    manifest = None
+    if args.incremental or args.manifest:
+        from app.controller.manifest import DEFAULT_MANIFEST_NAME, ConversionManifest
+        manifest_path = args.manifest or os.path.join(args.output or input_folder, DEFAULT_MANIFEST_NAME)
+        manifest = ConversionManifest(manifest_path)
+        print_info(f"Incremental mode, manifest: {manifest_path}" + (" (--force: converting everything)" if args.force else ""))
+    
+    # Files are discovered lazily, so conversion starts before the scan finishes
+    # Without -o, outputs go to "convert" subfolders that must not be picked up again
+    exclude_dirs = () if args.output else (DEFAULT_OUTPUT_DIR,)
+    image_files = converter.iter_folder(input_folder, recursive=args.recursive, exclude_dirs=exclude_dirs,
+                                       scan_workers=args.scan_workers)
+    try:
+        stats = run_jobs(args, converter, image_files, input_root=input_folder, manifest=manifest)
+    finally:
+        if manifest is not None:
+            manifest.close()
     
-    if not image_files:
+    if not stats.total_files:
         print_warning("No image files found")
         return
     
-    print_info(f"Found {len(image_files)} image files")
-    
-    # Convert files with progress bar
-    results = []
-    with tqdm(total=len(image_files), desc="Converting", unit="file") as pbar:
-        for image_file in image_files:
-            output_path = None
-            if args.output:
-                # Create relative path structure
-                rel_path = os.path.relpath(image_file, input_folder)
-                base_dir = os.path.dirname(rel_path)
-                base_name = os.path.splitext(os.path.basename(rel_path))[0]
-                
-                target_dir = os.path.join(args.output, base_dir) if base_dir else args.output
-                os.makedirs(target_dir, exist_ok=True)
-                
-                output_path = os.path.join(target_dir, f"{base_name}.{args.format}")
-            
-            # Map jpg to jpeg for PIL compatibility
-            output_format = "jpeg" if args.format == "jpg" else args.format
-            result = converter.convert(image_file, output_format, output_path)
-            results.append(result)
-            pbar.update(1)
-    
-    print_statistics(results)
+    print_statistics(stats)
 
 def convert_multiple_files(args, converter):
     """Convert multiple selected files"""
@@ -259,23 +368,79 @@ def convert_multiple_files(args, converter):
     
     print_info(f"Converting {len(input_files)} files")
     
-    # Convert files with progress bar
-    results = []
-    with tqdm(total=len(input_files), desc="Converting", unit="file") as pbar:
-        for file_path in input_files:
-            file_path = file_path.strip()
-            output_path = None
-            if args.output:
-                base = os.path.splitext(os.path.basename(file_path))[0]
-                output_path = os.path.join(args.output, f"{base}.{args.format}")
-            
-            # Map jpg to jpeg for PIL compatibility
-            output_format = "jpeg" if args.format == "jpg" else args.format
-            result = converter.convert(file_path, output_format, output_path)
-            results.append(result)
+    stats = run_jobs(args, converter, [file_path.strip() for file_path in input_files])
+    print_statistics(stats)
+
+def run_jobs(args, converter, image_files, input_root=None, manifest=None):
+    """Stream conversions through the worker pool, updating progress and statistics per file"""
+    if args.pyramid or args.deepzoom:
+        return run_per_file(args, converter, image_files, input_root)
+    
+    workers = resolve_workers(args.workers)
+    if workers > 1:
+        print_info(f"Using {workers} workers ({args.executor})")
+    
+    stats = StatsAccumulator()
+    # One progress step per output, so fan-out counts every format
+    total = len(image_files) * len(args.format) if isinstance(image_files, list) else None
+    results = converter.iter_convert(
+        image_files, job_format(args.format), output_folder=args.output, input_root=input_root,
+        workers=workers, mode=args.executor, manifest=manifest, force=args.force,
+        max_memory=args.max_memory
+    )
+    
+    with progress_bar(total=total, desc="Converting", unit="file") as pbar:
+        for result in results:
+            stats.add(result)
             pbar.update(1)
     
-    print_statistics(results)
+    return stats
+
+def convert_layout(args, converter, input_path, output_folder, tile_workers=None):
+    """Write the srcset pyramid or Deep Zoom tiles selected on the command line for one file"""
+    if args.deepzoom:
+        return [converter.convert_deepzoom(input_path, args.format[0], output_folder, workers=tile_workers)]
+    return converter.convert_pyramid(input_path, args.format, args.pyramid, output_folder)
+
+def run_per_file(args, converter, image_files, input_root=None):
+    """Generate the pyramid/Deep Zoom output of every file, one file per worker thread"""
+    workers = resolve_workers(args.workers)
+    if workers > 1:
+        print_info(f"Using {workers} workers (threads)")
+    if args.incremental or args.manifest or args.cache_dir:
+        print_warning("--incremental/--manifest/--cache-dir are not used with --pyramid/--deepzoom")
+    
+    def convert(input_path):
+        output_folder = args.output
+        if output_folder and input_root:
+            # Keep the folder structure, like regular folder conversion
+            rel_path = os.path.relpath(os.path.dirname(input_path), input_root)
+            output_folder = os.path.normpath(os.path.join(output_folder, rel_path))
+        # With several files in flight, each one encodes its tiles on a single thread
+        return convert_layout(args, converter, input_path, output_folder, tile_workers=None if workers == 1 else 1)
+    
+    stats = StatsAccumulator()
+    with ThreadPoolExecutor(max_workers=workers) as executor, progress_bar(desc="Converting", unit="file") as pbar:
+        for results in executor.map(convert, image_files):
+            stats.update(results)
+            record_metrics(converter, results)
+            pbar.update(len(results))
+    
+    return stats
+
+def preset_defaults(preset):
+    """Map a shared preset onto argparse destinations"""
+    defaults = {
+        "format": preset["format"],
+        "quality": preset["quality"],
+        "max_size": preset["max_size_kb"],
+        "compression": preset["compression_percent"],
+        "maintain_aspect": preset["maintain_aspect_ratio"],
+        "resample": preset["resample_tier"],
+    }
+    if preset["target_width"] or preset["target_height"]:
+        defaults["resize"] = f"{preset['target_width']}x{preset['target_height']}"
+    return defaults
 
 def main():
     """Main CLI function"""
@@ -290,6 +455,13 @@ Examples:
   %(prog)s -i /path/to/images --folder -f avif -r -o /output
   %(prog)s -i "img1.jpg,img2.png" -f jpeg -q 90 -c 70
   %(prog)s -i photo.png -f webp --resize 800x600 --maintain-aspect
+  %(prog)s -i /path/to/images --folder -f webp -r --workers 8
+  %(prog)s -i /path/to/images --folder --preset web --resample fast
+  %(prog)s -i /path/to/images --folder -f webp,avif,jpeg -o /output
+  %(prog)s -i photo.jpg -f webp --pyramid 320,640,1024,1920,original
+  %(prog)s -i scan.tif -f jpeg --deepzoom -o /tiles
+  %(prog)s -i /path/to/images --folder -f webp --workers 8 --trace trace.json
+  %(prog)s -i /srv/uploads --folder -f webp --incremental --metrics-file /var/lib/node_exporter/imageconverter.prom
         """
     )
     
@@ -300,9 +472,15 @@ Examples:
     )
     
     parser.add_argument(
-        "-f", "--format", required=True, 
-        choices=["jpeg", "jpg", "png", "webp", "avif", "bmp", "tiff"],
-        help="Output image format"
+        "-f", "--format", type=parse_formats,
+        help="Output image format, or a comma-separated list (e.g. webp,avif,jpeg) to decode "
+             "each image once and encode every format: " + ", ".join(OUTPUT_FORMATS) +
+             " (required unless --preset is given)"
+    )
+    
+    parser.add_argument(
+        "-p", "--preset", choices=list(PRESETS),
+        help="Start from a preset (same as the GUI Quick Presets); other options override it"
     )
     
     # Processing options
@@ -348,6 +526,111 @@ Examples:
         help="Maintain aspect ratio when resizing (default: True)"
     )
     
+    parser.add_argument(
+        "--resample", choices=list(RESAMPLE_TIERS), default=DEFAULT_TIER,
+        help="Resampling tier when resizing: fast, balanced or best (default: best)"
+    )
+    
+    parser.add_argument(
+        "--backend", type=parse_backend, default=DEFAULT_BACKEND,
+        help="Image engine: pillow, vips (needs pyvips), auto (fastest per format, vips for very "
+             "large images) or per format, e.g. webp:vips,jpeg:pillow (default: pillow)"
+    )
+    
+    parser.add_argument(
+        "--pyramid", nargs="?", type=parse_widths, const=DEFAULT_PYRAMID_WIDTHS,
+        help="Write a srcset resolution pyramid (name@640w.webp, ...) from a single decode; "
+             "optional comma-separated widths (default: 320,640,1024,1920,original). --resize is ignored"
+    )
+    
+    parser.add_argument(
+        "--deepzoom", action="store_true",
+        help="Write a Deep Zoom tile pyramid (name.dzi + name_files/) for very large images, "
+             "reading the source in strips so memory stays bounded"
+    )
+    
+    # Performance options
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1,
+        help="Number of parallel workers (default: 1, 0 = all CPU cores)"
+    )
+    
+    parser.add_argument(
+        "--executor", choices=EXECUTION_MODES, default="auto",
+        help="Worker model: threads, processes, or auto to pick from the workload (default: auto)"
+    )
+    
+    parser.add_argument(
+        "--max-memory", type=parse_size,
+        help="Memory budget for images processed at once, e.g. 8G; large images wait for room "
+             "while small ones keep flowing (default: unlimited)"
+    )
+    
+    parser.add_argument(
+        "--scan-workers", type=int, default=1,
+        help="Threads listing subfolders in parallel with -r; helps on NFS and other network "
+             "filesystems where each directory read is a round trip (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--durability", choices=DURABILITY_MODES, default=DEFAULT_DURABILITY,
+        help="Outputs are always written to a temp file and renamed, so a crash never leaves a partial "
+             "file. none: no fsync; file: fsync every file and its folder; batch: fsync in groups of "
+             "files, cheaper on slow disks (default: none)"
+    )
+    
+    # Incremental options
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Skip files whose output is still up to date (use with --folder)"
+    )
+    
+    parser.add_argument(
+        "--manifest",
+        help="Manifest file for incremental mode (default: .imageconverter-manifest.sqlite in the output or input folder)"
+    )
+    
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Convert every file even if the manifest says it is up to date"
+    )
+    
+    # Cache options
+    parser.add_argument(
+        "--cache-dir",
+        help="Reuse outputs of unchanged inputs from this content-addressed cache directory"
+    )
+    
+    parser.add_argument(
+        "--cache-size", type=parse_size,
+        help="Maximum cache size, least recently used outputs are evicted (default: 1G)"
+    )
+    
+    # Size prediction
+    parser.add_argument(
+        "--size-model", metavar="PATH",
+        help="Predict the quality for --max-size/--compression from a small sample of each image, "
+             "calibrated and saved to this JSON file across runs (usually 1-2 full encodes per file)"
+    )
+    
+    # Profiling
+    parser.add_argument(
+        "--trace", metavar="PATH",
+        help="Write a Chrome trace (chrome://tracing, ui.perfetto.dev) with a span per file and per stage, "
+             "one track per worker thread/process"
+    )
+    
+    parser.add_argument(
+        "--metrics-file", metavar="PATH",
+        help="Write Prometheus metrics (files, bytes, stage latency, encode trials, queue depth) to this file "
+             "for the node_exporter textfile collector, replaced atomically"
+    )
+    
+    parser.add_argument(
+        "--metrics-interval", type=float, default=15, metavar="SECONDS",
+        help="How often --metrics-file is rewritten during the run (default: 15)"
+    )
+    
     # Utility options
     parser.add_argument(
         "--quiet", action="store_true",
@@ -358,7 +641,18 @@ Examples:
         "--version", action="version", version="Image Format Converter 1.0.0"
     )
     
+    # Presets only change defaults, so explicit options still win
+    preset_args, _ = parser.parse_known_args()
+    if preset_args.preset:
+        parser.set_defaults(**preset_defaults(PRESETS[preset_args.preset]))
+    
     args = parser.parse_args()
+    if not args.format:
+        parser.error("the following arguments are required: -f/--format (or use --preset)")
+    if args.deepzoom and args.pyramid:
+        parser.error("--deepzoom and --pyramid cannot be combined")
+    if args.deepzoom and len(args.format) > 1:
+        parser.error("--deepzoom takes a single output format")
     
     # Parse resize option
     target_width = None
@@ -373,14 +667,37 @@ Examples:
             sys.exit(1)
     
     # Create converter with options
-    converter = ImageFormatConverter(
+    options = ConverterOptions(
         max_size_kb=args.max_size,
         quality=args.quality,
         compression_percent=args.compression,
         target_width=target_width,
         target_height=target_height,
-        maintain_aspect_ratio=args.maintain_aspect
+        maintain_aspect_ratio=args.maintain_aspect,
+        resample_tier=args.resample,
+        backend=args.backend
     )
+    cache = None
+    if args.cache_dir:
+        from app.controller.cache import DEFAULT_MAX_BYTES, OutputCache
+        cache = OutputCache(args.cache_dir, max_bytes=args.cache_size or DEFAULT_MAX_BYTES)
+    predictor = None
+    if args.size_model:
+        from app.controller.predictor import SizePredictor
+        predictor = SizePredictor(args.size_model)
+    tracer = None
+    if args.trace:
+        from app.controller.trace import ChromeTrace
+        tracer = ChromeTrace(args.trace)
+    metrics = exporter = None
+    if args.metrics_file:
+        from app.controller.metrics import ConversionMetrics, TextfileExporter
+        metrics = ConversionMetrics()
+        exporter = TextfileExporter(metrics.registry, args.metrics_file, args.metrics_interval).start()
+    # Files are written on a separate thread so encoding never waits on the disk
+    writer = OutputWriter(durability=args.durability, background=True)
+    converter = ImageFormatConverter.from_options(options, cache=cache, predictor=predictor, tracer=tracer,
+                                                  metrics=metrics, writer=writer)
     
     # Suppress progress bars if quiet mode
     if args.quiet:
@@ -401,6 +718,19 @@ Examples:
     except Exception as e:
         print_error(f"Unexpected error: {e}")
         sys.exit(1)
+    finally:
+        # Outputs still queued are written (and synced) before exiting
+        writer.close()
+        # Keep the calibration learned during this run, even after an interruption
+        if predictor is not None:
+            predictor.save()
+        # Final metrics snapshot, also written when the run fails or is interrupted
+        if exporter is not None:
+            exporter.stop()
+        # The trace of an interrupted run shows where it was stuck
+        if tracer is not None:
+            tracer.save()
+            print_info(f"Trace written to {args.trace}")
 
 if __name__ == "__main__":
     main()
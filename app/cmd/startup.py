@@ -0,0 +1,77 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Import-time budget for `import app.cmd.cli` (milliseconds, best of several runs)
+STARTUP_BUDGET_MS = 100
+# Modules a plain CLI start must not import: they are loaded only by the options that need them
+LAZY_MODULES = (
+    "tqdm", "sqlite3", "multiprocessing", "PyQt6",
+    "pillow_avif", "PIL.AvifImagePlugin", "PIL.WebPImagePlugin", "PIL.TiffImagePlugin", "PIL.GifImagePlugin",
+)
+DEFAULT_RUNS = 5
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure_imports(module="app.cmd.cli"):
+    """
+    Import a module in a fresh interpreter with `python -X importtime`
+    :return: (total import time in ms, set of imported module names)
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_ROOT, env.get("PYTHONPATH")]))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+    total_us = 0
+    modules = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # Top-level imports are not indented; their cumulative time covers their children
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+
+    return total_us / 1000, modules
+
+
+def check_startup(budget_ms=STARTUP_BUDGET_MS, runs=DEFAULT_RUNS, module="app.cmd.cli"):
+    """
+    Check the CLI import time against the budget and that no lazily loaded module is imported
+    :return: (best time in ms, list of problems; empty when the check passes)
+    """
+    best_ms = None
+    for _ in range(runs):
+        elapsed_ms, modules = measure_imports(module)
+        best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+
+    problems = [f"{name} is imported at startup" for name in LAZY_MODULES if name in modules]
+    if best_ms > budget_ms:
+        problems.append(f"import time {best_ms:.1f} ms exceeds the {budget_ms} ms budget")
+    return best_ms, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the CLI startup import budget with python -X importtime")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS,
+                        help=f"Import time budget in milliseconds (default: {STARTUP_BUDGET_MS})")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                        help=f"Fresh interpreter runs, the fastest one is compared (default: {DEFAULT_RUNS})")
+    args = parser.parse_args()
+
+    best_ms, problems = check_startup(args.budget, args.runs)
+    print(f"import app.cmd.cli: {best_ms:.1f} ms (budget {args.budget:g} ms)")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    sys.exit(1 if problems else 0)
+
+
+# Ví dụ: python -m app.cmd.startup --budget 100
+if __name__ == "__main__":
+    main()
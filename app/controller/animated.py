@@ -0,0 +1,150 @@
+from PIL import Image
+
+from .tiled import check_pixels, open_image
+
+# Định dạng đích ghi được nhiều frame: ảnh động giữ nguyên animation khi convert sang các định dạng này
+ANIMATED_FORMATS = ("webp", "avif", "gif", "tiff")
+# Định dạng nguồn được coi là ảnh động (MPO cũng có nhiều frame nhưng là ảnh chụp stereo)
+ANIMATED_SOURCES = ("GIF", "PNG", "WEBP", "AVIF", "TIFF")
+# Thời lượng mỗi frame (ms) khi file nguồn không ghi (ví dụ TIFF nhiều trang)
+DEFAULT_FRAME_DURATION = 100
+# Số màu tối đa của một frame GIF có nền trong suốt (chừa một chỉ số cho màu trong suốt)
+GIF_TRANSPARENT_COLORS = 255
+
+
+def is_animated(img):
+    """Ảnh đã mở có nhiều frame cần giữ khi convert hay không"""
+    return img.format in ANIMATED_SOURCES and getattr(img, "is_animated", False)
+
+
+class FrameStream(Image.Image):
+    """
+    Ảnh động được decode lần lượt từng frame: mỗi lần seek() decode frame tương ứng từ
+    file nguồn rồi xử lý (chuẩn hóa mode, resize) bằng prepare. Plugin WebP/AVIF/TIFF của
+    Pillow khi save_all chỉ seek tuần tự và encode ngay frame hiện tại, nên trong bộ nhớ
+    chỉ có một frame đã decode tại một thời điểm.
+    """
+
+    def __init__(self, input_path, prepare, fixed_size=True):
+        """
+        :param input_path: File ảnh động nguồn
+        :param prepare: callable(frame, canvas_size) -> ảnh RGB/RGBA đã xử lý của frame đó.
+                        canvas_size là kích thước mọi frame phải có (None = tự chọn)
+        :param fixed_size: Mọi frame cùng kích thước với frame đầu (WebP/AVIF/GIF),
+                           False thì mỗi frame giữ kích thước riêng (TIFF nhiều trang)
+        """
+        super().__init__()
+        self._source = open_image(input_path)
+        check_pixels(self._source)
+        self._prepare = prepare
+        self._fixed_size = fixed_size
+        self._frame = None
+        self._durations = {}
+
+        self.source_size = self._source.size
+        self.canvas_size = None
+        self.n_frames = self._source.n_frames
+        self.is_animated = True
+        self.loop = self._source.info.get("loop", 0)
+        self.seek(0)
+
+    def seek(self, frame):
+        if frame == self._frame:
+            return
+        if not 0 <= frame < self.n_frames:
+            raise EOFError("no more images in animation")
+
+        self._source.seek(frame)
+        prepared = self._prepare(self._source, self.canvas_size if self._fixed_size else None)
+        prepared.load()
+        if self.canvas_size is None:
+            self.canvas_size = prepared.size
+
+        self.im = prepared.im
+        self._mode = prepared.mode
+        self._size = prepared.size
+        self._frame = frame
+        self._durations[frame] = self._source.info.get("duration") or DEFAULT_FRAME_DURATION
+
+    def tell(self):
+        return self._frame
+
+    def duration(self, frame):
+        """Thời lượng (ms) của một frame"""
+        if frame not in self._durations:
+            self.seek(frame)
+        return self._durations[frame]
+
+    def close(self):
+        self._source.close()
+        super().close()
+
+    def save_frames(self, fp, format, **params):
+        """Encode toàn bộ animation vào fp (file object), từng frame một"""
+        if format == "GIF":
+            self._save_gif(fp)
+        else:
+            self.save(fp, format, save_all=True, duration=_FrameDurations(self), loop=self.loop, **params)
+
+    def _save_gif(self, fp):
+        """
+        Ghi GIF theo từng frame. Writer GIF của Pillow gom mọi frame trong bộ nhớ để tính
+        vùng khác biệt giữa các frame, nên ở đây mỗi frame được lượng tử hóa và ghi ngay
+        (frame đầy đủ, bảng màu riêng cho từng frame).
+        """
+        from PIL import GifImagePlugin
+
+        for frame_index in range(self.n_frames):
+            self.seek(frame_index)
+            frame, transparency = _gif_frame(self)
+
+            params = {"duration": self.duration(frame_index)}
+            if transparency is not None:
+                # Xóa frame trước khi vẽ frame tiếp theo để vùng trong suốt không lộ frame cũ
+                params["transparency"] = transparency
+                params["disposal"] = 2
+
+            if frame_index == 0:
+                header, _ = GifImagePlugin.getheader(frame, info={"loop": self.loop})
+                fp.write(b"".join(header))
+            else:
+                params["include_color_table"] = True
+
+            for chunk in GifImagePlugin.getdata(frame, **params):
+                fp.write(chunk)
+
+        fp.write(b";")
+
+
+class _FrameDurations(list):
+    """
+    Danh sách thời lượng frame cho plugin WebP/AVIF: Pillow đọc duration[i] ngay sau khi
+    đã seek tới frame i, nên giá trị được lấy từ frame đang decode thay vì phải quét trước
+    toàn bộ file.
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self._stream = stream
+
+    def __getitem__(self, index):
+        return self._stream.duration(index)
+
+
+def _gif_frame(img):
+    """
+    Lượng tử hóa một frame RGB/RGBA về bảng màu GIF
+    :return: (ảnh mode P, chỉ số màu trong suốt hoặc None)
+    """
+    if img.mode != "RGBA":
+        return img.convert("RGB").quantize(), None
+
+    frame = img.convert("RGB").quantize(GIF_TRANSPARENT_COLORS)
+    palette = frame.getpalette()
+    transparency = len(palette) // 3
+    frame.putpalette(palette + [0, 0, 0])
+
+    # GIF chỉ có trong suốt hoàn toàn: alpha < 128 coi như trong suốt
+    mask = img.getchannel("A").point(lambda alpha: 255 if alpha < 128 else 0)
+    frame.paste(transparency, mask=mask)
+    return frame, transparency
@@ -0,0 +1,134 @@
+import asyncio
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .batch import _convert_job, _expand, _finalize, _init_worker, _job_error, _record_predictions, resolve_workers
+from .convert import ImageFormatConverter
+
+
+class AsyncImageConverter:
+    """
+    API asyncio cho ImageFormatConverter: phần xử lý ảnh (tốn CPU) chạy trên
+    executor riêng nên không chặn event loop.
+
+    Ví dụ:
+        async with AsyncImageConverter(ImageFormatConverter(quality=85)) as converter:
+            result = await converter.convert("photo.jpg", "webp")
+            async for result in converter.convert_many(paths, "avif", "output"):
+                ...
+    """
+
+    def __init__(self, converter=None, workers=None, mode="threads", max_concurrency=None, executor=None):
+        """
+        :param converter: ImageFormatConverter dùng cho mọi lời gọi (mặc định tạo mới)
+        :param workers: Số worker của executor (None/0 = toàn bộ CPU)
+        :param mode: "threads" hoặc "processes" cho executor tự quản lý
+        :param max_concurrency: Số file tối đa xử lý đồng thời trên toàn bộ instance
+                                (mặc định bằng số worker)
+        :param executor: Executor có sẵn; khi truyền vào thì AsyncImageConverter không đóng nó
+        """
+        self.converter = converter or ImageFormatConverter()
+        self.workers = resolve_workers(workers)
+        self.max_concurrency = max_concurrency or self.workers
+
+        self._owns_executor = executor is None
+        if executor is not None:
+            self._executor = executor
+            self._job_function = self.converter._run_job
+        elif mode == "threads":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            self._job_function = self.converter._run_job
+        elif mode == "processes":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.converter,)
+            )
+            self._job_function = _convert_job
+        else:
+            raise ValueError(f"Chế độ thực thi không hợp lệ: {mode}")
+
+        # Semaphore tạo khi dùng lần đầu để gắn với event loop đang chạy
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Đóng executor (nếu do instance này tạo ra) mà không chặn event loop"""
+        if self._owns_executor:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._executor.shutdown)
+
+    async def convert(self, input_path, output_format, output_path=None):
+        """
+        Chuyển đổi một file, trả về dict kết quả giống ImageFormatConverter.convert().
+        output_format là list định dạng thì decode một lần và trả về list kết quả
+        giống ImageFormatConverter.convert_formats().
+        Hủy task khi file chưa bắt đầu xử lý sẽ bỏ luôn job khỏi hàng đợi executor;
+        file đang xử lý dở vẫn chạy xong trong nền nhưng kết quả bị bỏ qua.
+        """
+        if output_path is None and isinstance(output_format, (list, tuple)):
+            # Mỗi định dạng một đường dẫn mặc định, như convert_formats()
+            output_path = [None] * len(output_format)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, self._job_function, input_path, output_format, output_path
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Worker process chết không làm hỏng lời gọi của service
+                result = _job_error((input_path, output_format, output_path), str(e))
+
+        # Writer ghi nền (thread pool): chờ file ghi xong mà không chặn event loop
+        written = self.converter.writer.when_written(result)
+        if written is not None:
+            await asyncio.wrap_future(written)
+        result = _finalize(self.converter.writer.settle(result), (input_path, output_format, output_path))
+        if self._job_function is _convert_job:
+            _record_predictions(self.converter, result)
+        return result
+
+    async def convert_many(self, input_paths, output_format, output_folder=None, input_root=None, concurrency=None):
+        """
+        Async generator convert nhiều file, yield kết quả ngay khi từng file hoàn thành.
+        :param input_paths: Iterable đường dẫn file (list hoặc generator như iter_folder)
+        :param output_format: Định dạng đích, hoặc list định dạng (mỗi file decode một lần)
+        :param output_folder: Thư mục lưu kết quả (mặc định tạo thư mục convert cho từng file)
+        :param input_root: Thư mục gốc để giữ cấu trúc thư mục con trong output_folder
+        :param concurrency: Số file tối đa đang xử lý cho riêng lời gọi này
+                            (vẫn bị giới hạn bởi max_concurrency của instance)
+        """
+        limit = concurrency or self.max_concurrency
+        jobs = self.converter._iter_jobs(input_paths, output_format, output_folder, input_root)
+        pending = set()
+
+        try:
+            for job in jobs:
+                if isinstance(job, Mapping):
+                    yield job
+                    continue
+
+                pending.add(asyncio.ensure_future(self.convert(*job)))
+                if len(pending) >= limit:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        for result in _expand(task.result()):
+                            yield result
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for result in _expand(task.result()):
+                        yield result
+        finally:
+            # Caller hủy hoặc dừng vòng lặp giữa chừng: hủy các file chưa xong
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,376 @@
+import io
+import threading
+import time
+
+from PIL import Image
+
+from .codecs import load_codec
+from .resample import resample
+from .timing import timed
+from .tiled import TILED_MIN_PIXELS, can_downscale_in_bands, check_pixels, downscale_bands, open_image
+
+# Backend mặc định (giữ nguyên hành vi cũ)
+DEFAULT_BACKEND = "pillow"
+# Chọn backend theo từng định dạng bằng benchmark, ảnh rất lớn ưu tiên backend streaming
+AUTO_BACKEND = "auto"
+# Ảnh tổng hợp dùng để benchmark backend (cạnh, px), nhiễu để encoder phải làm việc thật
+BENCHMARK_SIZE = 512
+BENCHMARK_REPEAT = 3
+
+_backends = {}
+_fastest = {}  # định dạng -> tên backend nhanh nhất (benchmark một lần mỗi process)
+_benchmark_lock = threading.Lock()
+
+
+def _pil_format(fmt):
+    """Tên định dạng theo Pillow ("jpg" là phần mở rộng, Pillow chỉ nhận "JPEG")"""
+    fmt = fmt.upper()
+    return "JPEG" if fmt == "JPG" else fmt
+
+
+def apply_draft(img, target_size):
+    """
+    Với JPEG cần thu nhỏ, dùng DCT scaling của libjpeg (draft) để decode thẳng ở
+    1/2, 1/4 hoặc 1/8 kích thước. Pillow chọn tỷ lệ lớn nhất mà ảnh decode vẫn
+    không nhỏ hơn target_size, sau đó resample theo mức đã chọn.
+    Phải gọi trước khi pixel được decode.
+    """
+    if img.format != "JPEG" or target_size is None:
+        return
+
+    target_width, target_height = target_size
+    if target_width * 2 > img.width or target_height * 2 > img.height:
+        # Chưa thu nhỏ tới một nửa thì draft không giảm được gì
+        return
+
+    img.draft(None, target_size)
+
+
+class PillowBackend:
+    """
+    Backend mặc định: decode, resize và encode bằng Pillow. Ảnh JPEG được decode ở tỷ lệ
+    nhỏ (draft), ảnh BMP/TIFF rất lớn được thu nhỏ theo dải.
+    """
+
+    name = "pillow"
+    formats = ("jpeg", "jpg", "png", "webp", "avif", "bmp", "tiff", "gif")
+    streaming = False
+
+    def available(self):
+        return True
+
+    def owns(self, img):
+        return isinstance(img, Image.Image)
+
+    def supports(self, input_path, output_format):
+        return output_format.lower() in self.formats
+
+    def probe(self, input_path):
+        """Kích thước ảnh (chỉ đọc header)"""
+        with open_image(input_path) as img:
+            return img.size
+
+    def load(self, input_path, target_for, tier, multi_pass=True, timer=None):
+        """
+        Mở, decode, chuẩn hóa mode và resize ảnh
+        :param target_for: callable(width, height) -> kích thước đích hoặc None (không resize)
+        :param tier: Mức resample
+        :param multi_pass: Ảnh có thể được encode nhiều lần (Pillow luôn giữ ảnh trong bộ nhớ)
+        :param timer: (StageTimer|None) Đo thời gian open/decode/mode/resize
+        :return: (ảnh đã xử lý, kích thước gốc)
+        """
+        # Mở ảnh (chỉ đọc header, chưa decode pixel)
+        with timed(timer, "open"):
+            img = open_image(input_path)
+            original_dimensions = img.size
+
+            # Tính kích thước đích trước khi decode để JPEG có thể decode ở tỷ lệ nhỏ hơn
+            target_size = target_for(*original_dimensions)
+            banded = can_downscale_in_bands(img, target_size)
+
+        if banded:
+            # Ảnh rất lớn (BMP, TIFF không nén): thu nhỏ theo dải, không decode cả ảnh.
+            # Decode và resize xen kẽ từng dải nên được tính chung vào decode
+            img.close()
+            with timed(timer, "decode"):
+                return downscale_bands(input_path, target_size, tier), original_dimensions
+
+        check_pixels(img)
+        apply_draft(img, target_size)
+        return self.finish(img, target_size, tier, timer), original_dimensions
+
+    def finish(self, img, target_size, tier, timer=None):
+        """
+        Decode (nếu chưa), chuẩn hóa mode và resize một ảnh đã mở
+        :param target_size: Kích thước đích (None = giữ nguyên)
+        :return: Ảnh đã xử lý (ảnh đầu vào không bị sửa, trừ việc được decode)
+        """
+        with timed(timer, "decode"):
+            img.load()
+
+        # Chuyển sang RGB nếu cần (nền trắng cho JPEG xử lý ở prepare)
+        if img.mode not in ("RGB", "RGBA"):
+            with timed(timer, "mode"):
+                img = img.convert("RGB")
+
+        if target_size is not None and target_size != img.size:
+            with timed(timer, "resize"):
+                img = resample(img, target_size, tier)
+        return img
+
+    def resize(self, img, size, tier):
+        if size == img.size:
+            return img
+        return resample(img, size, tier)
+
+    def prepare(self, img, output_format):
+        """Chuẩn bị ảnh cho một định dạng đích cụ thể"""
+        if img.mode == "RGBA" and output_format.lower() in ["jpeg", "jpg"]:
+            # Tạo nền trắng cho JPEG
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            return background
+
+        # save() ghi encoderinfo lên chính đối tượng Image nên mỗi lần encode (có thể
+        # chạy song song) cần một đối tượng riêng; _new() dùng chung pixel, không copy
+        return img._new(img.im)
+
+    def size(self, img):
+        return img.size
+
+    def encode(self, img, output_format, quality, params):
+        """Encode ảnh vào buffer trong bộ nhớ, trả về memoryview của dữ liệu"""
+        # Codec được nạp khi lần đầu encode ra định dạng này (AVIF chỉ import khi cần)
+        load_codec(output_format)
+        buffer = io.BytesIO()
+        img.save(buffer, _pil_format(output_format), quality=quality, **params)
+        return buffer.getbuffer()
+
+    def benchmark_image(self):
+        return Image.effect_noise((BENCHMARK_SIZE, BENCHMARK_SIZE), 64).convert("RGB")
+
+
+class VipsBackend:
+    """
+    Backend libvips (pyvips, tùy chọn). libvips xử lý theo nhu cầu: pixel được decode,
+    thu nhỏ (shrink-on-load với JPEG/WebP) và encode theo từng vùng nhỏ, nên resize ảnh
+    rất lớn chỉ tốn bộ nhớ cỡ vài dòng ảnh thay vì cả ảnh.
+    Chỉ dùng cho ảnh tĩnh; ảnh động, srcset và Deep Zoom luôn dùng Pillow.
+    """
+
+    name = "vips"
+    streaming = True
+    # Định dạng Pillow -> phần mở rộng libvips dùng để chọn saver
+    suffixes = {"jpeg": ".jpg", "jpg": ".jpg", "png": ".png", "webp": ".webp", "avif": ".avif",
+                "tiff": ".tif", "gif": ".gif"}
+
+    def __init__(self):
+        self._pyvips = None
+        self._saveable = None
+        self._checked = False
+        self._lock = threading.Lock()
+
+    def _module(self):
+        """Import pyvips lần đầu cần tới (None nếu chưa cài pyvips/libvips)"""
+        if not self._checked:
+            with self._lock:
+                if not self._checked:
+                    try:
+                        import pyvips
+                        self._saveable = set(pyvips.get_suffixes())
+                        self._pyvips = pyvips
+                    except (ImportError, OSError):
+                        # OSError: có pyvips nhưng không tìm thấy thư viện libvips
+                        self._pyvips = None
+                    self._checked = True
+        return self._pyvips
+
+    def available(self):
+        return self._module() is not None
+
+    def owns(self, img):
+        pyvips = self._module()
+        return pyvips is not None and isinstance(img, pyvips.Image)
+
+    def supports(self, input_path, output_format):
+        pyvips = self._module()
+        suffix = self.suffixes.get(output_format.lower())
+        if pyvips is None or suffix not in self._saveable:
+            return False
+        return input_path is None or pyvips.Image.find_load(input_path) is not None
+
+    def probe(self, input_path):
+        image = self._module().Image.new_from_file(input_path)
+        return image.width, image.height
+
+    def load(self, input_path, target_for, tier, multi_pass=True, timer=None):
+        """
+        Dựng pipeline decode + resize (chưa chạy cho tới khi encode)
+        :param multi_pass: Ảnh sẽ được encode nhiều lần (nhiều định dạng, tìm quality theo dung
+                           lượng): giữ kết quả resize trong bộ nhớ vì pipeline đọc tuần tự chỉ chạy được một lần
+        :param timer: (StageTimer|None) Đo thời gian. Pipeline chỉ chạy khi encode (hoặc khi
+                      copy_memory) nên decode/resize thường nằm trong thời gian encode
+        :return: (ảnh pyvips, kích thước gốc)
+        """
+        pyvips = self._module()
+        with timed(timer, "open"):
+            image = pyvips.Image.new_from_file(input_path, access="sequential")
+            original_dimensions = (image.width, image.height)
+
+        target_size = target_for(*original_dimensions)
+        if target_size is not None and target_size != original_dimensions:
+            if tier == "best":
+                # Giống Pillow "best": lanczos trên toàn bộ pixel
+                image = self.resize(image, target_size, tier)
+            else:
+                # shrink-on-load rồi lanczos, tương đương reduce() + resample của "fast"/"balanced"
+                image = pyvips.Image.thumbnail(input_path, target_size[0], height=target_size[1],
+                                               size="force", no_rotate=True)
+
+        if image.interpretation != "srgb":
+            image = image.colourspace("srgb")
+        if image.format != "uchar":
+            image = image.cast("uchar")
+
+        if multi_pass:
+            with timed(timer, "decode"):
+                image = image.copy_memory()
+        return image, original_dimensions
+
+    def resize(self, image, size, tier):
+        width, height = size
+        if (width, height) == (image.width, image.height):
+            return image
+        kernel = "linear" if tier == "fast" else "lanczos3"
+        return image.resize(width / image.width, vscale=height / image.height, kernel=kernel)
+
+    def prepare(self, image, output_format):
+        if image.hasalpha() and output_format.lower() in ["jpeg", "jpg"]:
+            return image.flatten(background=[255, 255, 255])
+        return image
+
+    def size(self, image):
+        return image.width, image.height
+
+    def encode(self, image, output_format, quality, params):
+        fmt = output_format.lower()
+        options = {}
+        if fmt in ("jpeg", "jpg", "webp", "avif"):
+            options["Q"] = quality
+        if fmt in ("jpeg", "jpg"):
+            options["optimize_coding"] = params.get("optimize", False)
+            options["interlace"] = params.get("progressive", False)
+        elif fmt == "png":
+            options["compression"] = 9 if params.get("optimize") else 6
+        elif fmt == "webp" and "method" in params:
+            options["effort"] = params["method"]
+        return image.write_to_buffer(self.suffixes[fmt], **options)
+
+    def benchmark_image(self):
+        pyvips = self._module()
+        noise = pyvips.Image.gaussnoise(BENCHMARK_SIZE, BENCHMARK_SIZE, mean=128, sigma=64).cast("uchar")
+        return noise.bandjoin([noise, noise]).copy(interpretation="srgb").copy_memory()
+
+
+def register_backend(backend):
+    """Đăng ký một backend (thay backend cùng tên nếu đã có)"""
+    _backends[backend.name] = backend
+
+
+def get_backend(name):
+    """Backend theo tên, ValueError nếu chưa đăng ký hoặc chưa cài"""
+    backend = _backends.get(name)
+    if backend is None:
+        raise ValueError(f"Backend không hợp lệ: {name} (có: {', '.join(_backends)})")
+    if not backend.available():
+        raise ValueError(f"Backend {name} chưa được cài đặt")
+    return backend
+
+
+def available_backends():
+    """Tên các backend dùng được trên máy này"""
+    return [name for name, backend in _backends.items() if backend.available()]
+
+
+def image_backend(img):
+    """Backend sở hữu một ảnh đã load"""
+    for backend in _backends.values():
+        if backend.owns(img):
+            return backend
+    raise TypeError(f"Không backend nào xử lý được {type(img).__name__}")
+
+
+def parse_backend_spec(spec):
+    """
+    Đọc cấu hình backend: tên backend, "auto", hoặc theo định dạng ("webp:vips,jpeg:pillow",
+    định dạng không ghi dùng Pillow; "*:auto" đặt mặc định cho các định dạng còn lại)
+    :return: dict định dạng -> tên backend, key "*" là mặc định
+    """
+    choices = {"*": DEFAULT_BACKEND}
+    for part in (spec or DEFAULT_BACKEND).split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        fmt, _, name = part.rpartition(":")
+        fmt = fmt or "*"
+        if name != AUTO_BACKEND and name not in _backends:
+            raise ValueError(f"Backend không hợp lệ: {name} (có: {', '.join(_backends)}, {AUTO_BACKEND})")
+        choices["jpeg" if fmt == "jpg" else fmt] = name
+    return choices
+
+
+def select_backend(spec, input_path, output_format):
+    """
+    Chọn backend cho một file và định dạng đích theo cấu hình
+    :param spec: Cấu hình backend (xem parse_backend_spec)
+    """
+    choices = parse_backend_spec(spec)
+    fmt = output_format.lower()
+    name = choices.get("jpeg" if fmt == "jpg" else fmt, choices["*"])
+    if name != AUTO_BACKEND:
+        return get_backend(name)
+
+    candidates = [backend for backend in _backends.values()
+                  if backend.available() and backend.supports(input_path, output_format)]
+    if len(candidates) == 1:
+        return candidates[0]
+
+    # Ảnh rất lớn: backend streaming tránh phải giữ cả ảnh trong bộ nhớ
+    streaming = [backend for backend in candidates if backend.streaming]
+    if streaming:
+        width, height = get_backend(DEFAULT_BACKEND).probe(input_path)
+        if width * height >= TILED_MIN_PIXELS:
+            return streaming[0]
+
+    return fastest_backend(output_format, candidates)
+
+
+def fastest_backend(output_format, candidates=None):
+    """Backend resize + encode nhanh nhất cho một định dạng (benchmark một lần, lưu lại)"""
+    fmt = output_format.lower()
+    with _benchmark_lock:
+        if fmt not in _fastest:
+            if candidates is None:
+                candidates = [backend for backend in _backends.values()
+                              if backend.available() and backend.supports(None, fmt)]
+            timings = {backend.name: benchmark_backend(backend, fmt) for backend in candidates}
+            _fastest[fmt] = min(timings, key=timings.get)
+        return _backends[_fastest[fmt]]
+
+
+def benchmark_backend(backend, output_format, quality=85):
+    """Thời gian tốt nhất (giây) để thu nhỏ một nửa rồi encode ảnh tổng hợp"""
+    img = backend.benchmark_image()
+    size = (BENCHMARK_SIZE // 2, BENCHMARK_SIZE // 2)
+    best = None
+    for _ in range(BENCHMARK_REPEAT):
+        start = time.perf_counter()
+        resized = backend.resize(img, size, "balanced")
+        backend.encode(backend.prepare(resized, output_format), output_format, quality, {})
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+register_backend(PillowBackend())
+register_backend(VipsBackend())
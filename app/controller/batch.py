@@ -0,0 +1,341 @@
+import os
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain, islice
+
+from .result import ConversionResult
+from .walker import file_stat
+
+EXECUTION_MODES = ("auto", "threads", "processes")
+# File lớn hơn ngưỡng này chủ yếu tốn thời gian trong decode/encode của Pillow
+# (đã nhả GIL) nên thread đủ hiệu quả mà không tốn chi phí khởi tạo process
+LARGE_FILE_BYTES = 2 * 1024 * 1024
+# Số file lấy mẫu để ước lượng kích thước trung bình khi chọn chế độ auto
+MODE_SAMPLE_SIZE = 64
+
+# Converter dùng chung trong mỗi worker process (khởi tạo một lần qua initializer)
+_worker_converter = None
+
+
+def _init_worker(converter):
+    """Lưu converter vào worker process để không phải pickle lại cho từng file"""
+    global _worker_converter
+    _worker_converter = converter
+
+
+def _convert_job(input_path, output_format, output_path):
+    """Chạy một job trong worker process (phải ở top-level để pickle được)"""
+    # Kết quả rời process ngay: phải chờ writer của process này ghi xong
+    return _worker_converter.writer.settle(_worker_converter._run_job(input_path, output_format, output_path))
+
+
+def resolve_workers(workers):
+    """
+    Chuẩn hóa số worker.
+    :param workers: (int|None) None hoặc <= 0 = dùng toàn bộ CPU
+    """
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def resolve_mode(mode, jobs, workers):
+    """
+    Chọn mô hình thực thi cho batch.
+    - Ít file (không đủ chia cho các worker) hoặc file lớn: dùng thread, vì phần lớn
+      thời gian nằm trong code C của Pillow và không phải trả chi phí khởi tạo process.
+    - Nhiều file nhỏ: dùng process, vì phần Python giữ GIL (mở file, đọc header,
+      xử lý kết quả) chiếm tỷ trọng lớn trên mỗi file.
+    :param mode: "threads", "processes" hoặc "auto"
+    :param jobs: List job (hoặc mẫu các job đầu tiên nếu nguồn job là generator)
+    :return: "threads" hoặc "processes"
+    """
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Chế độ thực thi không hợp lệ: {mode}")
+    if mode != "auto":
+        return mode
+
+    if len(jobs) < workers * 4:
+        return "threads"
+
+    sizes = []
+    for job in jobs[:MODE_SAMPLE_SIZE]:
+        if isinstance(job, Mapping):
+            continue
+        try:
+            sizes.append(file_stat(job[0]).st_size)
+        except OSError:
+            continue
+
+    if sizes and sum(sizes) / len(sizes) >= LARGE_FILE_BYTES:
+        return "threads"
+    return "processes"
+
+
+class MemoryBudget:
+    """
+    Ngân sách bộ nhớ cho các job đang chạy, tính bằng ước lượng bộ nhớ đỉnh của
+    từng job (ImageFormatConverter.estimate_peak_memory). Chỉ dùng trong thread
+    điều phối của batch nên không cần lock.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: Tổng bộ nhớ ước lượng tối đa của các job chạy đồng thời
+        """
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.running = 0  # số job đang chạy, kể cả job ước lượng 0 byte
+
+    def fits(self, cost):
+        # Job lớn hơn cả ngân sách chỉ được chạy khi không còn job nào khác đang chạy
+        return self.running == 0 or self.in_use + cost <= self.max_bytes
+
+    def acquire(self, cost):
+        self.in_use += cost
+        self.running += 1
+
+    def release(self, cost):
+        self.in_use -= cost
+        self.running -= 1
+
+
+def run_batch(converter, jobs, workers=1, progress_callback=None, mode="auto", max_memory=None):
+    """
+    Convert song song một danh sách job bằng thread pool hoặc process pool.
+    :param converter: ImageFormatConverter dùng cho tất cả job (tùy chọn bất biến
+                      nên có thể dùng chung giữa các thread)
+    :param jobs: List tuple (input_path, output_format, output_path). output_format và
+                 output_path có thể là tuple để decode một lần rồi encode nhiều định dạng.
+                 Phần tử là dict/ConversionResult được coi là kết quả có sẵn (ví dụ lỗi kiểm tra đầu vào)
+                 và giữ nguyên.
+    :param workers: Số worker (1 = chạy tuần tự trong thread hiện tại)
+    :param progress_callback: callable(result) được gọi ngay khi mỗi file hoàn thành
+    :param mode: "threads", "processes" hoặc "auto"
+    :param max_memory: Ngân sách bộ nhớ (byte) cho các job chạy đồng thời, None = không giới hạn.
+                       Job được ước lượng từ header ảnh; job chưa đủ chỗ phải chờ trong khi
+                       các ảnh nhỏ phía sau vẫn được chạy tiếp.
+    :return: List kết quả theo đúng thứ tự của jobs (job nhiều định dạng cho nhiều kết quả
+             liền nhau theo thứ tự định dạng)
+    """
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+
+    for index, result in _iter_indexed(converter, jobs, workers, mode, None, progress_callback, max_memory):
+        results[index] = result
+
+    return [item for result in results for item in _expand(result)]
+
+
+def iter_batch(converter, jobs, workers=1, mode="auto", max_in_flight=None, progress_callback=None, max_memory=None):
+    """
+    Generator convert song song, trả về kết quả ngay khi từng file hoàn thành
+    (theo thứ tự hoàn thành, không theo thứ tự đầu vào).
+    Job chỉ được lấy từ nguồn khi còn chỗ, nên nguồn có thể là generator rất lớn
+    (ví dụ duyệt thư mục) mà bộ nhớ vẫn không đổi.
+    :param jobs: Iterable các job như run_batch
+    :param max_in_flight: Số job tối đa đang chờ/đang chạy (mặc định gấp đôi số worker)
+    :param max_memory: Ngân sách bộ nhớ (byte) cho các job chạy đồng thời như run_batch
+    """
+    for _, result in _iter_indexed(converter, jobs, workers, mode, max_in_flight, progress_callback, max_memory):
+        yield from _expand(result)
+
+
+def _iter_indexed(converter, jobs, workers, mode, max_in_flight, progress_callback, max_memory=None):
+    """Lõi thực thi chung: yield (index, result) theo thứ tự hoàn thành"""
+    jobs = iter(jobs)
+    workers = resolve_workers(workers)
+
+    # Lấy mẫu các job đầu tiên để chọn chế độ mà không cần duyệt hết nguồn
+    sample = list(islice(jobs, max(MODE_SAMPLE_SIZE, workers * 4)))
+    if len(sample) < workers:
+        workers = max(len(sample), 1)
+    mode = resolve_mode(mode, sample, workers)
+    jobs = enumerate(chain(sample, jobs))
+
+    if workers <= 1:
+        # Writer ghi nền: file trước được ghi trong lúc encode file sau, kết quả báo sau một job
+        writing = None  # (index, job, kết quả) đang chờ ghi
+        for index, job in jobs:
+            if isinstance(job, Mapping):
+                _report(converter, progress_callback, job)
+                yield index, job
+                continue
+
+            _update_queue(converter, 1)
+            result = converter._run_job(*job)
+            _update_queue(converter, 0)
+            if writing is not None:
+                yield writing[0], _complete(converter, progress_callback, *writing[1:])
+                writing = None
+            if converter.writer.background:
+                writing = (index, job, result)
+            else:
+                yield index, _complete(converter, progress_callback, job, result)
+        if writing is not None:
+            yield writing[0], _complete(converter, progress_callback, *writing[1:])
+        converter.writer.flush()
+        return
+
+    if mode == "threads":
+        executor = ThreadPoolExecutor(max_workers=workers)
+        job_function = converter._run_job
+    else:
+        # Import khi cần: concurrent.futures.process kéo theo multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(converter,))
+        job_function = _convert_job
+
+    max_in_flight = max_in_flight or workers * 2
+    budget = MemoryBudget(max_memory) if max_memory else None
+    pending = {}  # future -> (index, job, cost)
+    writing = {}  # Future ghi của writer (trong pending) -> kết quả đang chờ ghi xong
+    waiting = deque()  # (index, job, cost) đang chờ đủ bộ nhớ
+    overtaken = 0  # Số job mới đã chạy trước job chờ lâu nhất
+    exhausted = False
+
+    def submit(index, job, cost):
+        if budget is not None:
+            budget.acquire(cost)
+        pending[executor.submit(job_function, *job)] = (index, job, cost)
+
+    try:
+        while True:
+            # Job đang chờ bộ nhớ được ưu tiên theo thứ tự đến
+            while waiting and len(pending) < max_in_flight and budget.fits(waiting[0][2]):
+                submit(*waiting.popleft())
+                overtaken = 0
+
+            # Nạp thêm job cho tới khi đạt giới hạn in-flight. Ảnh nhỏ được chạy trước
+            # ảnh lớn đang chờ, nhưng có giới hạn để ảnh lớn không phải chờ mãi
+            while (not exhausted and len(pending) < max_in_flight
+                   and len(waiting) < max_in_flight and overtaken < max_in_flight):
+                item = next(jobs, None)
+                if item is None:
+                    exhausted = True
+                    break
+                index, job = item
+                if isinstance(job, Mapping):
+                    _report(converter, progress_callback, job)
+                    yield index, job
+                    continue
+
+                if budget is None:
+                    submit(index, job, 0)
+                    continue
+
+                cost = converter.estimate_peak_memory(job[0], job[1])
+                if budget.fits(cost):
+                    submit(index, job, cost)
+                    if waiting:
+                        overtaken += 1
+                else:
+                    waiting.append((index, job, cost))
+
+            _update_queue(converter, len(pending), len(waiting))
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, job, cost = pending.pop(future)
+                if future in writing:
+                    result = writing.pop(future)
+                else:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # Worker chết (hết bộ nhớ, crash plugin...) không làm hỏng cả batch
+                        result = _job_error(job, str(e))
+
+                # Writer ghi nền: worker đã nhận job mới, kết quả chờ ghi xong trong pending
+                # (vẫn giữ chỗ in-flight và bộ nhớ vì dữ liệu output còn trong hàng đợi ghi)
+                written = converter.writer.when_written(result)
+                if written is not None:
+                    pending[written] = (index, job, cost)
+                    writing[written] = result
+                    continue
+
+                if budget is not None:
+                    budget.release(cost)
+                result = _finalize(converter.writer.settle(result), job)
+                if mode == "processes":
+                    _record_predictions(converter, result)
+                    _record_trace(converter, result)
+                _report(converter, progress_callback, result)
+                yield index, result
+    finally:
+        # Người dùng dừng giữa chừng: hủy các job chưa chạy rồi mới đóng pool
+        for future in pending:
+            if future not in writing:
+                future.cancel()
+        executor.shutdown(wait=True)
+        # File đã ghi xong khi kết quả được trả về, chỉ còn lô fsync đang dở (durability "batch")
+        converter.writer.flush()
+
+
+def _complete(converter, progress_callback, job, result):
+    """Chờ writer ghi xong, chuẩn hóa và báo kết quả của một job (chạy tuần tự)"""
+    result = _finalize(converter.writer.settle(result), job)
+    _report(converter, progress_callback, result)
+    return result
+
+
+def _finalize(result, job):
+    """
+    Đảm bảo mọi kết quả (kể cả lỗi) đều có input_path/output_path để báo cáo
+    và để manifest ghi nhận đúng output
+    """
+    input_path, output_format, output_path = job
+    if isinstance(result, list):
+        return [_finalize(item, (input_path, fmt, path)) for item, fmt, path in zip(result, output_format, output_path)]
+
+    result.setdefault("input_path", input_path)
+    if output_path is not None:
+        result.setdefault("output_path", output_path)
+    return result
+
+
+def _job_error(job, error):
+    """Kết quả lỗi cho một job (một kết quả mỗi định dạng đích)"""
+    if isinstance(job[1], (list, tuple)):
+        return [ConversionResult.failure(None, error) for _ in job[1]]
+    return ConversionResult.failure(None, error)
+
+
+def _expand(result):
+    """Job nhiều định dạng trả về list kết quả: tách thành từng dict"""
+    return result if isinstance(result, list) else [result]
+
+
+def _record_predictions(converter, result):
+    """
+    Worker process hiệu chỉnh bản SizePredictor riêng của nó: cập nhật cả bản ở
+    process chính để model được lưu lại có đủ quan sát
+    """
+    if converter.predictor is not None:
+        for item in _expand(result):
+            converter.predictor.record(item)
+
+
+def _record_trace(converter, result):
+    """Span đo trong worker process đi kèm kết quả: chuyển vào tracer của process chính"""
+    if converter.tracer is not None:
+        for item in _expand(result):
+            converter.tracer.record(item)
+
+
+def _update_queue(converter, running, waiting=0):
+    """Cập nhật gauge độ sâu hàng đợi (nếu converter có metrics)"""
+    if converter.metrics is not None:
+        converter.metrics.set_queue(running, waiting)
+
+
+def _report(converter, progress_callback, result):
+    if converter.metrics is not None:
+        for item in _expand(result):
+            converter.metrics.observe(item)
+    if progress_callback:
+        for item in _expand(result):
+            progress_callback(item)
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import __version__ as PILLOW_VERSION
+
+from .writer import OutputWriter
+
+# Dung lượng cache mặc định (1 GB)
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Kích thước mỗi lần đọc khi hash file nguồn
+HASH_CHUNK_SIZE = 1024 * 1024
+# Khi vượt giới hạn, xóa bớt tới mức này để không phải dọn lại sau mỗi lần ghi
+EVICT_TARGET_RATIO = 0.9
+# Tăng khi thay đổi pipeline làm output khác đi với cùng tùy chọn
+CACHE_VERSION = 2
+
+
+class OutputCache:
+    """
+    Cache output theo nội dung: key = hash nội dung file nguồn + định dạng đích +
+    toàn bộ tùy chọn convert. File giống hệt nhau (kể cả khác tên/đường dẫn) dùng
+    chung một output.
+    Output được lưu trong <cache_dir>/objects, chỉ mục SQLite ghi dung lượng và thời
+    điểm dùng gần nhất để loại bỏ theo LRU khi vượt max_bytes. SQLite cho phép nhiều
+    process cùng đọc/ghi nên dùng được với process pool.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, link=False):
+        """
+        :param cache_dir: Thư mục lưu cache
+        :param max_bytes: Tổng dung lượng tối đa của cache
+        :param link: Khi hit, tạo hard link thay vì copy (nhanh, không tốn thêm dung lượng,
+                     nhưng sửa file output sẽ sửa luôn bản trong cache)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+
+        self._objects_dir = os.path.join(cache_dir, "objects")
+        os.makedirs(self._objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._total_bytes = None
+
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " metadata TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    def __getstate__(self):
+        # Kết nối SQLite và lock không pickle được: worker process tự mở lại
+        state = self.__dict__.copy()
+        del state["_lock"], state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        """Mỗi thread dùng một kết nối SQLite riêng"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                os.path.join(self.cache_dir, "index.sqlite"), timeout=30, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _object_path(self, key):
+        return os.path.join(self._objects_dir, key[:2], key)
+
+    def content_hash(self, input_path):
+        """Hash nội dung file nguồn (đọc theo từng khối, không giữ cả file trong bộ nhớ)"""
+        digest = hashlib.sha256()
+        with open(input_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def key(self, content_hash, output_format, options):
+        """
+        Tính key cache cho một lần convert
+        :param content_hash: Kết quả content_hash() của file nguồn
+        :param options: ConverterOptions đang dùng
+        """
+        digest = hashlib.sha256(content_hash.encode("utf-8"))
+        digest.update(f"{CACHE_VERSION}:{PILLOW_VERSION}:".encode("utf-8"))
+        digest.update(options.fingerprint(output_format).encode("utf-8"))
+        return digest.hexdigest()
+
+    def restore(self, key, output_path, writer=None):
+        """
+        Khôi phục output từ cache
+        :param writer: (OutputWriter|None) Đặt file vào output_path qua file tạm + đổi tên với
+                       durability của writer (mặc định OutputWriter không fsync)
+        :return: dict metadata đã lưu khi store (None nếu miss)
+        """
+        connection = self._connection()
+        row = connection.execute("SELECT metadata FROM entries WHERE key = ?", (key,)).fetchone()
+        object_path = self._object_path(key)
+
+        if row is None or not os.path.exists(object_path):
+            if row is not None:
+                # File trong cache đã bị xóa ngoài ý muốn: bỏ luôn chỉ mục
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Output cũ chỉ bị thay khi bản mới đã nằm trọn trong file tạm cùng thư mục
+        (writer or OutputWriter()).copy(object_path, output_path, link=self.link)
+
+        connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def store(self, key, data, metadata):
+        """
+        Lưu output vừa encode vào cache
+        :param data: Dữ liệu output (bytes/memoryview) đã ghi ra file đích
+        :param metadata: dict (JSON được) trả lại khi restore, ví dụ kích thước ảnh
+        """
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+        # Ghi ra file tạm rồi đổi tên để process khác không đọc phải file dở dang
+        temp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, object_path)
+
+        size = len(data)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO entries (key, size, metadata, last_used) VALUES (?, ?, ?, ?)",
+            (key, size, json.dumps(metadata), time.time())
+        )
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._query_total_bytes()
+            else:
+                self._total_bytes += size
+            needs_eviction = self._total_bytes > self.max_bytes
+
+        if needs_eviction:
+            self.evict()
+
+    def _query_total_bytes(self):
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """Xóa các output dùng lâu nhất cho tới khi cache dưới giới hạn dung lượng"""
+        connection = self._connection()
+        total = self._query_total_bytes()
+        target = self.max_bytes * EVICT_TARGET_RATIO
+
+        if total > self.max_bytes:
+            rows = connection.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+            for key, size in rows:
+                if total <= target:
+                    break
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                try:
+                    os.remove(self._object_path(key))
+                except OSError:
+                    pass
+                total -= size
+
+        with self._lock:
+            self._total_bytes = total
+
+    def stats(self):
+        """Thống kê cache: số entry, dung lượng, hit/miss của instance này"""
+        entries, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups * 100 if lookups else 0
+        }
@@ -0,0 +1,65 @@
+import importlib
+import os
+import threading
+
+# Module đăng ký codec của từng định dạng, thử lần lượt tới module đầu tiên import được.
+# Import trước plugin cần dùng để Pillow không phải nạp toàn bộ plugin (Image.init()).
+CODEC_MODULES = {
+    "jpeg": ("PIL.JpegImagePlugin",),
+    "png": ("PIL.PngImagePlugin",),
+    "webp": ("PIL.WebPImagePlugin",),
+    # pillow-avif-plugin, hoặc plugin AVIF có sẵn từ Pillow 11.3
+    "avif": ("pillow_avif", "PIL.AvifImagePlugin"),
+    "bmp": ("PIL.BmpImagePlugin",),
+    "tiff": ("PIL.TiffImagePlugin",),
+    "gif": ("PIL.GifImagePlugin",),
+}
+# Phần mở rộng file nguồn -> định dạng
+EXTENSION_FORMATS = {
+    ".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp", ".avif": "avif",
+    ".bmp": "bmp", ".tif": "tiff", ".tiff": "tiff", ".gif": "gif",
+}
+
+_loaded = set()
+_lock = threading.Lock()
+
+
+def load_codec(fmt):
+    """
+    Nạp codec của một định dạng khi lần đầu cần tới (đọc hoặc ghi)
+    :param fmt: Tên định dạng ("jpg" được coi là "jpeg"), định dạng lạ thì bỏ qua
+    """
+    fmt = fmt.lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt in _loaded or fmt not in CODEC_MODULES:
+        return
+
+    with _lock:
+        if fmt in _loaded:
+            return
+        for module in CODEC_MODULES[fmt]:
+            try:
+                importlib.import_module(module)
+                break
+            except ImportError:
+                continue
+        else:
+            raise ImportError(f"Không có codec cho định dạng {fmt} (cài pillow-avif-plugin với AVIF)")
+        _loaded.add(fmt)
+
+
+def load_codec_for_path(path):
+    """Nạp codec theo phần mở rộng của file nguồn"""
+    fmt = EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is not None:
+        load_codec(fmt)
+
+
+def load_all_codecs():
+    """Nạp mọi codec, dùng khi phần mở rộng không khớp nội dung file"""
+    for fmt in CODEC_MODULES:
+        try:
+            load_codec(fmt)
+        except ImportError:
+            pass
@@ -1,9 +1,97 @@
+import io
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-import pillow_avif  # Đảm bảo đã cài pillow-avif-plugin
+
+from .animated import ANIMATED_FORMATS, FrameStream, is_animated
+from .backends import DEFAULT_BACKEND, _pil_format, apply_draft, get_backend, image_backend, select_backend
+from .codecs import load_codec
+from .batch import iter_batch, run_batch
+from .options import ConverterOptions
+from .resample import resample
+from .result import ConversionResult
+from .stats import StatsAccumulator
+from .timing import StageTimer, add_spans, timed
+from .tiled import (DEEPZOOM_OVERLAP, DEEPZOOM_TILE_SIZE, can_downscale_in_bands, check_pixels,
+                    estimate_band_bytes, open_image, write_deepzoom)
+from .walker import file_stat, scan_folder
+from .writer import OutputWriter
+
+# Giới hạn quality thấp nhất khi tìm kiếm theo dung lượng mục tiêu
+MIN_QUALITY = 10
+# Bước nhảy quanh quality gợi ý trước khi chuyển sang chia đôi
+HINT_STEP = 5
+# Số lần encode toàn ảnh tối đa theo quality dự đoán trước khi chuyển sang chia đôi
+PREDICTED_ENCODES = 2
+# Output đạt target và không nhỏ hơn target quá tỷ lệ này thì nhận luôn
+SIZE_TOLERANCE = 0.1
+# Các định dạng mà tham số quality thực sự ảnh hưởng tới dung lượng
+LOSSY_FORMATS = ("jpeg", "jpg", "webp", "avif")
+# Thư mục output mặc định, tạo cạnh file gốc
+DEFAULT_OUTPUT_DIR = "convert"
+# Số byte mỗi pixel Pillow dùng trong bộ nhớ theo mode (RGB cũng lưu 4 byte/pixel)
+MODE_BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2}
+# Các chiều rộng mặc định cho srcset; None = giữ kích thước gốc
+DEFAULT_PYRAMID_WIDTHS = (320, 640, 1024, 1920, None)
+
+
+class _TargetSearch:
+    """Trạng thái tìm quality cho target size: khoảng [low, high] còn lại và các lần encode đã thử"""
+
+    def __init__(self, low, high, target_bytes):
+        self.low = low
+        self.high = high
+        self.target_bytes = target_bytes
+        self.best = None      # (quality, data) cao nhất đạt target
+        self.fallback = None  # (quality, data) thấp nhất đã thử nhưng không đạt
+        self.trials = 0
+
+    @property
+    def done(self):
+        return self.low > self.high
+
+    def record(self, quality, data):
+        """Ghi nhận một lần encode, thu hẹp khoảng tìm kiếm. Trả về True nếu đạt target"""
+        self.trials += 1
+        if len(data) <= self.target_bytes:
+            if self.best is None or quality > self.best[0]:
+                self.best = (quality, data)
+            self.low = max(self.low, quality + 1)
+            return True
+        
+        if self.fallback is None or quality < self.fallback[0]:
+            self.fallback = (quality, data)
+        self.high = min(self.high, quality - 1)
+        return False
+
+
+def _memory_source(source):
+    """
+    Nguồn ảnh trong bộ nhớ cho Pillow: (file-like, dung lượng byte).
+    bytes được bọc trong BytesIO không copy; file-like seek được dùng trực tiếp
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source), memoryview(source).nbytes
+    if not hasattr(source, "read"):
+        raise TypeError(f"Nguồn ảnh phải là bytes hoặc file-like, không phải {type(source).__name__}")
+    
+    try:
+        # Pillow đọc ảnh từ đầu file-like nên chỉ dùng trực tiếp khi đang ở vị trí 0
+        if source.tell() == 0:
+            size = source.seek(0, io.SEEK_END)
+            source.seek(0)
+            return source, size
+    except (AttributeError, OSError):
+        pass
+    data = source.read()
+    return io.BytesIO(data), len(data)
+
 
 class ImageFormatConverter:
-    def __init__(self, max_size_kb=None, quality=95, compression_percent=None, target_width=None, target_height=None, maintain_aspect_ratio=True):
+    def __init__(self, max_size_kb=None, quality=95, compression_percent=None, target_width=None, target_height=None, maintain_aspect_ratio=True, resample_tier="best", backend="pillow", options=None, cache=None, predictor=None, tracer=None, metrics=None,
+                 writer=None):
         """
         :param max_size_kb: (int|None) Nén ảnh nhỏ hơn dung lượng này (KB). None = không nén.
         :param quality: Chất lượng ảnh (20-100), càng cao càng nét.
@@ -11,17 +99,83 @@ class ImageFormatConverter:
         :param target_width: (int|None) Chiều rộng mục tiêu (px).
         :param target_height: (int|None) Chiều cao mục tiêu (px).
         :param maintain_aspect_ratio: (bool) Giữ tỷ lệ khung hình khi resize.
+        :param resample_tier: (str) Mức resample: "fast", "balanced" hoặc "best".
+        :param backend: (str) Backend xử lý ảnh: "pillow", "vips" (cần pyvips), "auto"
+                        (chọn theo benchmark/kích thước ảnh) hoặc theo định dạng "webp:vips,jpeg:pillow".
+        :param options: (ConverterOptions|None) Dùng trực tiếp bộ tùy chọn bất biến này
+                        thay cho các tham số riêng lẻ ở trên.
+        :param cache: (OutputCache|None) Cache output theo nội dung file nguồn, hit thì bỏ qua encode.
+        :param predictor: (SizePredictor|None) Dự đoán quality cho max_size_kb/compression_percent
+                          để bỏ qua phần lớn các lần encode thử.
+        :param tracer: (ChromeTrace|None) Ghi span từng file và từng giai đoạn để xem trong trace viewer.
+        :param metrics: (ConversionMetrics|None) Metric Prometheus, cập nhật bởi batch engine
+                        (convert_multiple, convert_folder, iter_convert).
+        :param writer: (OutputWriter|None) Ghi output qua file tạm + đổi tên, có thể trên thread riêng
+                       và với fsync (mặc định ghi ngay, không fsync).
         """
-        self.max_size_kb = max_size_kb
-        self.quality = quality
-        self.compression_percent = compression_percent
-        self.target_width = target_width
-        self.target_height = target_height
-        self.maintain_aspect_ratio = maintain_aspect_ratio
+        if options is None:
+            options = ConverterOptions(
+                max_size_kb=max_size_kb,
+                quality=quality,
+                compression_percent=compression_percent,
+                target_width=target_width,
+                target_height=target_height,
+                maintain_aspect_ratio=maintain_aspect_ratio,
+                resample_tier=resample_tier,
+                backend=backend
+            )
+        # Tùy chọn là bất biến nên một converter có thể dùng chung giữa nhiều thread
+        self.options = options
+        self.cache = cache
+        self.predictor = predictor
+        self.tracer = tracer
+        self.metrics = metrics
+        self.writer = writer or OutputWriter()
         
         # Các định dạng hỗ trợ
         self.supported_formats = ["jpeg", "jpg", "png", "webp", "avif", "bmp", "tiff", "gif"]
-        self.input_extensions = (".png", ".jpg", ".jpeg", ".webp", ".avif", ".bmp", ".tiff", ".gif")
+        self.input_extensions = (".png", ".jpg", ".jpeg", ".webp", ".avif", ".bmp", ".tif", ".tiff", ".gif")
+        
+        # Quality đạt target gần nhất theo từng định dạng, dùng làm điểm bắt đầu tìm kiếm.
+        # Chỉ là gợi ý nên đọc/ghi đồng thời từ nhiều thread không ảnh hưởng kết quả.
+        self._quality_hints = {}
+
+    @classmethod
+    def from_options(cls, options, cache=None, predictor=None, tracer=None, metrics=None, writer=None):
+        """Tạo converter từ một ConverterOptions"""
+        return cls(options=options, cache=cache, predictor=predictor, tracer=tracer, metrics=metrics, writer=writer)
+
+    @property
+    def max_size_kb(self):
+        return self.options.max_size_kb
+
+    @property
+    def quality(self):
+        return self.options.quality
+
+    @property
+    def compression_percent(self):
+        return self.options.compression_percent
+
+    @property
+    def target_width(self):
+        return self.options.target_width
+
+    @property
+    def target_height(self):
+        return self.options.target_height
+
+    @property
+    def maintain_aspect_ratio(self):
+        return self.options.maintain_aspect_ratio
+
+    @property
+    def resample_tier(self):
+        return self.options.resample_tier
+
+    @property
+    def backend(self):
+        return self.options.backend
 
     def convert(self, input_path, output_format, output_path=None):
         """
@@ -31,91 +185,562 @@ class ImageFormatConverter:
         :param output_path: Đường dẫn lưu ảnh đích (mặc định tạo thư mục convert)
         :return: dict với thông tin kết quả
         """
-        if not os.path.exists(input_path):
-            return {"success": False, "error": f"File không tồn tại: {input_path}"}
+        return self.convert_formats(input_path, [output_format], [output_path])[0]
+
+    def convert_formats(self, input_path, output_formats, output_paths=None, parallel=True):
+        """
+        Decode và resize ảnh một lần rồi encode ra nhiều định dạng từ cùng dữ liệu pixel.
+        :param input_path: Đường dẫn file ảnh nguồn
+        :param output_formats: List định dạng đích, ví dụ ["webp", "avif", "jpeg"]
+        :param output_paths: List đường dẫn đích tương ứng (None = mặc định tạo thư mục convert)
+        :param parallel: Encode các định dạng song song bằng thread (Pillow nhả GIL khi encode)
+        :return: List dict kết quả, mỗi định dạng một dict theo đúng thứ tự output_formats
+        """
+        return self.writer.settle(self._start_formats(input_path, output_formats, output_paths, parallel))
+
+    def _start_formats(self, input_path, output_formats, output_paths=None, parallel=True):
+        """
+        Như convert_formats nhưng không chờ writer ghi xong (khi ghi nền): batch engine
+        chờ phần ghi mà không chặn worker
+        """
+        if output_paths is None:
+            output_paths = [None] * len(output_formats)
+        
+        started = time.perf_counter()
+        results = self._convert_formats(input_path, output_formats, output_paths, parallel)
+        
+        self._trace_file(input_path, output_formats, started, results)
+        return results
+
+    def convert_bytes(self, source, output_format, name=None):
+        """
+        Convert ảnh nằm trong bộ nhớ (ví dụ file upload) mà không đọc/ghi file nào, dùng chung
+        mọi tùy chọn với convert(). Luôn dùng Pillow; cache output không áp dụng.
+        :param source: bytes/bytearray/memoryview, hoặc file-like nhị phân. bytes được đọc
+                       trực tiếp không copy
+        :param output_format: Định dạng đích
+        :param name: Tên hiển thị trong kết quả (input_path), ví dụ tên file upload
+        :return: (dữ liệu output dạng bytes-like — thường là memoryview, None nếu lỗi;
+                 ConversionResult với output_path None)
+        """
+        if output_format.lower() not in self.supported_formats:
+            return None, ConversionResult.failure(name, f"Định dạng không hỗ trợ: {output_format}")
+        
+        started = time.perf_counter()
+        try:
+            fp, original_size = _memory_source(source)
+            if output_format.lower() in ANIMATED_FORMATS and self._is_animated(fp):
+                data, result = self._encode_animation(fp, original_size, output_format, None)
+                # input_path của kết quả là file-like nguồn
+                result["input_path"] = name
+            else:
+                timer = self._timer()
+                img, original_dimensions = self._load_image(fp, get_backend(DEFAULT_BACKEND), timer=timer)
+                data, result = self._encode_output(img, name, original_size, original_dimensions,
+                                                   output_format, None, timer=timer)
+        except Exception as e:
+            data, result = None, ConversionResult.failure(name, str(e))
         
+        self._trace_file(name or "<memory>", [output_format], started, [result])
+        return data, result
+
+    def convert_image(self, img, output_format, original_size=None, name=None):
+        """
+        Convert một ảnh PIL đã mở (chỉ frame hiện tại) ra dữ liệu trong bộ nhớ với các tùy
+        chọn của converter. Ảnh đầu vào không bị sửa.
+        :param img: PIL.Image
+        :param output_format: Định dạng đích
+        :param original_size: Dung lượng nguồn (byte) cho thống kê và compression_percent
+                              (None = không biết, compression_percent khi đó báo lỗi)
+        :param name: Tên hiển thị trong kết quả (input_path)
+        :return: (dữ liệu output hoặc None nếu lỗi, ConversionResult) như convert_bytes
+        """
         if output_format.lower() not in self.supported_formats:
-            return {"success": False, "error": f"Định dạng không hỗ trợ: {output_format}"}
+            return None, ConversionResult.failure(name, f"Định dạng không hỗ trợ: {output_format}")
+        if original_size is None and self.compression_percent:
+            return None, ConversionResult.failure(name, "compression_percent cần original_size của ảnh nguồn")
         
+        started = time.perf_counter()
+        timer = self._timer()
         try:
-            # Mở ảnh và chuyển sang RGB nếu cần
-            img = Image.open(input_path)
-            if img.mode in ("RGBA", "LA") and output_format.lower() in ["jpeg", "jpg"]:
-                # Tạo nền trắng cho JPEG
-                background = Image.new("RGB", img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
-                img = background
-            elif img.mode not in ("RGB", "RGBA"):
-                img = img.convert("RGB")
-            
-            # Lưu kích thước gốc
-            original_size = os.path.getsize(input_path)
-            original_width, original_height = img.size
-            
-            # Resize ảnh nếu cần
-            img = self._resize_image(img)
+            check_pixels(img)
+            original_dimensions = img.size
+            target_size = self._compute_target_size(*original_dimensions)
+            backend = get_backend(DEFAULT_BACKEND)
+            processed = backend.finish(img, target_size, self.resample_tier, timer)
+            data, result = self._encode_output(processed, name, original_size or 0, original_dimensions,
+                                               output_format, None, timer=timer)
+        except Exception as e:
+            data, result = None, ConversionResult.failure(name, str(e))
+        
+        self._trace_file(name or "<memory>", [output_format], started, [result])
+        return data, result
+
+    def _convert_formats(self, input_path, output_formats, output_paths, parallel):
+        """Phần xử lý của convert_formats (xem docstring ở đó)"""
+        if not os.path.exists(input_path):
+            return [ConversionResult.failure(input_path, f"File không tồn tại: {input_path}")
+                    for _ in output_formats]
+        
+        results = [None] * len(output_formats)
+        pending = []  # (index, output_format, output_path, cache_key) cần encode
+        
+        try:
+            original_size = file_stat(input_path).st_size
+            # Hash nội dung một lần cho mọi định dạng
+            content_hash = self.cache.content_hash(input_path) if self.cache is not None else None
+        except Exception as e:
+            return [ConversionResult.failure(input_path, str(e)) for _ in output_formats]
+        
+        for index, (output_format, output_path) in enumerate(zip(output_formats, output_paths)):
+            if output_format.lower() not in self.supported_formats:
+                results[index] = ConversionResult.failure(input_path, f"Định dạng không hỗ trợ: {output_format}")
+                continue
             
-            # Tạo đường dẫn output
-            if output_path is None:
-                # Tạo thư mục convert trong thư mục chứa file gốc
-                input_dir = os.path.dirname(input_path)
-                convert_dir = os.path.join(input_dir, "convert")
-                os.makedirs(convert_dir, exist_ok=True)
+            try:
+                output_path = self._resolve_output_path(input_path, output_format, output_path)
                 
-                # Lấy tên file gốc (không có extension)
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_path = os.path.join(convert_dir, f"{base_name}.{output_format.lower()}")
-            else:
-                # Nếu có output_path được chỉ định, tạo thư mục nếu cần
-                output_dir = os.path.dirname(output_path)
-                if output_dir:
-                    os.makedirs(output_dir, exist_ok=True)
+                # Tra cache trước khi decode: hit thì chỉ cần copy output đã có
+                cache_key = None
+                if self.cache is not None:
+                    cache_key = self.cache.key(content_hash, output_format, self.options)
+                    timer = self._timer()
+                    with timer.stage("write"):
+                        cached = self.cache.restore(cache_key, output_path, self.writer)
+                    if cached is not None:
+                        results[index] = self._build_result(
+                            input_path, output_path, original_size, cached["new_size"],
+                            tuple(cached["original_dimensions"]), tuple(cached["new_dimensions"])
+                        )
+                        results[index]["cache_hit"] = True
+                        timer.apply(results[index])
+                        continue
+                
+                pending.append((index, output_format, output_path, cache_key))
+            except Exception as e:
+                results[index] = ConversionResult.failure(input_path, str(e))
+        
+        if not pending:
+            return results
+        
+        # Ảnh động: các định dạng ghi được nhiều frame được encode theo từng frame,
+        # các định dạng còn lại dùng frame đầu như ảnh tĩnh
+        animated = set()
+        if any(job[1].lower() in ANIMATED_FORMATS for job in pending) and self._is_animated(input_path):
+            animated = {job[0] for job in pending if job[1].lower() in ANIMATED_FORMATS}
+        
+        # Ảnh tĩnh: decode một lần cho mỗi backend được chọn (thường chỉ một)
+        groups = {}  # backend -> các job dùng backend đó
+        for job in pending:
+            if job[0] in animated:
+                continue
+            try:
+                backend = select_backend(self.backend, input_path, job[1])
+                groups.setdefault(backend, []).append(job)
+            except Exception as e:
+                results[job[0]] = ConversionResult.failure(input_path, str(e))
+        
+        loaded = {}  # index -> (ảnh đã xử lý, kích thước gốc, timer đo phần decode hoặc None)
+        load_spans = []  # (index, span decode của nhóm) khi bật trace
+        for backend, jobs in groups.items():
+            # Pipeline đọc tuần tự (vips) chỉ chạy được một lần nếu không giữ kết quả trong bộ nhớ
+            multi_pass = len(jobs) > 1 or any(self._needs_target_search(job[1]) for job in jobs)
+            timer = self._timer()
+            try:
+                img, original_dimensions = self._load_image(input_path, backend, multi_pass, timer)
+            except Exception as e:
+                for job in jobs:
+                    results[job[0]] = ConversionResult.failure(input_path, str(e))
+                continue
+            for job in jobs:
+                # Decode dùng chung chỉ tính vào kết quả đầu tiên của nhóm, các kết quả khác chỉ có
+                # phần encode/ghi của riêng mình, nên tổng theo giai đoạn không đếm decode nhiều lần
+                loaded[job[0]] = (img, original_dimensions, timer if job is jobs[0] else None)
+            if timer.spans:
+                # Trace chỉ cần một span decode cho cả nhóm: gắn vào kết quả đầu tiên của nhóm
+                load_spans.append((jobs[0][0], timer.spans))
+        
+        pending = [job for job in pending if job[0] in animated or job[0] in loaded]
+        
+        def encode(job):
+            index, output_format, output_path, cache_key = job
+            if index in animated:
+                return self._encode_animation(input_path, original_size, output_format, output_path, cache_key)[1]
+            img, original_dimensions, timer = loaded[index]
+            return self._encode_output(img, input_path, original_size, original_dimensions,
+                                       output_format, output_path, cache_key,
+                                       timer.copy() if timer is not None else None)[1]
+        
+        if parallel and len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                for job, result in zip(pending, executor.map(encode, pending)):
+                    results[job[0]] = result
+        else:
+            for job in pending:
+                results[job[0]] = encode(job)
+        
+        for index, spans in load_spans:
+            add_spans(results[index], spans)
+        
+        return results
+
+    def _load_image(self, input_path, backend=None, multi_pass=True, timer=None):
+        """
+        Mở, decode, chuẩn hóa mode và resize ảnh (phần dùng chung cho mọi định dạng đích)
+        :param backend: Backend xử lý ảnh (mặc định Pillow)
+        :param multi_pass: Ảnh có thể được encode nhiều lần
+        :param timer: (StageTimer|None) Đo thời gian từng giai đoạn
+        :return: (ảnh đã xử lý, kích thước gốc)
+        """
+        if backend is None:
+            backend = get_backend(DEFAULT_BACKEND)
+        return backend.load(input_path, self._compute_target_size, self.resample_tier, multi_pass, timer)
+
+    def _trace_file(self, input_path, output_formats, started, results):
+        """Ghi span của cả file (trên thread đã nhận job) cùng các span giai đoạn vào tracer"""
+        if self.tracer is None or not results:
+            return
+        
+        add_spans(results[0], [["file", threading.get_ident(), started, time.perf_counter(),
+                                {"file": input_path, "formats": list(output_formats)}]])
+        for result in results:
+            self.tracer.record(result)
+
+    def _timer(self):
+        """Timer cho một job, giữ cả span khi có tracer"""
+        return StageTimer(trace=self.tracer is not None)
+
+    def _needs_target_search(self, output_format):
+        """Định dạng này có phải encode nhiều lần để tìm quality theo dung lượng mục tiêu không"""
+        return bool(self.max_size_kb or self.compression_percent) and output_format.lower() in LOSSY_FORMATS
+
+    def _prepare_for_format(self, img, output_format):
+        """Chuẩn bị ảnh cho một định dạng đích cụ thể"""
+        return image_backend(img).prepare(img, output_format)
+
+    def _encode_output(self, img, input_path, original_size, original_dimensions, output_format, output_path, cache_key=None,
+                       timer=None):
+        """
+        Encode ảnh đã xử lý ra một định dạng, ghi file và tạo kết quả
+        :param output_path: File đích (None = chỉ encode trong bộ nhớ, không ghi file)
+        :param timer: (StageTimer|None) Timer của job, đã có thời gian decode (mặc định tạo mới)
+        :return: (dữ liệu đã encode, kết quả) — dữ liệu là None khi lỗi
+        """
+        if timer is None:
+            timer = self._timer()
+        try:
+            backend = image_backend(img)
+            with timer.stage("mode"):
+                prepared = backend.prepare(img, output_format)
             
             # Lưu ảnh
-            img = self._save_with_compression(img, output_path, output_format, original_size)
+            data, details = self._save_with_compression(prepared, output_path, output_format, original_size, timer)
+            new_size = len(data)
             
-            # Tính toán thống kê
-            new_size = os.path.getsize(output_path)
+            result = self._build_result(
+                input_path, output_path, original_size, new_size, original_dimensions, backend.size(prepared)
+            )
+            result["backend"] = backend.name
+            result.update(details)
+            self._store_output(cache_key, data, result, timer)
+            return data, timer.apply(result)
             
-            # Tính compression ratio (có thể âm nếu file tăng kích thước)
-            if original_size > 0:
-                compression_ratio = ((original_size - new_size) / original_size) * 100
-            else:
-                compression_ratio = 0
+        except Exception as e:
+            return None, ConversionResult.failure(input_path, str(e))
+
+    def _encode_animation(self, input_path, original_size, output_format, output_path, cache_key=None):
+        """
+        Encode ảnh động (GIF, WebP, APNG, TIFF nhiều trang) giữ nguyên mọi frame.
+        Frame được decode, resize và encode lần lượt nên bộ nhớ chỉ giữ một frame đã decode.
+        :param input_path: File nguồn, hoặc file-like nhị phân (convert_bytes)
+        :return: (dữ liệu đã encode, kết quả) như _encode_output
+        """
+        # Frame được decode và resize ngay trong lúc encode nên thời gian encode gồm cả phần đó
+        timer = self._timer()
+        try:
+            # WebP/AVIF/GIF cần mọi frame cùng kích thước, TIFF giữ kích thước riêng từng trang
+            with timer.stage("open"):
+                stream = FrameStream(input_path, self._prepare_frame, fixed_size=output_format.lower() != "tiff")
+            try:
+                data, details = self._save_with_compression(stream, output_path, output_format, original_size, timer)
+                result = self._build_result(
+                    input_path, output_path, original_size, len(data), stream.source_size, stream.canvas_size
+                )
+                result["frames"] = stream.n_frames
+                result["backend"] = "pillow"
+            finally:
+                stream.close()
             
-            # Xác định loại thay đổi
-            if new_size < original_size:
-                change_type = "compressed"
-                space_change = original_size - new_size
-            elif new_size > original_size:
-                change_type = "expanded"
-                space_change = new_size - original_size
-            else:
-                change_type = "unchanged"
-                space_change = 0
+            result.update(details)
+            self._store_output(cache_key, data, result, timer)
+            return data, timer.apply(result)
+            
+        except Exception as e:
+            return None, ConversionResult.failure(input_path, str(e))
+
+    def _prepare_frame(self, frame, canvas_size=None):
+        """
+        Chuẩn hóa mode và resize một frame của ảnh động
+        :param canvas_size: Kích thước bắt buộc của frame (các frame sau theo frame đầu)
+        """
+        if frame.mode not in ("RGB", "RGBA"):
+            frame = frame.convert("RGBA" if frame.has_transparency_data else "RGB")
+        
+        frame = self._resize_image(frame)
+        if canvas_size is not None and frame.size != canvas_size:
+            frame = resample(frame, canvas_size, self.resample_tier)
+        return frame
+
+    def _is_animated(self, input_path):
+        """File nguồn có nhiều frame cần giữ hay không (chỉ đọc header)"""
+        try:
+            with open_image(input_path) as img:
+                return is_animated(img)
+        except Exception:
+            # Lỗi đọc file để đường xử lý ảnh tĩnh báo
+            return False
+
+    def _store_output(self, cache_key, data, result, timer=None):
+        """Lưu output vừa encode vào cache (nếu có), thời gian được tính vào giai đoạn write"""
+        if cache_key is None:
+            return
+        
+        with timed(timer, "write"):
+            self.cache.store(cache_key, data, {
+                "new_size": result["new_size"],
+                "original_dimensions": result["original_dimensions"],
+                "new_dimensions": result["new_dimensions"]
+            })
+        result["cache_hit"] = False
+
+    def _run_job(self, input_path, output_format, output_path=None):
+        """
+        Chạy một job của batch engine
+        :param output_format: Một định dạng, hoặc list/tuple định dạng (khi đó output_path
+                              là list/tuple đường dẫn tương ứng) để decode một lần
+        :return: dict kết quả, hoặc list dict nếu nhiều định dạng. Với writer ghi nền, file có
+                 thể chưa ghi xong: người gọi phải writer.settle() kết quả
+        """
+        if isinstance(output_format, (list, tuple)):
+            return self._start_formats(input_path, output_format, output_path)
+        return self._start_formats(input_path, [output_format], [output_path])[0]
+
+    def estimate_peak_memory(self, input_path, output_format):
+        """
+        Ước lượng bộ nhớ đỉnh (byte) khi convert một file mà chỉ cần đọc header ảnh:
+        ảnh decode (sau draft), bản chuyển mode, ảnh sau resize, cộng thêm nền trắng
+        cho JPEG và buffer encode của từng định dạng đích.
+        :param output_format: Định dạng đích, hoặc list định dạng (job fan-out)
+        :return: Số byte ước lượng (0 nếu không đọc được header, job sẽ lỗi nhanh)
+        """
+        output_formats = output_format if isinstance(output_format, (list, tuple)) else [output_format]
+        
+        try:
+            with open_image(input_path) as img:
+                original_dimensions = img.size
+                target_size = self._compute_target_size(*original_dimensions)
+                banded = can_downscale_in_bands(img, target_size)
+                # draft() chỉ đổi kích thước decode dự kiến, chưa decode pixel
+                self._apply_draft(img, target_size)
+                decoded_width, decoded_height = img.size
+                mode = img.mode
+        except Exception:
+            return 0
+        
+        decoded_pixels = decoded_width * decoded_height
+        target_width, target_height = target_size or original_dimensions
+        output_pixels = target_width * target_height
+        
+        if banded:
+            # Thu nhỏ theo dải: không bao giờ giữ cả ảnh gốc
+            peak = estimate_band_bytes(original_dimensions, target_size)
+        else:
+            peak = decoded_pixels * MODE_BYTES_PER_PIXEL.get(mode, 4)
+            if mode not in ("RGB", "RGBA"):
+                peak += decoded_pixels * 4
+            if (target_width, target_height) != (decoded_width, decoded_height):
+                peak += output_pixels * 4
+        
+        for fmt in output_formats:
+            # Buffer encode (trường hợp xấu gần bằng ảnh thô) và nền trắng khi RGBA -> JPEG
+            peak += output_pixels * 4
+            if mode == "RGBA" and fmt.lower() in ["jpeg", "jpg"]:
+                peak += output_pixels * 4
+        
+        return peak
+
+    def convert_pyramid(self, input_path, output_format, widths=DEFAULT_PYRAMID_WIDTHS, output_folder=None):
+        """
+        Tạo nhiều mức phân giải (srcset) từ một lần decode. Mỗi mức được thu nhỏ từ mức
+        lớn hơn liền trước thay vì từ ảnh gốc, nên tổng số pixel phải xử lý ít hơn nhiều
+        so với resize độc lập cho từng chiều rộng. Output đặt tên dạng name@640w.webp.
+        target_width/target_height bị bỏ qua, các tùy chọn nén vẫn áp dụng cho từng mức.
+        :param input_path: Đường dẫn file ảnh nguồn
+        :param output_format: Định dạng đích, hoặc list định dạng (mỗi mức encode mọi định dạng)
+        :param widths: Các chiều rộng cần tạo (px), None = kích thước gốc.
+                       Chiều rộng lớn hơn ảnh gốc bị bỏ qua (không phóng to)
+        :param output_folder: Thư mục lưu kết quả (mặc định thư mục convert cạnh file nguồn)
+        :return: List dict kết quả từ mức lớn tới nhỏ, mỗi dict có thêm "width"
+        """
+        output_formats = list(output_format) if isinstance(output_format, (list, tuple)) else [output_format]
+        
+        started = time.perf_counter()
+        results = self._convert_pyramid(input_path, output_formats, widths, output_folder)
+        self._trace_file(input_path, output_formats, started, results)
+        return self.writer.settle(results)
+
+    def _convert_pyramid(self, input_path, output_formats, widths, output_folder):
+        """Phần xử lý của convert_pyramid (xem docstring ở đó)"""
+        if not os.path.exists(input_path):
+            return [ConversionResult.failure(input_path, f"File không tồn tại: {input_path}")]
+        
+        for fmt in output_formats:
+            if fmt.lower() not in self.supported_formats:
+                return [ConversionResult.failure(input_path, f"Định dạng không hỗ trợ: {fmt}")]
+        
+        try:
+            original_size = file_stat(input_path).st_size
+            img = Image.open(input_path)
+            original_dimensions = img.size
+            original_width, original_height = original_dimensions
+            
+            levels = self._pyramid_levels(original_width, widths)
+            level_sizes = [(width, (width, max(1, round(original_height * width / original_width)))) for width in levels]
+            
+            # Chỉ cần decode đủ lớn cho mức lớn nhất
+            self._apply_draft(img, level_sizes[0][1])
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGB")
+            img.load()
             
-            return {
-                "success": True,
-                "input_path": input_path,
-                "output_path": output_path,
-                "original_size": original_size,
-                "new_size": new_size,
-                "compression_ratio": compression_ratio,
-                "change_type": change_type,
-                "space_change": space_change,
-                "original_dimensions": (original_width, original_height),
-                "new_dimensions": img.size
-            }
+            output_folder = output_folder or os.path.join(os.path.dirname(input_path), DEFAULT_OUTPUT_DIR)
+            self.writer.ensure_dir(output_folder)
+        except Exception as e:
+            return [ConversionResult.failure(input_path, str(e))]
+        
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        results = []
+        
+        with ThreadPoolExecutor(max_workers=len(output_formats)) as executor:
+            for width, size in level_sizes:
+                if img.size != size:
+                    # Thu nhỏ từ mức trước (đã nhỏ hơn ảnh gốc)
+                    img = resample(img, size, self.resample_tier)
+                
+                jobs = [
+                    (img, input_path, original_size, original_dimensions, fmt,
+                     os.path.join(output_folder, f"{base_name}@{width}w.{fmt.lower()}"))
+                    for fmt in output_formats
+                ]
+                for result in executor.map(lambda job: self._encode_output(*job)[1], jobs):
+                    result["width"] = width
+                    results.append(result)
+        
+        return results
+
+    def convert_deepzoom(self, input_path, output_format, output_folder=None, tile_size=DEEPZOOM_TILE_SIZE,
+                         overlap=DEEPZOOM_OVERLAP, workers=None):
+        """
+        Tạo tile pyramid Deep Zoom (<tên>.dzi + <tên>_files/) cho ảnh rất lớn (bản đồ scan,
+        ảnh hiển vi...). Ảnh được đọc theo dải nên bộ nhớ đỉnh phụ thuộc kích thước dải/tile
+        thay vì kích thước ảnh. Tùy chọn resize và nén theo dung lượng không áp dụng cho tile.
+        :param input_path: Đường dẫn file ảnh nguồn
+        :param output_format: Định dạng tile: "jpeg", "png", "webp",...
+        :param output_folder: Thư mục lưu kết quả (mặc định thư mục convert cạnh file nguồn)
+        :param tile_size: Kích thước tile (px, chưa tính overlap)
+        :param overlap: Số pixel chồng lấn giữa các tile
+        :param workers: Số thread encode tile (None = số CPU)
+        :return: dict kết quả (output_path là file .dzi, new_size là tổng dung lượng tile),
+                 có thêm "levels" và "tiles"
+        """
+        if not os.path.exists(input_path):
+            return ConversionResult.failure(input_path, f"File không tồn tại: {input_path}")
+        
+        if output_format.lower() not in self.supported_formats:
+            return ConversionResult.failure(input_path, f"Định dạng không hỗ trợ: {output_format}")
+        
+        try:
+            original_size = file_stat(input_path).st_size
+            output_folder = output_folder or os.path.join(os.path.dirname(input_path), DEFAULT_OUTPUT_DIR)
+            self.writer.ensure_dir(output_folder)
+            
+            pyramid = write_deepzoom(self, input_path, output_format, output_folder, tile_size, overlap, workers=workers)
+            
+            result = self._build_result(
+                input_path, pyramid["dzi_path"], original_size, pyramid["bytes"],
+                pyramid["dimensions"], pyramid["dimensions"]
+            )
+            result["levels"] = pyramid["levels"]
+            result["tiles"] = pyramid["tiles"]
+            return result
             
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return ConversionResult.failure(input_path, str(e))
 
-    def _resize_image(self, img):
-        """Resize ảnh theo các tham số đã đặt"""
-        if not self.target_width and not self.target_height:
-            return img
+    def _pyramid_levels(self, original_width, widths):
+        """Các chiều rộng của pyramid từ lớn tới nhỏ, bỏ trùng và bỏ mức lớn hơn ảnh gốc"""
+        levels = {original_width if width is None else width for width in widths}
+        levels = sorted((width for width in levels if 0 < width <= original_width), reverse=True)
+        return levels or [original_width]
+
+    def _default_output_path(self, input_path, output_format):
+        """Đường dẫn output mặc định: thư mục convert cạnh file gốc, giữ tên gốc"""
+        input_dir = os.path.dirname(input_path)
+        convert_dir = os.path.join(input_dir, DEFAULT_OUTPUT_DIR)
+        
+        # Lấy tên file gốc (không có extension)
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        return os.path.join(convert_dir, f"{base_name}.{output_format.lower()}")
+
+    def _resolve_output_path(self, input_path, output_format, output_path=None):
+        """Tạo đường dẫn output (và thư mục chứa nó) nếu chưa được chỉ định"""
+        if output_path is None:
+            # Tạo thư mục convert trong thư mục chứa file gốc
+            output_path = self._default_output_path(input_path, output_format)
+            self.writer.ensure_dir(os.path.dirname(output_path))
+        else:
+            # Nếu có output_path được chỉ định, tạo thư mục nếu cần
+            self.writer.ensure_dir(os.path.dirname(output_path))
         
-        current_width, current_height = img.size
+        return output_path
+
+    def _build_result(self, input_path, output_path, original_size, new_size, original_dimensions, new_dimensions):
+        """Tạo kết quả (ConversionResult) với các thống kê dung lượng"""
+        # Tính compression ratio (có thể âm nếu file tăng kích thước)
+        if original_size > 0:
+            compression_ratio = ((original_size - new_size) / original_size) * 100
+        else:
+            compression_ratio = 0
+        
+        # Xác định loại thay đổi
+        if new_size < original_size:
+            change_type = "compressed"
+            space_change = original_size - new_size
+        elif new_size > original_size:
+            change_type = "expanded"
+            space_change = new_size - original_size
+        else:
+            change_type = "unchanged"
+            space_change = 0
+        
+        return ConversionResult(
+            success=True,
+            # str(): không giữ stat của ScannedPath trong kết quả
+            input_path=str(input_path) if input_path is not None else None,
+            output_path=output_path,
+            original_size=original_size,
+            new_size=new_size,
+            compression_ratio=compression_ratio,
+            change_type=change_type,
+            space_change=space_change,
+            original_dimensions=original_dimensions,
+            new_dimensions=new_dimensions
+        )
+
+    def _compute_target_size(self, current_width, current_height):
+        """Tính kích thước sau resize theo các tham số đã đặt (None nếu không resize)"""
+        if not self.target_width and not self.target_height:
+            return None
         
         if self.maintain_aspect_ratio:
             if self.target_width and self.target_height:
@@ -137,12 +762,32 @@ class ImageFormatConverter:
             new_width = self.target_width or current_width
             new_height = self.target_height or current_height
         
-        return img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        return new_width, new_height
+
+    def _apply_draft(self, img, target_size):
+        """Decode JPEG ở tỷ lệ nhỏ hơn khi thu nhỏ (xem backends.apply_draft)"""
+        apply_draft(img, target_size)
+
+    def _resize_image(self, img, target_size=None):
+        """
+        Resize ảnh theo các tham số đã đặt
+        :param target_size: Kích thước đích đã tính từ ảnh gốc (mặc định tính từ img.size)
+        """
+        if target_size is None:
+            target_size = self._compute_target_size(*img.size)
+        if target_size is None or target_size == img.size:
+            return img
+        
+        return resample(img, target_size, self.resample_tier)
 
-    def _save_with_compression(self, img, output_path, output_format, original_size):
-        """Lưu ảnh với các tùy chọn nén"""
+    def _save_with_compression(self, img, output_path, output_format, original_size, timer=None):
+        """
+        Lưu ảnh với các tùy chọn nén
+        :param output_path: File đích (None = không ghi, chỉ trả về dữ liệu)
+        :param timer: (StageTimer|None) Ghi nhận từng lần encode và thời gian ghi file
+        :return: (dữ liệu đã ghi, dict chi tiết thêm vào kết quả: quality, số lần encode, dự đoán)
+        """
         params = self._get_save_params(output_format)
-        quality = self.quality
         
         # Nếu có compression_percent, tính toán target size
         target_size_kb = None
@@ -151,29 +796,140 @@ class ImageFormatConverter:
         elif self.max_size_kb:
             target_size_kb = self.max_size_kb
         
-        # Nén theo target size
-        if target_size_kb:
-            temp_path = output_path + ".tmp"
-            while quality >= 10:
-                img.save(temp_path, output_format.upper(), quality=quality, **params)
-                size_kb = os.path.getsize(temp_path) / 1024
-                
-                if size_kb <= target_size_kb:
-                    os.rename(temp_path, output_path)
-                    break
-                quality -= 5
-            else:
-                # Nếu không đạt được target size, lưu với quality thấp nhất
-                os.rename(temp_path, output_path)
+        # Encode trong bộ nhớ, chỉ ghi ra đĩa một lần với kết quả cuối cùng
+        details = {}
+        if target_size_kb and output_format.lower() in LOSSY_FORMATS:
+            data, details = self._encode_to_target(img, output_format, params, target_size_kb * 1024, timer)
+        else:
+            # PNG/BMP/TIFF/GIF bỏ qua quality nên chỉ cần encode một lần
+            data = self._encode(img, output_format, self.quality, params, timer)
+        
+        # Ghi nền: chỉ tính thời gian đưa vào hàng đợi, thời gian ghi thật được cộng khi settle
+        if output_path is not None:
+            with timed(timer, "write"):
+                future = self.writer.write(output_path, data)
+                if not self.writer.background:
+                    future.result()
+        
+        return data, details
+
+    def _encode(self, img, output_format, quality, params, timer=None):
+        """
+        Encode ảnh vào buffer trong bộ nhớ, trả về memoryview của dữ liệu
+        :param timer: (StageTimer|None) Ghi nhận lần encode này (quality, thời gian, dung lượng)
+        """
+        start = time.perf_counter()
+        if not isinstance(img, FrameStream):
+            data = image_backend(img).encode(img, output_format, quality, params)
         else:
-            img.save(output_path, output_format.upper(), quality=quality, **params)
+            load_codec(output_format)
+            buffer = io.BytesIO()
+            img.save_frames(buffer, _pil_format(output_format), quality=quality, **params)
+            data = buffer.getbuffer()
         
-        return img
+        if timer is not None:
+            timer.encoded(quality, start, len(data))
+        return data
+
+    def _encode_to_target(self, img, output_format, params, target_bytes, timer=None):
+        """
+        Tìm quality cao nhất cho dung lượng <= target_bytes.
+        Có predictor: encode toàn ảnh ở quality dự đoán từ ảnh mẫu, thường chỉ cần 1-2 lần.
+        Không có predictor (hoặc dự đoán chưa ra quality nào đạt): chia đôi, lần thử đầu
+        bắt đầu từ quality thành công gần nhất của định dạng.
+        :return: (dữ liệu đã encode, dict chi tiết) — quality thấp nhất nếu không đạt target
+        """
+        fmt = output_format.lower()
+        search = _TargetSearch(MIN_QUALITY, max(self.quality, MIN_QUALITY), target_bytes)
+        
+        estimate = None
+        # Mẫu lấy từ một frame không đại diện được cho cả animation; predictor cắt mẫu bằng Pillow
+        if self.predictor is not None and isinstance(img, Image.Image) and not isinstance(img, FrameStream):
+            estimate = self._encode_predicted(img, output_format, params, search, timer)
+        
+        if search.best is None and not search.done:
+            self._encode_bisect(img, output_format, params, search, self._quality_hints.get(fmt), timer)
+        
+        quality, data = search.best or search.fallback
+        self._quality_hints[fmt] = quality
+        details = {"quality": quality, "encode_trials": search.trials}
+        
+        if estimate is not None:
+            sample_estimate = estimate(quality)
+            details["predicted_size"] = int(self.predictor.predict(fmt, quality, sample_estimate))
+            details["size_prediction"] = {"format": fmt, "quality": quality, "sample_estimate": sample_estimate}
+            self.predictor.observe(fmt, quality, sample_estimate, len(data))
+        
+        return data, details
+
+    def _encode_predicted(self, img, output_format, params, search, timer=None):
+        """
+        Encode toàn ảnh ở quality do predictor chọn, tối đa PREDICTED_ENCODES lần. Sau mỗi
+        lần, sai lệch thực tế được dùng để hiệu chỉnh riêng cho ảnh này trước lần kế tiếp.
+        :return: callable(quality) -> dung lượng ước lượng từ mẫu, None nếu ảnh quá nhỏ để dự đoán
+        """
+        with timed(timer, "predict"):
+            sample = self.predictor.sample(img)
+        if sample is None:
+            return None
+        
+        fmt = output_format.lower()
+        scale = img.width * img.height / (sample.width * sample.height)
+        estimates = {}
+        
+        def estimate(quality):
+            # Encode mẫu rẻ hơn nhiều so với encode toàn ảnh, mỗi quality chỉ encode một lần
+            if quality not in estimates:
+                with timed(timer, "predict"):
+                    estimates[quality] = len(self._encode(sample, output_format, quality, params)) * scale
+            return estimates[quality]
+        
+        correction = 1.0
+        for _ in range(PREDICTED_ENCODES):
+            quality = self.predictor.predict_quality(
+                fmt, lambda q: estimate(q) * correction, search.low, search.high, search.target_bytes
+            )
+            if quality is None:
+                if search.trials:
+                    break
+                # Không quality nào được dự đoán là đạt: thử luôn quality thấp nhất
+                quality = search.low
+            
+            data = self._encode(img, output_format, quality, params, timer)
+            fits = search.record(quality, data)
+            
+            predicted = self.predictor.predict(fmt, quality, estimate(quality)) * correction
+            correction *= len(data) / max(predicted, 1)
+            
+            # Đạt target và đủ sát thì dừng, không cần tìm quality cao hơn
+            if search.done or (fits and len(data) >= search.target_bytes * (1 - SIZE_TOLERANCE)):
+                break
+        
+        return estimate
+
+    def _encode_bisect(self, img, output_format, params, search, hint=None, timer=None):
+        """
+        Chia đôi quality trong khoảng còn lại của search.
+        Có hint thì thử hint trước, sau đó thử một bước HINT_STEP để khoanh vùng rồi mới chia đôi.
+        """
+        probe = search.high if hint is None else min(max(hint, search.low), search.high)
+        first = True
+        
+        while not search.done:
+            fits = search.record(probe, self._encode(img, output_format, probe, params, timer))
+            
+            if first and hint is not None:
+                # Khoanh vùng quanh quality gợi ý trước khi chia đôi
+                probe = probe + HINT_STEP if fits else probe - HINT_STEP
+                probe = min(max(probe, search.low), search.high)
+            else:
+                probe = (search.low + search.high + 1) // 2
+            first = False
 
     def _get_save_params(self, fmt):
         """Trả về dict các params phù hợp định dạng."""
         params = {}
-        fmt_lower = fmt.lower()
+        fmt_lower = _pil_format(fmt).lower()
         
         if fmt_lower in ["jpeg", "jpg", "webp", "avif"]:
             params["optimize"] = True
@@ -186,176 +942,225 @@ class ImageFormatConverter:
         
         return params
 
-    def convert_multiple(self, input_paths, output_format, output_folder=None):
+    def convert_multiple(self, input_paths, output_format, output_folder=None, workers=1, progress_callback=None, mode="auto",
+                         max_memory=None):
         """
         Convert nhiều file ảnh được chọn
         :param input_paths: List đường dẫn các file ảnh
-        :param output_format: Định dạng đích
+        :param output_format: Định dạng đích, hoặc list định dạng (mỗi file chỉ decode một lần)
         :param output_folder: Thư mục lưu kết quả (mặc định tạo thư mục convert cho từng file)
-        :return: List kết quả cho từng file
+        :param workers: Số worker xử lý song song (1 = tuần tự, None/0 = toàn bộ CPU)
+        :param progress_callback: callable(result) gọi mỗi khi một file hoàn thành
+        :param mode: "threads", "processes" hoặc "auto" (tự chọn theo khối lượng công việc)
+        :param max_memory: Ngân sách bộ nhớ (byte) cho các file xử lý đồng thời (None = không giới hạn)
+        :return: List kết quả cho từng file (cùng thứ tự với input_paths)
         """
-        results = []
-        
-        for input_path in input_paths:
-            if not input_path.lower().endswith(self.input_extensions):
-                results.append({
-                    "success": False,
-                    "input_path": input_path,
-                    "error": "Định dạng file không hỗ trợ"
-                })
-                continue
-            
-            if output_folder:
-                # Tạo thư mục output nếu được chỉ định
-                os.makedirs(output_folder, exist_ok=True)
-                filename = os.path.basename(input_path)
-                base, _ = os.path.splitext(filename)
-                output_path = os.path.join(output_folder, f"{base}.{output_format.lower()}")
-            else:
-                # Sử dụng logic mặc định (tạo thư mục convert)
-                output_path = None
-            
-            result = self.convert(input_path, output_format, output_path)
-            results.append(result)
-        
-        return results
+        jobs = self._iter_jobs(input_paths, output_format, output_folder)
+        return run_batch(self, jobs, workers=workers, progress_callback=progress_callback, mode=mode,
+                         max_memory=max_memory)
 
-    def convert_folder(self, input_folder, output_format, output_folder=None, recursive=False):
+    def convert_folder(self, input_folder, output_format, output_folder=None, recursive=False, workers=1, progress_callback=None, mode="auto",
+                       manifest=None, force=False, max_memory=None, scan_workers=1):
         """
         Convert toàn bộ file ảnh trong folder
         :param input_folder: Thư mục nguồn
-        :param output_format: Định dạng đích
+        :param output_format: Định dạng đích, hoặc list định dạng (mỗi file chỉ decode một lần)
         :param output_folder: Thư mục lưu kết quả (mặc định tạo thư mục convert cho từng file)
         :param recursive: Duyệt đệ quy các thư mục con
+        :param workers: Số worker xử lý song song (1 = tuần tự, None/0 = toàn bộ CPU)
+        :param progress_callback: callable(result) gọi mỗi khi một file hoàn thành
+        :param mode: "threads", "processes" hoặc "auto" (tự chọn theo khối lượng công việc)
+        :param manifest: (ConversionManifest|None) Bỏ qua file có output vẫn còn mới (incremental)
+        :param force: Convert lại tất cả, không dựa vào manifest (manifest vẫn được cập nhật)
+        :param max_memory: Ngân sách bộ nhớ (byte) cho các file xử lý đồng thời (None = không giới hạn)
+        :param scan_workers: Số thread duyệt thư mục con song song (1 = tuần tự)
         :return: List kết quả cho từng file
         """
         if not os.path.exists(input_folder):
-            return [{"success": False, "error": f"Thư mục không tồn tại: {input_folder}"}]
+            return [ConversionResult.failure(None, f"Thư mục không tồn tại: {input_folder}")]
         
-        results = []
+        # Không duyệt lại output của các lần chạy trước trong thư mục convert mặc định
+        exclude_dirs = () if output_folder else (DEFAULT_OUTPUT_DIR,)
+        image_files = self.iter_folder(input_folder, recursive, exclude_dirs, scan_workers)
+        jobs = self._iter_jobs(image_files, output_format, output_folder, input_folder, manifest=manifest, force=force)
+        results = run_batch(self, jobs, workers=workers, progress_callback=progress_callback, mode=mode,
+                            max_memory=max_memory)
         
-        for root, _, filenames in os.walk(input_folder):
-            for filename in filenames:
-                if filename.lower().endswith(self.input_extensions):
-                    input_path = os.path.join(root, filename)
-                    
-                    if output_folder:
-                        # Tạo cấu trúc thư mục tương ứng
-                        rel_path = os.path.relpath(root, input_folder)
-                        target_dir = os.path.join(output_folder, rel_path)
-                        os.makedirs(target_dir, exist_ok=True)
-                        
-                        base, _ = os.path.splitext(filename)
-                        output_path = os.path.join(target_dir, f"{base}.{output_format.lower()}")
-                    else:
-                        # Sử dụng logic mặc định (tạo thư mục convert)
-                        output_path = None
-                    
-                    result = self.convert(input_path, output_format, output_path)
-                    results.append(result)
-            
-            if not recursive:
-                break
+        if manifest is not None:
+            for result in results:
+                manifest.record(result)
+            manifest.commit()
         
         return results
 
+    def iter_convert(self, paths_or_walker, output_format, output_folder=None, input_root=None,
+                     workers=1, mode="auto", max_in_flight=None, progress_callback=None,
+                     manifest=None, force=False, max_memory=None):
+        """
+        Generator convert từng file và trả kết quả ngay khi file đó hoàn thành.
+        Đường dẫn được lấy dần từ nguồn, số job đang xử lý bị giới hạn bởi max_in_flight,
+        nên có thể chạy trên hàng triệu file với bộ nhớ không đổi.
+        :param paths_or_walker: Iterable đường dẫn file (list, hoặc generator như iter_folder)
+        :param output_format: Định dạng đích, hoặc list định dạng (mỗi file chỉ decode một lần)
+        :param output_folder: Thư mục lưu kết quả (mặc định tạo thư mục convert cho từng file)
+        :param input_root: Thư mục gốc để giữ cấu trúc thư mục con trong output_folder
+        :param workers: Số worker xử lý song song (1 = tuần tự, None/0 = toàn bộ CPU)
+        :param mode: "threads", "processes" hoặc "auto"
+        :param max_in_flight: Số job tối đa đang chờ/đang chạy (mặc định gấp đôi số worker)
+        :param progress_callback: callable(result) gọi mỗi khi một file hoàn thành
+        :param manifest: (ConversionManifest|None) Bỏ qua file có output vẫn còn mới (incremental)
+        :param force: Convert lại tất cả, không dựa vào manifest (manifest vẫn được cập nhật)
+        :param max_memory: Ngân sách bộ nhớ (byte) cho các file xử lý đồng thời (None = không giới hạn)
+        :return: Generator các dict kết quả (theo thứ tự hoàn thành)
+        """
+        jobs = self._iter_jobs(paths_or_walker, output_format, output_folder, input_root,
+                               manifest=manifest, force=force)
+        results = iter_batch(self, jobs, workers=workers, mode=mode, max_in_flight=max_in_flight,
+                             progress_callback=progress_callback, max_memory=max_memory)
+        if manifest is not None:
+            results = manifest.track(results)
+        return results
+
+    def iter_folder(self, input_folder, recursive=False, exclude_dirs=(), scan_workers=1):
+        """
+        Duyệt thư mục và yield dần đường dẫn các file ảnh được hỗ trợ (ScannedPath, kèm stat
+        lấy lúc duyệt để không phải stat lại khi kiểm tra manifest/đọc kích thước)
+        :param input_folder: Thư mục nguồn
+        :param recursive: Duyệt đệ quy các thư mục con
+        :param exclude_dirs: Tên các thư mục con bỏ qua (ví dụ thư mục output "convert")
+        :param scan_workers: Số thread duyệt thư mục con song song (hữu ích trên NFS)
+        """
+        return scan_folder(input_folder, self.input_extensions, recursive, exclude_dirs, workers=scan_workers)
+
+    def _iter_jobs(self, input_paths, output_format, output_folder=None, input_root=None, manifest=None, force=False):
+        """
+        Tạo dần các job (input_path, output_format, output_path) cho batch engine.
+        output_format là list/tuple thì mỗi file thành một job nhiều định dạng
+        (input_path, (định dạng,...), (output_path,...)) để chỉ decode một lần.
+        File không hỗ trợ được trả về trực tiếp dưới dạng dict kết quả lỗi,
+        output còn mới theo manifest được trả về dưới dạng kết quả "skipped".
+        """
+        multiple = isinstance(output_format, (list, tuple))
+        output_formats = list(output_format) if multiple else [output_format]
+        fingerprints = {}
+        if manifest is not None:
+            fingerprints = {fmt: self.options.fingerprint(fmt) for fmt in output_formats}
+        
+        for input_path in input_paths:
+            if not input_path.lower().endswith(self.input_extensions):
+                for _ in output_formats:
+                    yield ConversionResult.failure(input_path, "Định dạng file không hỗ trợ")
+                continue
+            
+            if output_folder:
+                if input_root:
+                    # Tạo cấu trúc thư mục tương ứng
+                    rel_path = os.path.relpath(os.path.dirname(input_path), input_root)
+                    target_dir = os.path.normpath(os.path.join(output_folder, rel_path))
+                else:
+                    target_dir = output_folder
+                
+                # Writer chỉ tạo mỗi thư mục một lần
+                self.writer.ensure_dir(target_dir)
+                
+                base, _ = os.path.splitext(os.path.basename(input_path))
+                output_paths = [os.path.join(target_dir, f"{base}.{fmt.lower()}") for fmt in output_formats]
+            else:
+                # Sử dụng logic mặc định (tạo thư mục convert)
+                output_paths = [None] * len(output_formats)
+            
+            formats = []
+            paths = []
+            for fmt, output_path in zip(output_formats, output_paths):
+                if manifest is not None:
+                    # Manifest cần đường dẫn output cụ thể để kiểm tra
+                    if output_path is None:
+                        output_path = self._default_output_path(input_path, fmt)
+                    
+                    stored = manifest.check(input_path, output_path, fingerprints[fmt])
+                    if stored is not None and not force:
+                        result = self._build_result(
+                            input_path, stored["output_path"], stored["original_size"], stored["new_size"],
+                            tuple(stored["original_dimensions"]), tuple(stored["new_dimensions"])
+                        )
+                        result["skipped"] = True
+                        yield result
+                        continue
+                
+                formats.append(fmt)
+                paths.append(output_path)
+            
+            if not formats:
+                continue
+            if multiple:
+                yield (input_path, tuple(formats), tuple(paths))
+            else:
+                yield (input_path, formats[0], paths[0])
+
     def get_statistics(self, results):
-        """Tính toán thống kê từ kết quả convert"""
-        successful = [r for r in results if r.get("success")]
-        failed = [r for r in results if not r.get("success")]
-        
-        if not successful:
-            return {
-                "total_files": len(results),
-                "successful": 0,
-                "failed": len(failed),
-                "total_original_size": 0,
-                "total_new_size": 0,
-                "total_space_saved": 0,
-                "total_space_increased": 0,
-                "average_compression": 0,
-                "compressed_files": 0,
-                "expanded_files": 0,
-                "unchanged_files": 0
-            }
-        
-        total_original = sum(r["original_size"] for r in successful)
-        total_new = sum(r["new_size"] for r in successful)
-        
-        # Tính toán theo loại thay đổi
-        compressed_files = [r for r in successful if r.get("change_type") == "compressed"]
-        expanded_files = [r for r in successful if r.get("change_type") == "expanded"]
-        unchanged_files = [r for r in successful if r.get("change_type") == "unchanged"]
-        
-        total_space_saved = sum(r.get("space_change", 0) for r in compressed_files)
-        total_space_increased = sum(r.get("space_change", 0) for r in expanded_files)
-        
-        # Tính compression ratio trung bình (chỉ cho files được nén)
-        if compressed_files:
-            avg_compression = sum(r["compression_ratio"] for r in compressed_files) / len(compressed_files)
-        else:
-            avg_compression = 0
-        
-        return {
-            "total_files": len(results),
-            "successful": len(successful),
-            "failed": len(failed),
-            "total_original_size": total_original,
-            "total_new_size": total_new,
-            "total_space_saved": total_space_saved,
-            "total_space_increased": total_space_increased,
-            "average_compression": avg_compression,
-            "compressed_files": len(compressed_files),
-            "expanded_files": len(expanded_files),
-            "unchanged_files": len(unchanged_files)
-        }
+        """
+        Tính toán thống kê từ kết quả convert (một lượt qua results, nhận cả generator)
+        :return: dict thống kê (xem StatsAccumulator.as_dict)
+        """
+        return StatsAccumulator().update(results).as_dict()
 
     def print_statistics(self, results):
-        """In thống kê ra màn hình"""
-        stats = self.get_statistics(results)
+        """
+        In thống kê ra màn hình
+        :param results: Iterable kết quả, hoặc StatsAccumulator đã cộng dồn sẵn
+        """
+        stats = results if isinstance(results, StatsAccumulator) else StatsAccumulator().update(results)
         
         print(f"\n{'='*60}")
         print(f"KẾT QUẢ CHUYỂN ĐỔI")
         print(f"{'='*60}")
-        print(f"Tổng số file: {stats['total_files']}")
-        print(f"Thành công: {stats['successful']}")
-        print(f"Thất bại: {stats['failed']}")
+        print(f"Tổng số file: {stats.total_files}")
+        print(f"Thành công: {stats.successful}")
+        print(f"Thất bại: {stats.failed}")
         
-        if stats['successful'] > 0:
+        if stats.successful > 0:
             print(f"\n📊 THỐNG KÊ KÍCH THƯỚC:")
-            print(f"Dung lượng gốc: {stats['total_original_size']/1024:.2f} KB")
-            print(f"Dung lượng mới: {stats['total_new_size']/1024:.2f} KB")
+            print(f"Dung lượng gốc: {stats.total_original_size/1024:.2f} KB")
+            print(f"Dung lượng mới: {stats.total_new_size/1024:.2f} KB")
             
             # Hiển thị thông tin về compression/expansion
-            if stats['compressed_files'] > 0:
-                print(f"📉 Files được nén: {stats['compressed_files']}")
-                print(f"💾 Tiết kiệm: {stats['total_space_saved']/1024:.2f} KB")
-                print(f"📊 Tỷ lệ nén trung bình: {stats['average_compression']:.2f}%")
+            if stats.compressed_files > 0:
+                print(f"📉 Files được nén: {stats.compressed_files}")
+                print(f"💾 Tiết kiệm: {stats.total_space_saved/1024:.2f} KB")
+                print(f"📊 Tỷ lệ nén trung bình: {stats.average_compression:.2f}%")
             
-            if stats['expanded_files'] > 0:
-                print(f"📈 Files tăng kích thước: {stats['expanded_files']}")
-                print(f"📈 Tăng thêm: {stats['total_space_increased']/1024:.2f} KB")
+            if stats.expanded_files > 0:
+                print(f"📈 Files tăng kích thước: {stats.expanded_files}")
+                print(f"📈 Tăng thêm: {stats.total_space_increased/1024:.2f} KB")
             
-            if stats['unchanged_files'] > 0:
-                print(f"➡️ Files không thay đổi: {stats['unchanged_files']}")
+            if stats.unchanged_files > 0:
+                print(f"➡️ Files không thay đổi: {stats.unchanged_files}")
             
             # Tổng kết
-            net_change = stats['total_space_saved'] - stats['total_space_increased']
+            net_change = stats.net_change
             if net_change > 0:
                 print(f"\n✅ TỔNG KẾT: Tiết kiệm {net_change/1024:.2f} KB")
             elif net_change < 0:
                 print(f"\n⚠️ TỔNG KẾT: Tăng thêm {abs(net_change)/1024:.2f} KB")
             else:
                 print(f"\n➡️ TỔNG KẾT: Không thay đổi dung lượng")
+            
+            timing_rows = stats.timings.rows()
+            if timing_rows:
+                print(f"\n⏱️ THỜI GIAN THEO GIAI ĐOẠN (ms):")
+                for stage, summary in timing_rows:
+                    print(f"{stage:<13} tổng {summary['total_ms']:>10.1f}  p50 {summary['p50']:>8.1f}  "
+                          f"p90 {summary['p90']:>8.1f}  p99 {summary['p99']:>8.1f}  ({summary['count']} lần)")
         
         # In chi tiết file thất bại
-        failed_results = [r for r in results if not r.get("success")]
-        if failed_results:
+        if stats.failed_results:
             print(f"\n{'='*40}")
             print("❌ CHI TIẾT FILE THẤT BẠI:")
             print(f"{'='*40}")
-            for result in failed_results:
+            for result in stats.failed_results:
                 print(f"❌ {result.get('input_path', 'Unknown')}: {result.get('error', 'Unknown error')}")
+            if stats.omitted_failures:
+                print(f"... và {stats.omitted_failures} file lỗi khác")
 
 
 # Ví dụ sử dụng
@@ -388,4 +1193,4 @@ def main():
     # converter3.print_statistics(results)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+
+from .walker import file_stat
+
+# Số bản ghi gom lại trong một transaction trước khi commit
+COMMIT_INTERVAL = 500
+# Tên file manifest mặc định
+DEFAULT_MANIFEST_NAME = ".imageconverter-manifest.sqlite"
+
+
+class ConversionManifest:
+    """
+    Manifest cho convert tăng dần (incremental): ghi lại (đường dẫn, size, mtime_ns,
+    fingerprint tùy chọn) của file nguồn và output đã tạo ra. Lần chạy sau, file có
+    cùng size/mtime, cùng tùy chọn và output vẫn còn nguyên thì được bỏ qua mà không
+    cần đọc nội dung file — chỉ tốn hai lần stat.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Đường dẫn file manifest (SQLite)
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " input_path TEXT NOT NULL,"
+            " output_path TEXT NOT NULL,"
+            " input_size INTEGER NOT NULL,"
+            " input_mtime_ns INTEGER NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " output_size INTEGER NOT NULL,"
+            " output_mtime_ns INTEGER NOT NULL,"
+            " result TEXT NOT NULL,"
+            " PRIMARY KEY (input_path, output_path))"
+        )
+        self._uncommitted = 0
+        # Stat của file nguồn lúc kiểm tra, theo (input_path, output_path), dùng khi ghi nhận kết quả
+        self._pending = {}
+
+    def check(self, input_path, output_path, fingerprint):
+        """
+        Kiểm tra output của file nguồn có còn mới không
+        :return: dict kết quả đã lưu (None nếu cần convert lại)
+        """
+        try:
+            input_stat = file_stat(input_path)
+        except OSError:
+            return None
+
+        # Ghi nhớ stat trước khi convert: nếu file bị sửa trong lúc convert,
+        # lần chạy sau sẽ thấy khác và convert lại
+        self._pending[(input_path, output_path)] = (input_stat.st_size, input_stat.st_mtime_ns, fingerprint)
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT input_size, input_mtime_ns, fingerprint, output_size, output_mtime_ns, result"
+                " FROM entries WHERE input_path = ? AND output_path = ?",
+                (input_path, output_path)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        input_size, input_mtime_ns, stored_fingerprint, output_size, output_mtime_ns, result = row
+        if (input_size, input_mtime_ns, stored_fingerprint) != (input_stat.st_size, input_stat.st_mtime_ns, fingerprint):
+            return None
+
+        try:
+            output_stat = os.stat(output_path)
+        except OSError:
+            return None
+        if (output_size, output_mtime_ns) != (output_stat.st_size, output_stat.st_mtime_ns):
+            return None
+
+        return json.loads(result)
+
+    def record(self, result):
+        """
+        Ghi nhận kết quả của một file đã check(). Mọi kết quả (kể cả lỗi, bỏ qua)
+        đều phải đi qua đây để giải phóng stat đã ghi nhớ.
+        """
+        pending = self._pending.pop((result.get("input_path"), result.get("output_path")), None)
+        if pending is None or not result.get("success") or result.get("skipped"):
+            return
+
+        input_size, input_mtime_ns, fingerprint = pending
+        try:
+            output_stat = os.stat(result["output_path"])
+        except OSError:
+            return
+
+        stored = {
+            "output_path": result["output_path"],
+            "original_size": result["original_size"],
+            "new_size": result["new_size"],
+            "original_dimensions": result["original_dimensions"],
+            "new_dimensions": result["new_dimensions"]
+        }
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (result["input_path"], result["output_path"], input_size, input_mtime_ns, fingerprint,
+                 output_stat.st_size, output_stat.st_mtime_ns, json.dumps(stored))
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_INTERVAL:
+                self._connection.commit()
+                self._uncommitted = 0
+
+    def track(self, results):
+        """Bọc một generator kết quả, ghi nhận từng kết quả khi nó đi qua"""
+        try:
+            for result in results:
+                self.record(result)
+                yield result
+        finally:
+            self.commit()
+
+    def commit(self):
+        """Lưu các bản ghi còn trong transaction"""
+        with self._lock:
+            self._connection.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self._connection.close()
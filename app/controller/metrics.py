@@ -0,0 +1,288 @@
+import math
+import os
+import threading
+import time
+
+# Tiền tố tên metric
+METRIC_PREFIX = "imageconverter"
+# Bucket (giây) của histogram thời gian từng giai đoạn
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Bucket số lần encode toàn ảnh mỗi file
+TRIAL_BUCKETS = (1, 2, 3, 4, 6, 8, 12)
+# Chu kỳ ghi file metrics mặc định (giây)
+DEFAULT_EXPORT_INTERVAL = 15
+
+
+class _Metric:
+    """Metric có label, giá trị theo từng bộ label; thread-safe"""
+
+    type = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Lock không pickle được: bản trong worker process tự tạo lại
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} cần label {', '.join(self.labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def expose(self):
+        """Các dòng text format của Prometheus cho metric này"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{self._label_text(key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            # Bucket cuối là +Inf
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else _number(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(key, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registry metric trong process, xuất ra text format của Prometheus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Lock không pickle được: bản trong worker process tự tạo lại
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric đã tồn tại: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def expose(self):
+        """Toàn bộ metric dạng text (mỗi metric một khối HELP/TYPE + các mẫu)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """
+        Ghi metric ra file cho textfile collector của node_exporter: ghi file tạm trong cùng
+        thư mục rồi đổi tên, nên collector không bao giờ đọc phải file ghi dở
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.expose())
+        os.replace(tmp_path, path)
+
+
+class ConversionMetrics:
+    """
+    Metric của các lần convert: số file theo định dạng/trạng thái, byte vào/ra, thời gian
+    từng giai đoạn, số lần encode mỗi file và độ sâu hàng đợi của batch engine.
+    Kết quả được ghi nhận ở process điều phối (batch engine), nên dùng được với process pool.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.files = self.registry.counter(
+            f"{METRIC_PREFIX}_files_total",
+            "Files processed, by output format and status (converted, cached, skipped, failed)",
+            ("format", "status"))
+        self.input_bytes = self.registry.counter(
+            f"{METRIC_PREFIX}_input_bytes_total", "Bytes read from source files", ("format",))
+        self.output_bytes = self.registry.counter(
+            f"{METRIC_PREFIX}_output_bytes_total", "Bytes written to output files", ("format",))
+        self.stage_seconds = self.registry.histogram(
+            f"{METRIC_PREFIX}_stage_duration_seconds", "Time spent in each conversion stage", ("stage",))
+        self.encode_trials = self.registry.histogram(
+            f"{METRIC_PREFIX}_encode_trials", "Full-image encodes per converted file", ("format",),
+            buckets=TRIAL_BUCKETS)
+        self.queue_depth = self.registry.gauge(
+            f"{METRIC_PREFIX}_queue_depth",
+            "Jobs in the batch engine: running (submitted to workers) or waiting for memory", ("state",))
+        self.last_result = self.registry.gauge(
+            f"{METRIC_PREFIX}_last_result_timestamp_seconds", "Unix time of the last finished file")
+
+        for state in ("running", "waiting"):
+            self.queue_depth.set(0, state=state)
+
+    def observe(self, result):
+        """Ghi nhận một kết quả convert"""
+        fmt = _output_format(result)
+        if not result.get("success"):
+            status = "failed"
+        elif result.get("skipped"):
+            status = "skipped"
+        elif result.get("cache_hit"):
+            status = "cached"
+        else:
+            status = "converted"
+        self.files.inc(format=fmt, status=status)
+        self.last_result.set(time.time())
+
+        if status in ("failed", "skipped"):
+            return
+
+        self.input_bytes.inc(result["original_size"], format=fmt)
+        self.output_bytes.inc(result["new_size"], format=fmt)
+        for stage, ms in result.get("timings", {}).items():
+            self.stage_seconds.observe(ms / 1000, stage=stage)
+        if result.get("encode_timings"):
+            self.encode_trials.observe(len(result["encode_timings"]), format=fmt)
+
+    def set_queue(self, running, waiting=0):
+        self.queue_depth.set(running, state="running")
+        self.queue_depth.set(waiting, state="waiting")
+
+
+class TextfileExporter:
+    """
+    Ghi metric ra file định kỳ trên một thread nền, và một lần cuối khi dừng.
+
+    Ví dụ:
+        with TextfileExporter(metrics.registry, "/var/lib/node_exporter/imageconverter.prom"):
+            ...
+    """
+
+    def __init__(self, registry, path, interval=DEFAULT_EXPORT_INTERVAL):
+        """
+        :param path: File .prom trong thư mục textfile collector của node_exporter
+        :param interval: Chu kỳ ghi (giây)
+        """
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.registry.write_textfile(self.path)
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.registry.write_textfile(self.path)
+            except OSError:
+                # Lỗi ghi tạm thời (đĩa đầy...) không được làm dừng batch, lần sau ghi lại
+                pass
+
+    def stop(self):
+        """Dừng thread và ghi trạng thái cuối cùng"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.registry.write_textfile(self.path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _output_format(result):
+    """Định dạng đích của kết quả, lấy từ phần mở rộng của output ("unknown" nếu không có)"""
+    output_path = result.get("output_path")
+    if not output_path:
+        return "unknown"
+    fmt = os.path.splitext(output_path)[1][1:].lower()
+    return {"jpg": "jpeg", "dzi": "deepzoom"}.get(fmt, fmt or "unknown")
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,43 @@
+import json
+from dataclasses import asdict, dataclass, replace
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class ConverterOptions:
+    """
+    Tùy chọn convert bất biến (frozen). Có thể chia sẻ một instance giữa nhiều
+    thread/process; muốn thay đổi thì tạo bản mới bằng replace().
+    :param max_size_kb: Nén ảnh nhỏ hơn dung lượng này (KB). None = không nén.
+    :param quality: Chất lượng ảnh (20-100), càng cao càng nét.
+    :param compression_percent: Nén ảnh xuống còn X% kích thước gốc (10-100).
+    :param target_width: Chiều rộng mục tiêu (px).
+    :param target_height: Chiều cao mục tiêu (px).
+    :param maintain_aspect_ratio: Giữ tỷ lệ khung hình khi resize.
+    :param resample_tier: Mức resample khi resize: "fast", "balanced" hoặc "best".
+    :param backend: Backend xử lý ảnh: "pillow", "vips", "auto" hoặc theo định dạng
+                    ("webp:vips,jpeg:pillow"), xem controller.backends.
+    """
+    max_size_kb: Optional[int] = None
+    quality: int = 95
+    compression_percent: Optional[int] = None
+    target_width: Optional[int] = None
+    target_height: Optional[int] = None
+    maintain_aspect_ratio: bool = True
+    resample_tier: str = "best"
+    backend: str = "pillow"
+
+    def replace(self, **changes):
+        """Trả về bản sao với các tùy chọn được thay đổi"""
+        return replace(self, **changes)
+
+    def fingerprint(self, output_format):
+        """
+        Chuỗi định danh ổn định cho (định dạng đích, tùy chọn), dùng để biết output
+        cũ có còn đúng với cấu hình hiện tại hay không
+        """
+        options = asdict(self)
+        if options["backend"] == "pillow":
+            # Backend mặc định không đưa vào fingerprint để manifest/cache cũ vẫn còn đúng
+            del options["backend"]
+        return json.dumps({"format": output_format.lower(), "options": options}, sort_keys=True)
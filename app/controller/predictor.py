@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+
+from PIL import Image
+
+# Mẫu là lưới SAMPLE_GRID x SAMPLE_GRID vùng crop, mỗi vùng tối đa SAMPLE_CROP px
+SAMPLE_GRID = 3
+SAMPLE_CROP = 256
+# Chỉ dự đoán khi ảnh lớn hơn mẫu ít nhất chừng này lần, ảnh nhỏ thì thử trực tiếp còn rẻ hơn
+MIN_PIXEL_RATIO = 4
+# Hệ số hiệu chỉnh được lưu theo định dạng và nhóm quality
+QUALITY_BUCKET = 10
+# Trọng số tối thiểu của quan sát mới (EMA), các quan sát đầu tiên có trọng số lớn hơn
+LEARNING_RATE = 0.2
+# Tăng khi thay đổi cách lấy mẫu làm model cũ không còn đúng
+MODEL_VERSION = 1
+
+
+class SizePredictor:
+    """
+    Dự đoán dung lượng output theo quality để convert với max_size_kb/compression_percent
+    không phải chia đôi bằng nhiều lần encode toàn ảnh.
+    Dung lượng được suy ra từ một ảnh mẫu nhỏ (các vùng crop giữ nguyên độ phân giải, nên
+    mật độ chi tiết giống ảnh gốc), rồi nhân với hệ số hiệu chỉnh của từng định dạng/nhóm
+    quality. Hệ số được học từ dung lượng thực tế sau mỗi lần convert và lưu ra file JSON
+    để dùng lại giữa các lần chạy.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: File JSON lưu model (None = chỉ giữ trong bộ nhớ)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._model = {}  # định dạng -> {nhóm quality: {"ratio": hệ số, "count": số quan sát}}
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MODEL_VERSION:
+                self._model = data.get("formats", {})
+
+    def __getstate__(self):
+        # Lock không pickle được: worker process tự tạo lại
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def sample(self, img):
+        """
+        Ghép các vùng crop rải đều trên ảnh thành ảnh mẫu
+        :return: Ảnh mẫu, None nếu ảnh không đủ lớn để việc dự đoán có lợi
+        """
+        crop = min(SAMPLE_CROP, img.width // SAMPLE_GRID, img.height // SAMPLE_GRID)
+        side = crop * SAMPLE_GRID
+        if crop < 16 or img.width * img.height < side * side * MIN_PIXEL_RATIO:
+            return None
+
+        sample = Image.new(img.mode, (side, side))
+        for row in range(SAMPLE_GRID):
+            for column in range(SAMPLE_GRID):
+                # Tâm vùng crop nằm giữa ô tương ứng khi chia đều ảnh thành lưới
+                left = (2 * column + 1) * img.width // (2 * SAMPLE_GRID) - crop // 2
+                top = (2 * row + 1) * img.height // (2 * SAMPLE_GRID) - crop // 2
+                sample.paste(img.crop((left, top, left + crop, top + crop)), (column * crop, row * crop))
+        return sample
+
+    def predict(self, output_format, quality, sample_estimate):
+        """
+        Dung lượng dự đoán (byte)
+        :param sample_estimate: Dung lượng mẫu ở quality này quy ra toàn ảnh (theo số pixel)
+        """
+        entry = self._entry(output_format, quality)
+        return sample_estimate * (entry["ratio"] if entry else 1.0)
+
+    def predict_quality(self, output_format, estimate, low, high, target_bytes):
+        """
+        Quality cao nhất trong [low, high] được dự đoán cho dung lượng <= target_bytes
+        :param estimate: callable(quality) -> sample_estimate (encode mẫu, nên được cache)
+        :return: Quality, None nếu không quality nào được dự đoán là đạt
+        """
+        found = None
+        while low <= high:
+            quality = (low + high + 1) // 2
+            if self.predict(output_format, quality, estimate(quality)) <= target_bytes:
+                found = quality
+                low = quality + 1
+            else:
+                high = quality - 1
+        return found
+
+    def observe(self, output_format, quality, sample_estimate, actual_size):
+        """Hiệu chỉnh model với dung lượng thực tế của một lần encode"""
+        if sample_estimate <= 0:
+            return
+
+        observed = actual_size / sample_estimate
+        fmt = _model_format(output_format)
+        bucket = str(quality // QUALITY_BUCKET)
+
+        with self._lock:
+            entry = self._model.setdefault(fmt, {}).get(bucket)
+            if entry is None:
+                entry = {"ratio": observed, "count": 0}
+            else:
+                weight = max(1 / (entry["count"] + 1), LEARNING_RATE)
+                entry = {"ratio": entry["ratio"] * (1 - weight) + observed * weight, "count": entry["count"]}
+            entry["count"] += 1
+            self._model[fmt][bucket] = entry
+
+    def record(self, result):
+        """Hiệu chỉnh model từ dict kết quả (dùng cho kết quả trả về từ worker process)"""
+        prediction = result.get("size_prediction")
+        if prediction:
+            self.observe(prediction["format"], prediction["quality"],
+                         prediction["sample_estimate"], result["new_size"])
+
+    def save(self, path=None):
+        """Lưu model ra file JSON (ghi file tạm rồi đổi tên)"""
+        path = path or self.path
+        if not path:
+            return
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            data = {"version": MODEL_VERSION, "formats": self._model}
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(temp_path, path)
+
+    def _entry(self, output_format, quality):
+        with self._lock:
+            return self._model.get(_model_format(output_format), {}).get(str(quality // QUALITY_BUCKET))
+
+
+def _model_format(output_format):
+    fmt = output_format.lower()
+    return "jpeg" if fmt == "jpg" else fmt
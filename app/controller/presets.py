@@ -0,0 +1,44 @@
+# Các preset dùng chung cho GUI (Sidebar) và CLI (--preset)
+# Mỗi preset gồm định dạng đích và các tùy chọn tương ứng của ConverterOptions
+PRESETS = {
+    "web": {
+        "format": "webp",
+        "quality": 85,
+        "max_size_kb": 500,
+        "compression_percent": None,
+        "target_width": 1920,
+        "target_height": 1080,
+        "maintain_aspect_ratio": True,
+        "resample_tier": "balanced",
+    },
+    "high_quality": {
+        "format": "png",
+        "quality": 95,
+        "max_size_kb": None,
+        "compression_percent": None,
+        "target_width": None,
+        "target_height": None,
+        "maintain_aspect_ratio": True,
+        "resample_tier": "best",
+    },
+    "small_size": {
+        "format": "jpeg",
+        "quality": 70,
+        "max_size_kb": None,
+        "compression_percent": 50,
+        "target_width": 800,
+        "target_height": 600,
+        "maintain_aspect_ratio": True,
+        "resample_tier": "fast",
+    },
+    "mobile": {
+        "format": "webp",
+        "quality": 80,
+        "max_size_kb": 200,
+        "compression_percent": None,
+        "target_width": 640,
+        "target_height": 480,
+        "maintain_aspect_ratio": True,
+        "resample_tier": "fast",
+    },
+}
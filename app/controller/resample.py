@@ -0,0 +1,85 @@
+import math
+import sys
+import time
+
+from PIL import Image, ImageChops, ImageStat
+
+# Các mức resample: (bộ lọc cuối, reducing_gap)
+# - reducing_gap: thu nhỏ trước bằng reduce() (trung bình khối, số nguyên) sao cho
+#   phần còn lại chỉ cần resample với tỷ lệ <= reducing_gap. None = resample toàn phần.
+# - fast: reduce() gần hết rồi BILINEAR, nhanh nhất, hơi mềm ảnh
+# - balanced: reduce() tới còn ~2x rồi LANCZOS, gần như không phân biệt với best
+# - best: LANCZOS trên toàn bộ pixel (hành vi cũ), chậm nhất khi thu nhỏ mạnh
+RESAMPLE_TIERS = {
+    "fast": (Image.Resampling.BILINEAR, 1.0),
+    "balanced": (Image.Resampling.LANCZOS, 2.0),
+    "best": (Image.Resampling.LANCZOS, None),
+}
+DEFAULT_TIER = "best"
+
+
+def resample(img, size, tier=DEFAULT_TIER):
+    """
+    Resize ảnh theo mức resample đã chọn
+    :param img: Ảnh PIL
+    :param size: (width, height) đích
+    :param tier: "fast", "balanced" hoặc "best"
+    """
+    if tier not in RESAMPLE_TIERS:
+        raise ValueError(f"Mức resample không hợp lệ: {tier}")
+
+    resample_filter, reducing_gap = RESAMPLE_TIERS[tier]
+    return img.resize(size, resample_filter, reducing_gap=reducing_gap)
+
+
+def psnr(reference, img):
+    """PSNR (dB) giữa hai ảnh cùng kích thước, càng cao càng giống"""
+    diff = ImageChops.difference(reference.convert("RGB"), img.convert("RGB"))
+    stat = ImageStat.Stat(diff)
+    pixel_count = diff.width * diff.height
+    mse = sum(stat.sum2) / (pixel_count * len(stat.sum2))
+    if mse == 0:
+        return float("inf")
+    return 10 * math.log10(255 ** 2 / mse)
+
+
+def benchmark_tiers(img, size, repeat=3):
+    """
+    Đo tốc độ và chất lượng của từng mức resample.
+    Chất lượng là PSNR so với kết quả của mức "best".
+    :return: dict tier -> {"seconds": thời gian trung bình, "psnr": dB}
+    """
+    img.load()
+    outputs = {}
+    report = {}
+
+    for tier in RESAMPLE_TIERS:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            outputs[tier] = resample(img, size, tier)
+        report[tier] = {"seconds": (time.perf_counter() - start) / repeat}
+
+    for tier in RESAMPLE_TIERS:
+        report[tier]["psnr"] = psnr(outputs["best"], outputs[tier])
+
+    return report
+
+
+def print_benchmark(report):
+    """In bảng so sánh các mức resample"""
+    best_time = report["best"]["seconds"]
+    print(f"{'Tier':<10} {'Time (ms)':>10} {'Speedup':>8} {'PSNR vs best':>13}")
+    for tier, row in report.items():
+        speedup = best_time / row["seconds"] if row["seconds"] else float("inf")
+        print(f"{tier:<10} {row['seconds'] * 1000:>10.1f} {speedup:>7.2f}x {row['psnr']:>10.2f} dB")
+
+
+# Ví dụ: python -m app.controller.resample photo.jpg 1920x1080
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m app.controller.resample IMAGE WIDTHxHEIGHT")
+        sys.exit(1)
+
+    width, height = (int(value) for value in sys.argv[2].split("x"))
+    source = Image.open(sys.argv[1]).convert("RGB")
+    print_benchmark(benchmark_tiers(source, (width, height)))
@@ -0,0 +1,16 @@
+class ConversionResult(dict):
+    """
+    Kết quả convert một file: một dict bình thường (json.dumps, isinstance(result, dict),
+    pickle sang process khác đều dùng được), các trường phụ (quality, timings, cache_hit...)
+    chỉ có khi cần. Thống kê batch dùng StatsAccumulator nên không phải giữ lại list kết quả.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def failure(cls, input_path, error):
+        """Kết quả lỗi (input_path có thể là None khi chưa biết file)"""
+        result = cls(success=False, error=error)
+        if input_path is not None:
+            result["input_path"] = input_path
+        return result
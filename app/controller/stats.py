@@ -0,0 +1,130 @@
+from .timing import TimingStats
+
+# Số kết quả lỗi tối đa được giữ lại để báo cáo chi tiết (các lỗi sau chỉ được đếm)
+MAX_FAILED_RESULTS = 1000
+
+
+class StatsAccumulator:
+    """
+    Cộng dồn thống kê convert từng kết quả một (O(1) mỗi kết quả), không giữ lại
+    danh sách kết quả. Dùng chung cho get_statistics, CLI và GUI.
+    Chỉ MAX_FAILED_RESULTS kết quả lỗi đầu tiên được lưu lại để báo cáo chi tiết.
+    """
+
+    def __init__(self):
+        self.total_files = 0
+        self.successful = 0
+        self.failed = 0
+        self.total_original_size = 0
+        self.total_new_size = 0
+        self.total_space_saved = 0
+        self.total_space_increased = 0
+        self.compressed_files = 0
+        self.expanded_files = 0
+        self.unchanged_files = 0
+        self.skipped_files = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.encoded_to_target = 0
+        self.encode_trials = 0
+        self.predicted_files = 0
+        self._compression_sum = 0.0
+        self._prediction_error_sum = 0.0
+        self.timings = TimingStats()
+        self.failed_results = []
+
+    def add(self, result):
+        """Cập nhật thống kê với một kết quả convert"""
+        self.total_files += 1
+        
+        if not result.get("success"):
+            self.failed += 1
+            if len(self.failed_results) < MAX_FAILED_RESULTS:
+                self.failed_results.append(result)
+            return
+        
+        self.successful += 1
+        if result.get("skipped"):
+            self.skipped_files += 1
+        
+        cache_hit = result.get("cache_hit")
+        if cache_hit is True:
+            self.cache_hits += 1
+        elif cache_hit is False:
+            self.cache_misses += 1
+        
+        if "encode_trials" in result:
+            self.encoded_to_target += 1
+            self.encode_trials += result["encode_trials"]
+        if result.get("predicted_size") and result["new_size"]:
+            self.predicted_files += 1
+            self._prediction_error_sum += abs(result["predicted_size"] - result["new_size"]) / result["new_size"] * 100
+        
+        self.timings.add(result)
+        self.total_original_size += result["original_size"]
+        self.total_new_size += result["new_size"]
+        
+        change_type = result.get("change_type")
+        if change_type == "compressed":
+            self.compressed_files += 1
+            self.total_space_saved += result.get("space_change", 0)
+            self._compression_sum += result["compression_ratio"]
+        elif change_type == "expanded":
+            self.expanded_files += 1
+            self.total_space_increased += result.get("space_change", 0)
+        elif change_type == "unchanged":
+            self.unchanged_files += 1
+
+    def update(self, results):
+        """Cộng dồn nhiều kết quả"""
+        for result in results:
+            self.add(result)
+        return self
+
+    @property
+    def average_compression(self):
+        """Tỷ lệ nén trung bình (chỉ tính các file được nén)"""
+        if not self.compressed_files:
+            return 0
+        return self._compression_sum / self.compressed_files
+
+    @property
+    def average_encode_trials(self):
+        """Số lần encode toàn ảnh trung bình của các file nén theo dung lượng mục tiêu"""
+        if not self.encoded_to_target:
+            return 0
+        return self.encode_trials / self.encoded_to_target
+
+    @property
+    def average_prediction_error(self):
+        """Sai lệch trung bình (%) giữa dung lượng dự đoán và thực tế"""
+        if not self.predicted_files:
+            return 0
+        return self._prediction_error_sum / self.predicted_files
+
+    @property
+    def omitted_failures(self):
+        """Số kết quả lỗi không được giữ lại trong failed_results"""
+        return self.failed - len(self.failed_results)
+
+    @property
+    def net_change(self):
+        """Dung lượng tiết kiệm ròng (âm nếu tổng dung lượng tăng)"""
+        return self.total_space_saved - self.total_space_increased
+
+    def as_dict(self):
+        """Trả về dict thống kê cùng cấu trúc với get_statistics"""
+        return {
+            "total_files": self.total_files,
+            "successful": self.successful,
+            "failed": self.failed,
+            "total_original_size": self.total_original_size,
+            "total_new_size": self.total_new_size,
+            "total_space_saved": self.total_space_saved,
+            "total_space_increased": self.total_space_increased,
+            "average_compression": self.average_compression,
+            "compressed_files": self.compressed_files,
+            "expanded_files": self.expanded_files,
+            "unchanged_files": self.unchanged_files,
+            "timings": self.timings.as_dict()
+        }
@@ -0,0 +1,411 @@
+import math
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from PIL import Image, UnidentifiedImageError
+
+from .codecs import load_all_codecs, load_codec_for_path
+from .resample import resample
+
+# Ảnh từ số pixel này trở lên được thu nhỏ theo dải (nếu định dạng cho phép decode từng dải)
+TILED_MIN_PIXELS = 64 * 1024 * 1024
+# Số dòng decode mỗi lần: bộ nhớ đỉnh tỷ lệ với chiều rộng ảnh x BAND_HEIGHT
+DEFAULT_BAND_HEIGHT = 512
+# Thông số Deep Zoom mặc định (giống OpenSeadragon/deepzoom.py)
+DEEPZOOM_TILE_SIZE = 254
+DEEPZOOM_OVERLAP = 1
+# Số bit mỗi pixel của các rawmode thường gặp, dùng khi tile raw không ghi stride (TIFF)
+RAW_BITS_PER_PIXEL = {
+    "1": 1, "L": 8, "P": 8, "LA": 16, "I;16": 16, "I;16B": 16,
+    "RGB": 24, "BGR": 24, "RGBA": 32, "RGBX": 32, "CMYK": 32, "I": 32, "F": 32,
+}
+
+def open_image(input_path):
+    """
+    Mở ảnh (chỉ đọc header) bằng Image.open của Pillow, giữ nguyên kiểm tra decompression
+    bomb (không đổi Image.MAX_IMAGE_PIXELS vì giá trị đó dùng chung cho mọi thread).
+    Trước khi decode toàn bộ ảnh, caller gọi check_pixels().
+    Chỉ codec theo phần mở rộng file được nạp, các codec khác chỉ nạp khi không nhận ra file.
+    :param input_path: Đường dẫn file, hoặc file-like nhị phân (không có phần mở rộng để chọn codec)
+    """
+    if isinstance(input_path, (str, os.PathLike)):
+        load_codec_for_path(input_path)
+    try:
+        return Image.open(input_path)
+    except UnidentifiedImageError:
+        # Phần mở rộng không khớp nội dung (ví dụ file AVIF đặt tên .jpg)
+        load_all_codecs()
+        return Image.open(input_path)
+
+
+def check_pixels(img):
+    """
+    Kiểm tra decompression bomb trước khi decode toàn bộ ảnh, cùng ngưỡng với Pillow
+    (lỗi khi vượt gấp đôi Image.MAX_IMAGE_PIXELS, None = không giới hạn)
+    """
+    limit = Image.MAX_IMAGE_PIXELS
+    if limit is not None and img.width * img.height > 2 * limit:
+        raise Image.DecompressionBombError(
+            f"Ảnh {img.width * img.height} pixel vượt quá giới hạn {2 * limit} pixel, có thể là decompression bomb"
+        )
+
+
+def band_plan(img, band_height=DEFAULT_BAND_HEIGHT):
+    """
+    Chia ảnh thành các dải dòng decode độc lập được mà không phải đọc cả ảnh.
+    Hỗ trợ dữ liệu raw (BMP, TIFF không nén) và ảnh có nhiều strip/tile (TIFF).
+    :return: List (top, bottom, tiles) với tiles đã dịch về tọa độ của dải,
+             None nếu định dạng chỉ decode được cả ảnh một lần (JPEG, PNG, TIFF nén một strip...)
+    """
+    if not img.tile or getattr(img, "n_frames", 1) > 1:
+        return None
+    if img.getexif().get(0x0112, 1) != 1:
+        # Ảnh có orientation cần xoay sau khi decode, không ghép dải trực tiếp được
+        return None
+
+    width, height = img.size
+
+    if len(img.tile) == 1:
+        template = img.tile[0]
+        codec, extents, offset, args = template
+        if codec != "raw" or tuple(extents) != (0, 0, width, height):
+            return None
+
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if not stride:
+            if rawmode not in RAW_BITS_PER_PIXEL:
+                return None
+            stride = (width * RAW_BITS_PER_PIXEL[rawmode] + 7) // 8
+
+        plan = []
+        for top in range(0, height, band_height):
+            bottom = min(height, top + band_height)
+            # orientation < 0: dòng cuối ảnh nằm đầu file (BMP bottom-up)
+            first_row = top if orientation >= 0 else height - bottom
+            tile = _tile(template, (0, 0, width, bottom - top), offset + first_row * stride, (rawmode, stride, orientation))
+            plan.append((top, bottom, [tile]))
+        return plan
+
+    # Nhiều strip/tile: gom các hàng tile liền nhau cho tới khi đủ band_height dòng
+    rows = {}
+    for tile in img.tile:
+        codec, (x0, y0, x1, y1), offset, args = tile
+        if codec == "libtiff":
+            return None
+        rows.setdefault((y0, y1), []).append(tile)
+
+    plan = []
+    previous_bottom = 0
+    for top, bottom in sorted(rows):
+        if top != previous_bottom:
+            # Các hàng tile chồng lên nhau hoặc có khoảng trống
+            return None
+        previous_bottom = bottom
+
+        tiles = rows[(top, bottom)]
+        if plan and plan[-1][1] - plan[-1][0] < band_height:
+            band_top, _, band_tiles = plan[-1]
+            plan[-1] = (band_top, bottom, band_tiles + tiles)
+        else:
+            plan.append((top, bottom, tiles))
+
+    if previous_bottom != height:
+        return None
+
+    return [
+        (top, bottom, [_tile(tile, (tile[1][0], tile[1][1] - top, tile[1][2], tile[1][3] - top), tile[2], tile[3])
+                       for tile in tiles])
+        for top, bottom, tiles in plan
+    ]
+
+
+def iter_bands(input_path, band_height=DEFAULT_BAND_HEIGHT):
+    """
+    Yield lần lượt các dải ảnh (RGB/RGBA) từ trên xuống, mỗi dải chỉ decode phần dữ liệu
+    của nó. Định dạng không chia dải được thì decode cả ảnh rồi cắt (bộ nhớ không giảm).
+    """
+    img = open_image(input_path)
+    width, height = img.size
+    plan = band_plan(img, band_height)
+
+    if plan is None:
+        check_pixels(img)
+        img = _normalize_mode(img)
+        for top in range(0, height, band_height):
+            yield img.crop((0, top, width, min(height, top + band_height)))
+        return
+
+    img.close()
+    for top, bottom, tiles in plan:
+        # Mỗi dải mở lại file: đối tượng Image mới chỉ decode đúng các tile của dải
+        band = open_image(input_path)
+        band._size = (width, bottom - top)
+        if hasattr(band, "_tile_size"):
+            # TIFF cấp phát bộ nhớ decode theo _tile_size thay vì size
+            band._tile_size = band._size
+        band.tile = tiles
+        band.load()
+        yield _normalize_mode(band)
+
+
+def can_downscale_in_bands(img, target_size):
+    """Ảnh có nên (và có thể) thu nhỏ theo dải thay vì decode cả ảnh không"""
+    if target_size is None or img.width * img.height < TILED_MIN_PIXELS:
+        return False
+    if _reduce_factor(img.size, target_size) < 2:
+        return False
+    return band_plan(img) is not None
+
+
+def estimate_band_bytes(size, target_size, band_height=DEFAULT_BAND_HEIGHT):
+    """Ước lượng bộ nhớ đỉnh (byte) khi thu nhỏ theo dải: hai dải cộng ảnh trung gian"""
+    width, height = size
+    factor = _reduce_factor(size, target_size)
+    reduced_pixels = math.ceil(width / factor) * math.ceil(height / factor)
+    return width * band_height * 4 * 2 + reduced_pixels * 4 + target_size[0] * target_size[1] * 4
+
+
+def downscale_bands(input_path, target_size, tier, band_height=DEFAULT_BAND_HEIGHT):
+    """
+    Thu nhỏ ảnh lớn về target_size mà mỗi lúc chỉ giữ một dải trong bộ nhớ: từng dải được
+    reduce() theo hệ số nguyên rồi ghép vào ảnh trung gian (không quá ~2 lần target_size
+    mỗi chiều), sau cùng ảnh trung gian được resample về đúng kích thước theo tier.
+    :return: Ảnh PIL kích thước target_size
+    """
+    with open_image(input_path) as img:
+        width, height = img.size
+    factor = _reduce_factor((width, height), target_size)
+    # Dải có số dòng chia hết cho factor để các khối reduce không bị cắt ngang
+    band_height = max(factor, band_height // factor * factor)
+
+    reduced = None
+    position = 0
+    carry = None
+
+    def add(rows):
+        nonlocal reduced, position
+        part = rows.reduce(factor)
+        if reduced is None:
+            reduced = Image.new(part.mode, (math.ceil(width / factor), math.ceil(height / factor)))
+        reduced.paste(part, (0, position))
+        position += part.height
+
+    for band in iter_bands(input_path, band_height):
+        if carry is not None:
+            band = _vstack(carry, band)
+            carry = None
+
+        usable = band.height - band.height % factor
+        if usable < band.height:
+            carry = band.crop((0, usable, band.width, band.height))
+            band = band.crop((0, 0, band.width, usable))
+        if band.height:
+            add(band)
+
+    if carry is not None:
+        # Các dòng cuối không đủ một khối: reduce() lấy trung bình phần còn lại
+        add(carry)
+
+    return resample(reduced, target_size, tier)
+
+
+def write_deepzoom(converter, input_path, output_format, output_folder, tile_size=DEEPZOOM_TILE_SIZE,
+                   overlap=DEEPZOOM_OVERLAP, band_height=DEFAULT_BAND_HEIGHT, workers=None):
+    """
+    Ghi ảnh thành tile pyramid Deep Zoom (<tên>.dzi + thư mục <tên>_files/<level>/<cột>_<hàng>.<ext>).
+    Ảnh được đọc theo dải, mỗi level giữ một hàng tile và truyền dải đã thu nhỏ 1/2 xuống level
+    kế tiếp, nên bộ nhớ phụ thuộc chiều rộng ảnh x kích thước tile chứ không phụ thuộc kích thước ảnh.
+    :param converter: ImageFormatConverter cung cấp quality và tham số encode
+    Tile và file .dzi được ghi qua converter.writer (file tạm + đổi tên, durability của writer);
+    .dzi được ghi sau cùng nên không bao giờ trỏ tới tile chưa ghi xong.
+    :param workers: Số thread encode tile (None = số CPU)
+    :return: dict {"dzi_path", "levels", "tiles", "bytes", "dimensions"}
+    """
+    with open_image(input_path) as img:
+        width, height = img.size
+
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    extension = output_format.lower()
+    dzi_path = os.path.join(output_folder, f"{base_name}.dzi")
+    files_dir = os.path.join(output_folder, f"{base_name}_files")
+
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    params = converter._get_save_params(output_format)
+    counters = {"tiles": 0, "bytes": 0}
+    counters_lock = threading.Lock()
+
+    writer = converter.writer
+    writes = []  # Future ghi tile chưa kiểm tra
+
+    def save_tile(path, tile):
+        tile = converter._prepare_for_format(tile, output_format)
+        data = converter._encode(tile, output_format, converter.quality, params)
+        with counters_lock:
+            counters["tiles"] += 1
+            counters["bytes"] += len(data)
+        return writer.write(path, data, track=False)
+
+    def collect(future):
+        """Nhận Future ghi của một tile đã encode; báo lỗi ghi sớm, chỉ giữ Future chưa xong"""
+        nonlocal writes
+        writes.append(future.result())
+        if len(writes) >= max_pending:
+            for write in writes:
+                if write.done():
+                    write.result()
+            writes = [write for write in writes if not write.done()]
+
+    workers = workers or os.cpu_count() or 1
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = set()
+    max_pending = workers * 4
+
+    def submit(level, column, row, tile):
+        # Giới hạn số tile chờ encode để bộ nhớ không tăng theo kích thước ảnh
+        nonlocal pending
+        while len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(future)
+        path = os.path.join(files_dir, str(level), f"{column}_{row}.{extension}")
+        pending.add(executor.submit(save_tile, path, tile))
+
+    # Level 0 là 1x1, level cao nhất là ảnh gốc
+    level = None
+    for index in range(max_level + 1):
+        scale = 2 ** (max_level - index)
+        level_size = (math.ceil(width / scale), math.ceil(height / scale))
+        writer.ensure_dir(os.path.join(files_dir, str(index)))
+        level = _DeepZoomLevel(index, level_size, tile_size, overlap, submit, level)
+
+    try:
+        for band in iter_bands(input_path, band_height):
+            level.feed(band)
+        level.finish()
+        for future in pending:
+            collect(future)
+        pending = set()
+        for write in writes:
+            write.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+    # Mọi tile đã nằm trên đĩa: giờ mới ghi descriptor
+    descriptor = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{extension}" '
+        f'Overlap="{overlap}" TileSize="{tile_size}">\n'
+        f'  <Size Width="{width}" Height="{height}"/>\n'
+        '</Image>\n'
+    )
+    writer.write(dzi_path, descriptor.encode("utf-8"), track=False).result()
+
+    return {
+        "dzi_path": dzi_path,
+        "levels": max_level + 1,
+        "tiles": counters["tiles"],
+        "bytes": counters["bytes"],
+        "dimensions": (width, height)
+    }
+
+
+class _DeepZoomLevel:
+    """
+    Một level của Deep Zoom: nhận lần lượt các dải dòng, ghi hàng tile ngay khi đủ dòng,
+    chỉ giữ lại phần overlap, và chuyển dải đã thu nhỏ 1/2 xuống level nhỏ hơn.
+    """
+
+    def __init__(self, level, size, tile_size, overlap, submit, smaller):
+        self.level = level
+        self.width, self.height = size
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.submit = submit
+        self.smaller = smaller
+        self.buffer = None  # Các dòng [buffer_top, buffer_top + buffer.height) chưa ghi xong
+        self.buffer_top = 0
+        self.row = 0  # Hàng tile kế tiếp cần ghi
+        self.carry = None  # Dòng lẻ chờ ghép cặp trước khi thu nhỏ cho level nhỏ hơn
+
+    def feed(self, band):
+        self.buffer = band if self.buffer is None else _vstack(self.buffer, band)
+        self._write_rows(final=False)
+
+        if self.smaller is not None:
+            if self.carry is not None:
+                band = _vstack(self.carry, band)
+                self.carry = None
+            if band.height % 2:
+                self.carry = band.crop((0, band.height - 1, band.width, band.height))
+                band = band.crop((0, 0, band.width, band.height - 1))
+            if band.height:
+                self.smaller.feed(band.reduce(2))
+
+    def finish(self):
+        self._write_rows(final=True)
+        if self.smaller is not None:
+            if self.carry is not None:
+                self.smaller.feed(self.carry.reduce(2))
+                self.carry = None
+            self.smaller.finish()
+
+    def _write_rows(self, final):
+        if self.buffer is None:
+            return
+
+        tile_size, overlap = self.tile_size, self.overlap
+        rows = math.ceil(self.height / tile_size)
+        columns = math.ceil(self.width / tile_size)
+
+        while self.row < rows:
+            top = max(0, self.row * tile_size - overlap)
+            bottom = min(self.height, (self.row + 1) * tile_size + overlap)
+            if bottom > self.buffer_top + self.buffer.height and not final:
+                break
+
+            strip = self.buffer.crop((0, top - self.buffer_top, self.width, bottom - self.buffer_top))
+            for column in range(columns):
+                left = max(0, column * tile_size - overlap)
+                right = min(self.width, (column + 1) * tile_size + overlap)
+                self.submit(self.level, column, self.row, strip.crop((left, 0, right, strip.height)))
+            self.row += 1
+
+            # Bỏ các dòng hàng tile sau không cần tới (chỉ giữ phần overlap)
+            keep_from = min(self.row * tile_size - overlap, self.buffer_top + self.buffer.height)
+            if keep_from > self.buffer_top:
+                self.buffer = self.buffer.crop(
+                    (0, keep_from - self.buffer_top, self.width, self.buffer.height)
+                )
+                self.buffer_top = keep_from
+
+
+def _tile(template, extents, offset, args):
+    """Tạo tile descriptor cùng kiểu với template (Pillow mới dùng namedtuple)"""
+    if hasattr(template, "_replace"):
+        return template._replace(extents=extents, offset=offset, args=args)
+    return (template[0], extents, offset, args)
+
+
+def _reduce_factor(size, target_size):
+    """Hệ số reduce() nguyên lớn nhất mà ảnh vẫn không nhỏ hơn target_size"""
+    return max(1, min(size[0] // max(target_size[0], 1), size[1] // max(target_size[1], 1)))
+
+
+def _normalize_mode(img):
+    """Chuẩn hóa mode giống pipeline convert (RGB hoặc RGBA)"""
+    if img.mode not in ("RGB", "RGBA"):
+        return img.convert("RGB")
+    return img
+
+
+def _vstack(top, bottom):
+    """Ghép hai dải cùng chiều rộng theo chiều dọc"""
+    stacked = Image.new(top.mode, (top.width, top.height + bottom.height))
+    stacked.paste(top, (0, 0))
+    stacked.paste(bottom, (0, top.height))
+    return stacked
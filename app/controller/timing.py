@@ -0,0 +1,164 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Các giai đoạn convert một file, theo thứ tự xử lý:
+# mở file (đọc header), decode pixel, chuyển mode, resize, encode ảnh mẫu của predictor,
+# encode (tổng mọi lần encode thử) và ghi file/cache
+STAGES = ("open", "decode", "mode", "resize", "predict", "encode", "write")
+# Các percentile báo cáo trong thống kê
+PERCENTILES = (50, 90, 99)
+# Histogram thời gian: bucket thứ i chứa các giá trị <= HISTOGRAM_MIN_MS * HISTOGRAM_GROWTH**i,
+# sai số percentile tối đa ~5% mà bộ nhớ không phụ thuộc số file
+HISTOGRAM_MIN_MS = 0.01
+HISTOGRAM_GROWTH = 1.1
+
+
+class StageTimer:
+    """
+    Đo thời gian từng giai đoạn convert một file (ms, đồng hồ monotonic perf_counter).
+    Mỗi job có một timer riêng nên không cần khóa khi encode song song.
+    Khi trace=True, timer còn giữ từng span (thời điểm bắt đầu/kết thúc, thread) để xuất trace.
+    """
+
+    def __init__(self, trace=False):
+        self.stages = {}
+        self.encodes = []  # mỗi lần encode toàn ảnh: {"quality", "ms", "bytes"}
+        self.spans = [] if trace else None  # [tên, thread id, bắt đầu, kết thúc, args] (giây, perf_counter)
+
+    @contextmanager
+    def stage(self, name):
+        """Đo một đoạn code và cộng vào giai đoạn name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.add(name, (end - start) * 1000)
+            self.span(name, start, end)
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def span(self, name, start, end, **args):
+        """Ghi một span cho trace (bỏ qua nếu không bật trace)"""
+        if self.spans is not None:
+            self.spans.append([name, threading.get_ident(), start, end, args])
+
+    def encoded(self, quality, start, size):
+        """Ghi nhận một lần encode toàn ảnh bắt đầu từ start (perf_counter) và vừa kết thúc"""
+        end = time.perf_counter()
+        ms = (end - start) * 1000
+        self.encodes.append({"quality": quality, "ms": round(ms, 3), "bytes": size})
+        self.add("encode", ms)
+        self.span(f"encode q{quality}", start, end, quality=quality, bytes=size)
+
+    def copy(self):
+        """
+        Timer mới bắt đầu từ các giai đoạn đã đo (decode dùng chung, gắn vào kết quả đầu tiên).
+        Span không được chép để trace chỉ có một span decode cho mỗi file.
+        """
+        timer = StageTimer(self.spans is not None)
+        timer.stages = dict(self.stages)
+        timer.encodes = list(self.encodes)
+        return timer
+
+    def apply(self, result):
+        """
+        Thêm "timings" (ms theo giai đoạn) và "encode_timings" vào dict kết quả,
+        cùng "trace" (các span, xem ChromeTrace.record) nếu bật trace
+        """
+        result["timings"] = {name: round(self.stages[name], 3) for name in STAGES if name in self.stages}
+        result["encode_timings"] = self.encodes
+        if self.spans:
+            add_spans(result, self.spans)
+        return result
+
+
+def add_spans(result, spans):
+    """Gắn span vào result["trace"] để chuyển về process chính cùng kết quả"""
+    trace = result.setdefault("trace", {"pid": os.getpid(), "spans": []})
+    trace["spans"].extend(spans)
+
+
+def timed(timer, name):
+    """timer.stage(name), hoặc không đo gì nếu timer là None"""
+    return timer.stage(name) if timer is not None else _no_timer()
+
+
+@contextmanager
+def _no_timer():
+    yield
+
+
+class _Histogram:
+    """Histogram bucket theo cấp số nhân để tính percentile với bộ nhớ cố định"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        index = 0 if value <= HISTOGRAM_MIN_MS else math.ceil(math.log(value / HISTOGRAM_MIN_MS, HISTOGRAM_GROWTH))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Giá trị (cận trên của bucket) mà percent% số mẫu không vượt quá"""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(HISTOGRAM_MIN_MS * HISTOGRAM_GROWTH ** index, self.max)
+        return self.max
+
+
+class TimingStats:
+    """Cộng dồn thời gian từng giai đoạn của nhiều kết quả: tổng, percentile, lớn nhất"""
+
+    def __init__(self):
+        self._stages = {name: _Histogram() for name in STAGES}
+        self._trials = _Histogram()  # từng lần encode toàn ảnh
+
+    def add(self, result):
+        """Cập nhật với một kết quả convert (kết quả không có "timings" được bỏ qua)"""
+        for name, ms in result.get("timings", {}).items():
+            if name in self._stages:
+                self._stages[name].add(ms)
+        for trial in result.get("encode_timings", ()):
+            self._trials.add(trial["ms"])
+
+    @property
+    def files(self):
+        """Số kết quả có đo thời gian"""
+        return max((histogram.count for histogram in self._stages.values()), default=0)
+
+    def rows(self):
+        """
+        Các giai đoạn đã đo, theo thứ tự xử lý
+        :return: List (tên giai đoạn, dict thống kê: count, total_ms, p50, p90, p99, max_ms)
+        """
+        rows = [(name, _summary(self._stages[name])) for name in STAGES if self._stages[name].count]
+        if self._trials.count:
+            rows.append(("encode_trial", _summary(self._trials)))
+        return rows
+
+    def as_dict(self):
+        return dict(self.rows())
+
+
+def _summary(histogram):
+    summary = {"count": histogram.count, "total_ms": round(histogram.total, 3)}
+    for percent in PERCENTILES:
+        summary[f"p{percent}"] = round(histogram.percentile(percent), 3)
+    summary["max_ms"] = round(histogram.max, 3)
+    return summary
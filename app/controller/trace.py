@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+# Phân loại span trong trace viewer
+FILE_CATEGORY = "file"
+STAGE_CATEGORY = "stage"
+ENCODE_CATEGORY = "encode"
+
+
+class ChromeTrace:
+    """
+    Ghi trace dạng Chrome trace-event (mở bằng chrome://tracing hoặc ui.perfetto.dev):
+    mỗi file convert là một span, bên trong là các span giai đoạn (decode, resize, từng lần
+    encode thử, ghi file), theo process/thread đã xử lý. Khoảng trống giữa các span trên
+    một worker là thời gian worker rảnh.
+
+    Span được đo trong converter (kể cả trong worker process) và đi kèm kết quả dưới key
+    "trace"; record() chuyển chúng thành event. Thời gian là perf_counter, đồng hồ
+    monotonic dùng chung giữa các process trên cùng máy.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: File JSON ghi trace khi gọi save() (None = chỉ giữ trong bộ nhớ)
+        """
+        self.path = path
+        self._pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._events = []
+        self._workers = {}  # (pid, thread id) -> số thứ tự hiển thị
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Event chỉ được giữ ở process chính, bản gửi sang worker không cần mang theo
+        return {"path": self.path, "_pid": self._pid, "_origin": self._origin, "_events": [],
+                "_workers": {}, "_processes": set()}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def collecting(self):
+        """
+        False trong worker process (kể cả process fork, nơi tracer không qua pickle):
+        span được giữ trong kết quả và record ở process chính
+        """
+        return os.getpid() == self._pid
+
+    def record(self, result):
+        """Chuyển span trong result["trace"] thành event và bỏ key đó khỏi kết quả"""
+        if not self.collecting or "trace" not in result:
+            return
+
+        trace = result.pop("trace")
+        pid = trace["pid"]
+        with self._lock:
+            for name, thread_id, start, end, args in trace["spans"]:
+                if name == FILE_CATEGORY:
+                    category, label = FILE_CATEGORY, os.path.basename(args.get("file", ""))
+                elif name.startswith("encode q"):
+                    category, label = ENCODE_CATEGORY, name
+                else:
+                    category, label = STAGE_CATEGORY, name
+
+                self._events.append({
+                    "name": label, "cat": category, "ph": "X",
+                    "ts": round((start - self._origin) * 1e6, 3),
+                    "dur": round((end - start) * 1e6, 3),
+                    "pid": pid, "tid": self._worker(pid, thread_id),
+                    "args": args,
+                })
+
+    def _worker(self, pid, thread_id):
+        """Số thứ tự thread (ổn định trong trace), kèm event đặt tên lần đầu gặp"""
+        key = (pid, thread_id)
+        if key not in self._workers:
+            number = len(self._workers) + 1
+            self._workers[key] = number
+            if pid not in self._processes:
+                self._processes.add(pid)
+                self._events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": number,
+                                     "args": {"name": "main" if pid == os.getpid() else f"worker process {pid}"}})
+            self._events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": number,
+                                 "args": {"name": f"thread {number}"}})
+        return self._workers[key]
+
+    def events(self):
+        """Các event đã ghi (theo thứ tự thời gian bắt đầu, metadata đứng đầu)"""
+        with self._lock:
+            return sorted(self._events, key=lambda event: (event["ph"] != "M", event.get("ts", 0)))
+
+    def save(self, path=None):
+        """Ghi trace ra file JSON (ghi file tạm rồi đổi tên, không để lại file dở dang)"""
+        path = path or self.path
+        if not path or not self.collecting:
+            return
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+        os.replace(tmp_path, path)
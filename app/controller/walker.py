@@ -0,0 +1,114 @@
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class ScannedPath(str):
+    """
+    Đường dẫn file tìm thấy khi duyệt thư mục, kèm stat lấy từ DirEntry lúc duyệt.
+    Vẫn là str nên dùng được ở mọi chỗ nhận đường dẫn; file_stat() dùng lại stat này
+    thay vì gọi os.stat lần nữa (mỗi lần là một round trip metadata trên NFS).
+    """
+
+    def __new__(cls, path, stat):
+        self = super().__new__(cls, path)
+        self.stat = stat
+        return self
+
+    def __reduce__(self):
+        # Pickle (process pool) cả đường dẫn lẫn stat
+        return (self.__class__, (str(self), self.stat))
+
+
+def file_stat(path):
+    """Stat của file: dùng stat đã có nếu path đến từ scan_folder, không thì os.stat"""
+    stat = getattr(path, "stat", None)
+    return stat if stat is not None else os.stat(path)
+
+
+def scan_folder(folder, extensions, recursive=False, exclude_dirs=(), workers=1):
+    """
+    Duyệt thư mục bằng os.scandir và yield dần ScannedPath của các file có phần mở rộng
+    được hỗ trợ, nên việc convert bắt đầu trước khi duyệt xong.
+    Thư mục không đọc được bị bỏ qua (như os.walk), không đi theo symlink thư mục.
+    :param folder: Thư mục nguồn
+    :param extensions: Tuple phần mở rộng chữ thường (".jpg", ...)
+    :param recursive: Duyệt đệ quy các thư mục con
+    :param exclude_dirs: Tên các thư mục con bỏ qua (ở mọi cấp)
+    :param workers: Số thread duyệt các thư mục con song song (1 = tuần tự, theo thứ tự
+                    như os.walk). Hữu ích trên NFS/ổ mạng, nơi thời gian chờ metadata chiếm phần lớn.
+    """
+    exclude_dirs = frozenset(exclude_dirs)
+    if workers > 1 and recursive:
+        yield from _scan_parallel(folder, extensions, exclude_dirs, workers)
+        return
+
+    stack = [folder]
+    while stack:
+        files, subdirs = _scan_dir(stack.pop(), extensions, exclude_dirs, recursive, lazy=True)
+        yield from files
+        # Đảo ngược để thư mục con được duyệt theo đúng thứ tự scandir
+        stack.extend(reversed(subdirs))
+
+
+def _scan_parallel(folder, extensions, exclude_dirs, workers):
+    """Mỗi thư mục là một task trong thread pool; file được yield theo thứ tự thư mục duyệt xong"""
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    pending = set()
+    queued = deque([folder])
+    try:
+        while queued or pending:
+            # Giới hạn số thư mục đang duyệt để không đọc trước quá xa so với bên tiêu thụ
+            while queued and len(pending) < workers * 2:
+                pending.add(executor.submit(_scan_dir, queued.popleft(), extensions, exclude_dirs, True))
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                queued.extend(subdirs)
+                yield from files
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _scan_dir(path, extensions, exclude_dirs, recursive, lazy=False):
+    """
+    Đọc một thư mục.
+    :param lazy: True = trả về generator file (duyệt tuần tự), False = list (trong thread pool)
+    :return: (file ảnh, thư mục con cần duyệt)
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return [], []
+
+    subdirs = []
+    if recursive:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False) and entry.name not in exclude_dirs:
+                    subdirs.append(entry.path)
+            except OSError:
+                continue
+
+    files = _iter_files(entries, extensions)
+    return (files if lazy else list(files)), subdirs
+
+
+def _iter_files(entries, extensions):
+    for entry in entries:
+        if not entry.name.lower().endswith(extensions):
+            continue
+        try:
+            # d_type của scandir cho biết loại entry mà không cần stat; stat chỉ gọi một
+            # lần cho file ảnh và được giữ trong ScannedPath
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+        except OSError:
+            # File bị xóa trong lúc duyệt
+            continue
+        yield ScannedPath(entry.path, stat)
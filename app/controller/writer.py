@@ -0,0 +1,318 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+
+from .result import ConversionResult
+
+# none: chỉ đổi tên nguyên tử (crash không để lại file dở, nhưng file mới ghi có thể mất
+# nếu mất điện); file: fsync từng file và thư mục chứa nó; batch: fsync gom theo lô
+DURABILITY_MODES = ("none", "file", "batch")
+DEFAULT_DURABILITY = "none"
+# Số file ghi trước khi fsync cả lô (durability "batch")
+SYNC_BATCH_SIZE = 256
+# Số file tối đa chờ ghi khi ghi nền: worker encode chỉ phải chờ khi đĩa chậm hơn hẳn
+DEFAULT_MAX_PENDING = 64
+
+
+class OutputWriter:
+    """
+    Ghi file output: mỗi thư mục chỉ tạo một lần, dữ liệu ghi vào file tạm trong chính thư
+    mục đích rồi đổi tên, nên crash giữa chừng không bao giờ để lại file output dở dang.
+    Khi background=True việc ghi chạy trên một thread riêng: write() trả về ngay một Future
+    và thread encode tiếp tục với file sau. settle() chờ phần ghi của một kết quả xong và
+    chuyển lỗi ghi thành kết quả lỗi.
+
+    Mỗi process có trạng thái riêng (thread, hàng đợi, thư mục đã tạo); bản trong worker
+    process tự fsync phần còn lại khi process kết thúc.
+    """
+
+    def __init__(self, durability=DEFAULT_DURABILITY, background=False, max_pending=DEFAULT_MAX_PENDING,
+                 batch_size=SYNC_BATCH_SIZE):
+        """
+        :param durability: "none", "file" hoặc "batch" (xem DURABILITY_MODES)
+        :param background: Ghi trên thread riêng thay vì trong thread gọi write()
+        :param max_pending: Số file chờ ghi tối đa khi ghi nền (write() chờ khi hàng đợi đầy)
+        :param batch_size: Số file mỗi lô fsync khi durability="batch"
+        """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Chế độ durability không hợp lệ: {durability}")
+        self.durability = durability
+        self.background = background
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._created_dirs = set()
+        self._inflight = {}  # output_path -> list Future các lần ghi chưa settle (thường chỉ một)
+        self._unsynced = []  # file đã đổi tên nhưng chưa fsync (durability "batch")
+        self._queue = None
+        self._thread = None
+
+    def __getstate__(self):
+        return {"durability": self.durability, "background": self.background,
+                "max_pending": self.max_pending, "batch_size": self.batch_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def _check_process(self):
+        """Worker process (kể cả fork, nơi writer không qua pickle) dùng trạng thái riêng"""
+        if self._pid == os.getpid():
+            return
+        self._reset()
+        # Import khi cần: chỉ worker process mới cần hook lúc kết thúc
+        from multiprocessing.util import Finalize
+        Finalize(self, self.close, exitpriority=10)
+
+    def ensure_dir(self, directory):
+        """Tạo thư mục (một lần cho mỗi thư mục trong suốt vòng đời writer)"""
+        if not directory or directory in self._created_dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._created_dirs.add(directory)
+
+    def write(self, path, data, track=True):
+        """
+        Ghi dữ liệu ra path (file tạm + đổi tên).
+        :param data: bytes/memoryview, không được sửa cho tới khi Future hoàn thành
+        :param track: Ghi nhớ Future theo path cho settle()/when_written(); False khi người gọi
+                      tự chờ Future (ví dụ tile Deep Zoom, không có kết quả riêng)
+        :return: Future hoàn thành khi file đã nằm ở path (kết quả: thời gian ghi ms nếu ghi
+                 nền, None nếu đã ghi ngay trong thread gọi); lỗi ghi nằm trong Future
+        """
+        self._check_process()
+        future = Future()
+        if not self.background:
+            try:
+                self._write_file(path, data)
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            if self._thread is None:
+                self._queue = queue.Queue(self.max_pending)
+                self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+                self._thread.start()
+            if track:
+                self._inflight.setdefault(path, []).append(future)
+        self._queue.put((path, data, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, data, future = item
+                # Future bị hủy (người chờ đã bỏ đi) thì file vẫn được ghi, chỉ không báo kết quả
+                notify = future.set_running_or_notify_cancel()
+                start = time.perf_counter()
+                try:
+                    self._write_file(path, data)
+                    if notify:
+                        future.set_result(round((time.perf_counter() - start) * 1000, 3))
+                except Exception as e:
+                    if notify:
+                        future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _write_file(self, path, data):
+        def fill(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                if self.durability == "file":
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        self._place(path, fill)
+
+    def copy(self, source_path, path, link=False):
+        """
+        Đặt bản sao của source_path (ví dụ output trong cache) tại path, chạy ngay trong thread
+        gọi, cùng cách đổi tên nguyên tử và durability như write()
+        :param link: Tạo hard link thay vì copy (tự copy nếu khác ổ đĩa/không hỗ trợ)
+        """
+        self._check_process()
+        if link and os.path.exists(path) and os.path.samefile(source_path, path):
+            # Đã là hard link tới đúng file (rename giữa hai link cùng file không làm gì cả)
+            return
+
+        def fill(tmp_path):
+            linked = False
+            if link:
+                try:
+                    os.link(source_path, tmp_path)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                shutil.copyfile(source_path, tmp_path)
+            if self.durability == "file":
+                _fsync_file(tmp_path)
+
+        self._place(path, fill)
+
+    def _place(self, path, fill):
+        """Tạo file tạm trong thư mục đích bằng fill(tmp_path), đổi tên thành path rồi fsync theo durability"""
+        directory = os.path.dirname(path)
+        self.ensure_dir(directory)
+        tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            fill(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if self.durability == "file":
+            _fsync_dir(directory)
+        elif self.durability == "batch":
+            with self._lock:
+                self._unsynced.append(path)
+                full = len(self._unsynced) >= self.batch_size
+            if full:
+                self.sync()
+
+    def sync(self):
+        """fsync các file đã ghi nhưng chưa fsync, rồi mỗi thư mục chứa chúng một lần"""
+        with self._lock:
+            paths, self._unsynced = self._unsynced, []
+        directories = set()
+        for path in paths:
+            try:
+                _fsync_file(path)
+            except OSError:
+                # File đã bị xóa/đổi tên sau khi ghi
+                continue
+            directories.add(os.path.dirname(path))
+        for directory in directories:
+            _fsync_dir(directory)
+
+    def when_written(self, result):
+        """
+        Future hoàn thành khi mọi file của kết quả (hoặc list kết quả) đã ghi xong,
+        None nếu không còn gì phải chờ. Mỗi lần gọi tạo Future riêng nên dùng được làm key
+        """
+        if not self._inflight:
+            return None
+        with self._lock:
+            futures = [future for item in _items(result)
+                       for future in self._inflight.get(item.get("output_path"), ())
+                       if not future.done()]
+        if not futures:
+            return None
+
+        written = Future()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            # Người chờ có thể đã hủy Future này (task asyncio bị hủy)
+            if last and written.set_running_or_notify_cancel():
+                written.set_result(None)
+
+        for future in futures:
+            future.add_done_callback(done)
+        return written
+
+    def settle(self, result):
+        """
+        Chờ phần ghi của kết quả (hoặc list kết quả) xong. Lỗi ghi biến kết quả thành kết
+        quả lỗi; thời gian ghi nền được cộng vào timings["write"].
+        :return: Kết quả (cùng dạng với đầu vào)
+        """
+        if isinstance(result, list):
+            return [self.settle(item) for item in result]
+        if not self._inflight:
+            return result
+
+        path = result.get("output_path")
+        with self._lock:
+            futures = self._inflight.get(path)
+            if not futures:
+                return result
+            future = futures.pop(0)
+            if not futures:
+                del self._inflight[path]
+        if future.cancelled():
+            return result
+        try:
+            write_ms = future.result()
+        except Exception as e:
+            return ConversionResult.failure(result.get("input_path"), f"Lỗi ghi file: {e}")
+
+        timings = result.get("timings")
+        if write_ms is not None and timings is not None:
+            timings["write"] = round(timings.get("write", 0) + write_ms, 3)
+        return result
+
+    def flush(self):
+        """Chờ mọi file trong hàng đợi ghi xong và fsync lô đang dở"""
+        if self._pid != os.getpid():
+            return
+        if self._queue is not None:
+            self._queue.join()
+        if self.durability == "batch":
+            self.sync()
+
+    def close(self):
+        """Ghi nốt hàng đợi, dừng thread ghi và fsync lô cuối"""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+            self._queue = None
+        if self.durability == "batch":
+            self.sync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _items(result):
+    return result if isinstance(result, list) else [result]
+
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(directory):
+    """fsync thư mục để lần đổi tên file được ghi bền (bỏ qua trên hệ thống không hỗ trợ, ví dụ Windows)"""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -13,35 +13,43 @@ from PyQt6.QtCore import Qt, QThread, pyqtSignal, QMimeData, QUrl
 from PyQt6.QtGui import QPixmap, QDragEnterEvent, QDropEvent, QFont
 
 from ...controller.convert import ImageFormatConverter
+from ...controller.stats import StatsAccumulator
+from ...controller.walker import scan_folder
+from ...controller.options import ConverterOptions
+
+# The GUI converts on worker threads inside a QThread: starting a process pool from a
+# QThread is unreliable, and a few threads keep the UI responsive on any machine
+GUI_WORKERS = min(4, os.cpu_count() or 1)
 
 
 class ConversionThread(QThread):
     """Thread for handling image conversion without blocking UI"""
     progress_changed = pyqtSignal(int)
     status_message = pyqtSignal(str)
-    conversion_finished = pyqtSignal(list)
+    conversion_finished = pyqtSignal(object)
     
-    def __init__(self, files, output_format, converter_options):
+    def __init__(self, files, output_format, converter_options, workers=GUI_WORKERS, mode="threads"):
         super().__init__()
         self.files = files
         self.output_format = output_format
         self.converter_options = converter_options
+        self.workers = workers
+        self.mode = mode
     
     def run(self):
         """Run conversion in background thread"""
-        converter = ImageFormatConverter(**self.converter_options)
-        results = []
-        
-        for i, file_path in enumerate(self.files):
-            self.status_message.emit(f"Converting: {os.path.basename(file_path)}")
-            
-            result = converter.convert(file_path, self.output_format)
-            results.append(result)
-            
-            progress = int((i + 1) / len(self.files) * 100)
-            self.progress_changed.emit(progress)
-        
-        self.conversion_finished.emit(results)
+        # converter_options is an immutable snapshot, so sidebar changes made
+        # during the run cannot affect files that are already converting
+        converter = ImageFormatConverter.from_options(self.converter_options)
+        stats = StatsAccumulator()
+        
+        results = converter.iter_convert(self.files, self.output_format, workers=self.workers, mode=self.mode)
+        for result in results:
+            stats.add(result)
+            self.status_message.emit(f"Converted: {os.path.basename(result.get('input_path', ''))}")
+            self.progress_changed.emit(int(stats.total_files / len(self.files) * 100))
+        
+        self.conversion_finished.emit(stats)
 
 
 class FileListWidget(QListWidget):
@@ -189,20 +197,13 @@ class CentralWidget(QWidget):
     def setup_default_options(self):
         """Setup default conversion options"""
         self.output_format = "webp"
-        self.converter_options = {
-            "quality": 90,
-            "max_size_kb": None,
-            "compression_percent": None,
-            "target_width": None,
-            "target_height": None,
-            "maintain_aspect_ratio": True
-        }
+        self.converter_options = ConverterOptions(quality=90)
     
     def browse_files(self):
         """Browse and select files"""
         files, _ = QFileDialog.getOpenFileNames(
             self, "Select Image Files", "",
-            "Image Files (*.png *.jpg *.jpeg *.webp *.avif *.bmp *.tiff *.gif)"
+            "Image Files (*.png *.jpg *.jpeg *.webp *.avif *.bmp *.tif *.tiff *.gif)"
         )
         if files:
             self.add_files(files)
@@ -227,13 +228,9 @@ class CentralWidget(QWidget):
     
     def add_folder(self, folder_path):
         """Add all images from folder"""
-        image_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.avif', '.bmp', '.tiff', '.gif')
-        files = []
-        
-        for root, _, filenames in os.walk(folder_path):
-            for filename in filenames:
-                if filename.lower().endswith(image_extensions):
-                    files.append(os.path.join(root, filename))
+        image_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.avif', '.bmp', '.tif', '.tiff', '.gif')
+        # Plain paths: the list widget only needs the path, not the cached stat
+        files = [str(path) for path in scan_folder(folder_path, image_extensions, recursive=True)]
         
         if files:
             self.add_files(files)
@@ -289,54 +286,41 @@ class CentralWidget(QWidget):
         self.conversion_thread.conversion_finished.connect(self.conversion_finished)
         self.conversion_thread.start()
     
-    def conversion_finished(self, results):
-        """Handle conversion completion"""
+    def conversion_finished(self, stats):
+        """Handle conversion completion
+        
+        :param stats: StatsAccumulator filled by the conversion thread
+        """
         self.progress_bar.setVisible(False)
         self.convert_btn.setEnabled(True)
         
         # Display results
-        successful = [r for r in results if r.get("success")]
-        failed = [r for r in results if not r.get("success")]
-        
         result_text = f"🎉 Conversion completed!\n"
-        result_text += f"✅ Successful: {len(successful)}\n"
-        result_text += f"❌ Failed: {len(failed)}\n\n"
-        
-        if successful:
-            # Phân loại files theo loại thay đổi
-            compressed_files = [r for r in successful if r.get("change_type") == "compressed"]
-            expanded_files = [r for r in successful if r.get("change_type") == "expanded"]
-            unchanged_files = [r for r in successful if r.get("change_type") == "unchanged"]
-            
-            total_original = sum(r["original_size"] for r in successful)
-            total_new = sum(r["new_size"] for r in successful)
-            
+        result_text += f"✅ Successful: {stats.successful}\n"
+        result_text += f"❌ Failed: {stats.failed}\n\n"
+        
+        if stats.successful:
             result_text += f"📊 SIZE STATISTICS:\n"
-            result_text += f"Original: {total_original / 1024:.2f} KB\n"
-            result_text += f"New: {total_new / 1024:.2f} KB\n\n"
+            result_text += f"Original: {stats.total_original_size / 1024:.2f} KB\n"
+            result_text += f"New: {stats.total_new_size / 1024:.2f} KB\n\n"
             
             # Hiển thị thông tin compression
-            if compressed_files:
-                total_saved = sum(r.get("space_change", 0) for r in compressed_files)
-                avg_compression = sum(r["compression_ratio"] for r in compressed_files) / len(compressed_files)
-                result_text += f"📉 Compressed: {len(compressed_files)} files\n"
-                result_text += f"💾 Saved: {total_saved / 1024:.2f} KB\n"
-                result_text += f"📊 Avg compression: {avg_compression:.2f}%\n\n"
+            if stats.compressed_files:
+                result_text += f"📉 Compressed: {stats.compressed_files} files\n"
+                result_text += f"💾 Saved: {stats.total_space_saved / 1024:.2f} KB\n"
+                result_text += f"📊 Avg compression: {stats.average_compression:.2f}%\n\n"
             
             # Hiển thị thông tin expansion
-            if expanded_files:
-                total_increased = sum(r.get("space_change", 0) for r in expanded_files)
-                result_text += f"📈 Expanded: {len(expanded_files)} files\n"
-                result_text += f"📈 Increased: {total_increased / 1024:.2f} KB\n\n"
+            if stats.expanded_files:
+                result_text += f"📈 Expanded: {stats.expanded_files} files\n"
+                result_text += f"📈 Increased: {stats.total_space_increased / 1024:.2f} KB\n\n"
             
             # Hiển thị files không thay đổi
-            if unchanged_files:
-                result_text += f"➡️ Unchanged: {len(unchanged_files)} files\n\n"
+            if stats.unchanged_files:
+                result_text += f"➡️ Unchanged: {stats.unchanged_files} files\n\n"
             
             # Tổng kết
-            total_saved = sum(r.get("space_change", 0) for r in compressed_files)
-            total_increased = sum(r.get("space_change", 0) for r in expanded_files)
-            net_change = total_saved - total_increased
+            net_change = stats.net_change
             
             result_text += f"📋 SUMMARY:\n"
             if net_change > 0:
@@ -345,11 +329,21 @@ class CentralWidget(QWidget):
                 result_text += f"⚠️ Net increased: {abs(net_change) / 1024:.2f} KB\n"
             else:
                 result_text += f"➡️ No net change\n"
-        
-        if failed:
+
+            # Thời gian từng giai đoạn (ms)
+            timing_rows = stats.timings.rows()
+            if timing_rows:
+                result_text += f"\n⏱️ STAGE TIMINGS (ms):\n"
+                for stage, summary in timing_rows:
+                    result_text += (f"{stage}: total {summary['total_ms']:.1f}, p50 {summary['p50']:.1f}, "
+                                    f"p90 {summary['p90']:.1f}, p99 {summary['p99']:.1f}\n")
+
+        if stats.failed_results:
             result_text += f"\n❌ FAILED FILES:\n"
-            for result in failed:
+            for result in stats.failed_results:
                 result_text += f"❌ {os.path.basename(result.get('input_path', 'Unknown'))}: {result.get('error', 'Unknown error')}\n"
+            if stats.omitted_failures:
+                result_text += f"... and {stats.omitted_failures} more\n"
         
         self.results_text.setText(result_text)
         self.status_message.emit("Conversion completed!")
@@ -362,18 +356,28 @@ class CentralWidget(QWidget):
     
     def set_quality(self, quality):
         """Set quality"""
-        self.converter_options["quality"] = quality
+        self.converter_options = self.converter_options.replace(quality=quality)
     
     def set_max_size(self, max_size_kb):
         """Set maximum size in KB"""
-        self.converter_options["max_size_kb"] = max_size_kb if max_size_kb > 0 else None
+        self.converter_options = self.converter_options.replace(
+            max_size_kb=max_size_kb if max_size_kb > 0 else None
+        )
     
     def set_compression(self, compression_percent):
         """Set compression percentage"""
-        self.converter_options["compression_percent"] = compression_percent if compression_percent > 0 else None
+        self.converter_options = self.converter_options.replace(
+            compression_percent=compression_percent if compression_percent > 0 else None
+        )
     
     def set_resize_options(self, width, height, maintain_aspect):
         """Set resize options"""
-        self.converter_options["target_width"] = width if width > 0 else None
-        self.converter_options["target_height"] = height if height > 0 else None
-        self.converter_options["maintain_aspect_ratio"] = maintain_aspect 
\ No newline at end of file
+        self.converter_options = self.converter_options.replace(
+            target_width=width if width > 0 else None,
+            target_height=height if height > 0 else None,
+            maintain_aspect_ratio=maintain_aspect
+        )
+    
+    def set_resample_tier(self, tier):
+        """Set resampling tier"""
+        self.converter_options = self.converter_options.replace(resample_tier=tier) 
\ No newline at end of file
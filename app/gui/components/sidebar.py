@@ -9,6 +9,9 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont
 
+from ...controller.presets import PRESETS
+from ...controller.resample import RESAMPLE_TIERS, DEFAULT_TIER
+
 
 class Sidebar(QWidget):
     """Sidebar widget containing conversion settings"""
@@ -19,6 +22,7 @@ class Sidebar(QWidget):
     max_size_changed = pyqtSignal(int)
     compression_changed = pyqtSignal(int)
     resize_changed = pyqtSignal(int, int, bool)
+    resample_changed = pyqtSignal(str)
     
     def __init__(self):
         super().__init__()
@@ -60,7 +64,7 @@ class Sidebar(QWidget):
         format_layout.setSpacing(10)
         
         self.format_combo = QComboBox()
-        self.format_combo.addItems(["webp", "jpeg", "png", "avif", "bmp", "tiff"])
+        self.format_combo.addItems(["webp", "jpeg", "png", "avif", "bmp", "tiff", "gif"])
         self.format_combo.setCurrentText("webp")
         format_layout.addWidget(self.format_combo)
         
@@ -189,6 +193,17 @@ class Sidebar(QWidget):
         self.aspect_check.setEnabled(False)
         resize_layout.addWidget(self.aspect_check)
         
+        # Resampling tier
+        resample_container = QHBoxLayout()
+        resample_container.addWidget(QLabel("Resampling:"))
+        self.resample_combo = QComboBox()
+        self.resample_combo.addItems(list(RESAMPLE_TIERS))
+        self.resample_combo.setCurrentText(DEFAULT_TIER)
+        self.resample_combo.setToolTip("fast: quickest, slightly softer\nbalanced: near-best quality, faster\nbest: full Lanczos")
+        self.resample_combo.setEnabled(False)
+        resample_container.addWidget(self.resample_combo)
+        resize_layout.addLayout(resample_container)
+        
         layout.addWidget(resize_group)
         
         # Presets Group
@@ -239,6 +254,7 @@ class Sidebar(QWidget):
         self.width_spin.valueChanged.connect(self.on_resize_changed)
         self.height_spin.valueChanged.connect(self.on_resize_changed)
         self.aspect_check.toggled.connect(self.on_resize_changed)
+        self.resample_combo.currentTextChanged.connect(self.resample_changed.emit)
         
     def on_quality_changed(self, value):
         """Handle quality change"""
@@ -264,6 +280,7 @@ class Sidebar(QWidget):
         self.width_spin.setEnabled(enabled)
         self.height_spin.setEnabled(enabled)
         self.aspect_check.setEnabled(enabled)
+        self.resample_combo.setEnabled(enabled)
         self.on_resize_changed()
         
     def on_resize_changed(self):
@@ -278,46 +295,40 @@ class Sidebar(QWidget):
             self.resize_changed.emit(0, 0, True)
     
     # Preset methods
+    def apply_preset(self, name):
+        """Apply a shared preset from app.controller.presets"""
+        preset = PRESETS[name]
+        self.format_combo.setCurrentText(preset["format"])
+        self.quality_slider.setValue(preset["quality"])
+        
+        self.max_size_check.setChecked(preset["max_size_kb"] is not None)
+        if preset["max_size_kb"] is not None:
+            self.max_size_spin.setValue(preset["max_size_kb"])
+        
+        self.compression_check.setChecked(preset["compression_percent"] is not None)
+        if preset["compression_percent"] is not None:
+            self.compression_spin.setValue(preset["compression_percent"])
+        
+        resize = preset["target_width"] is not None or preset["target_height"] is not None
+        self.resize_check.setChecked(resize)
+        if resize:
+            self.width_spin.setValue(preset["target_width"])
+            self.height_spin.setValue(preset["target_height"])
+            self.aspect_check.setChecked(preset["maintain_aspect_ratio"])
+        self.resample_combo.setCurrentText(preset["resample_tier"])
+    
     def preset_web(self):
         """Web optimized preset"""
-        self.format_combo.setCurrentText("webp")
-        self.quality_slider.setValue(85)
-        self.max_size_check.setChecked(True)
-        self.max_size_spin.setValue(500)
-        self.compression_check.setChecked(False)
-        self.resize_check.setChecked(True)
-        self.width_spin.setValue(1920)
-        self.height_spin.setValue(1080)
-        self.aspect_check.setChecked(True)
+        self.apply_preset("web")
         
     def preset_high_quality(self):
         """High quality preset"""
-        self.format_combo.setCurrentText("png")
-        self.quality_slider.setValue(95)
-        self.max_size_check.setChecked(False)
-        self.compression_check.setChecked(False)
-        self.resize_check.setChecked(False)
+        self.apply_preset("high_quality")
         
     def preset_small_size(self):
         """Small size preset"""
-        self.format_combo.setCurrentText("jpeg")
-        self.quality_slider.setValue(70)
-        self.max_size_check.setChecked(False)
-        self.compression_check.setChecked(True)
-        self.compression_spin.setValue(50)
-        self.resize_check.setChecked(True)
-        self.width_spin.setValue(800)
-        self.height_spin.setValue(600)
-        self.aspect_check.setChecked(True)
+        self.apply_preset("small_size")
         
     def preset_mobile(self):
         """Mobile ready preset"""
-        self.format_combo.setCurrentText("webp")
-        self.quality_slider.setValue(80)
-        self.max_size_check.setChecked(True)
-        self.max_size_spin.setValue(200)
-        self.compression_check.setChecked(False)
-        self.resize_check.setChecked(True)
-        self.width_spin.setValue(640)
-        self.height_spin.setValue(480)
-        self.aspect_check.setChecked(True) 
\ No newline at end of file
+        self.apply_preset("mobile")
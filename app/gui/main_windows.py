@@ -95,6 +95,7 @@ class MainWindow(QMainWindow):
         self.sidebar.max_size_changed.connect(self.central_widget.set_max_size)
         self.sidebar.compression_changed.connect(self.central_widget.set_compression)
         self.sidebar.resize_changed.connect(self.central_widget.set_resize_options)
+        self.sidebar.resample_changed.connect(self.central_widget.set_resample_tier)
         
         # Connect central widget signals to status bar
         self.central_widget.status_message.connect(self.status_bar.show_message)
@@ -0,0 +1,143 @@
+"""
+Benchmark suite entry point.
+
+    python -m benchmarks corpus                      # generate the synthetic corpus
+    python -m benchmarks run --save-baseline main    # time every scenario, store a baseline
+    python -m benchmarks run -o current.json
+    python -m benchmarks compare main current.json   # exit 1 on regressions
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from .compare import DEFAULT_THRESHOLD, compare_results
+from .corpus import DEFAULT_SEED, PROFILES, generate_corpus
+from .run import DEFAULT_REPEAT, OUTPUT_FORMATS, SIZE_MODES, BenchmarkError, build_scenarios, run_benchmarks
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_DIR = os.path.join(BENCHMARKS_DIR, "corpus")
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, "baselines")
+
+
+def parse_list(value):
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+
+def parse_workers(value):
+    try:
+        return [max(1, int(item)) for item in parse_list(value)]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid worker counts: {value!r} (e.g. 1,4)")
+
+
+def baseline_path(name_or_path):
+    """A baseline name (stored in benchmarks/baselines) or a path to a results file"""
+    if os.path.exists(name_or_path) or name_or_path.endswith(".json"):
+        return name_or_path
+    return os.path.join(BASELINES_DIR, f"{name_or_path}.json")
+
+
+def load_results(name_or_path):
+    with open(baseline_path(name_or_path), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_results(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="Corpus directory (default: benchmarks/corpus)")
+    parser.add_argument("--profile", choices=list(PROFILES), default="quick",
+                        help="Corpus profile: quick (seconds) or full (large photos, 67 MP TIFF)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Corpus seed (default: {DEFAULT_SEED})")
+    parser.add_argument("--kinds", type=parse_list,
+                        help="Only use these kinds: photo, graphic, alpha, icon, huge (default: all)")
+
+
+def print_report(rows, regressions, notes, threshold):
+    print(f"{'Scenario':<32} {'files/s':>17} {'speed':>8} {'size':>8}")
+    for row in rows:
+        files_per_second = f"{row['old_files_per_second']:.2f} -> {row['new_files_per_second']:.2f}"
+        flag = "  REGRESSION: " + ", ".join(row["problems"]) if row["problems"] else ""
+        print(f"{row['name']:<32} {files_per_second:>17} {row['speed_change']:>+7.1f}% {row['size_change']:>+7.1f}%{flag}")
+    for note in notes:
+        print(f"note: {note}")
+    print(f"{len(regressions)} regression(s) beyond {threshold:g}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Image converter benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    corpus_parser = commands.add_parser("corpus", help="Generate the deterministic synthetic corpus")
+    add_corpus_arguments(corpus_parser)
+
+    run_parser = commands.add_parser("run", help="Time every scenario over the corpus")
+    add_corpus_arguments(run_parser)
+    run_parser.add_argument("--formats", type=parse_list, default=list(OUTPUT_FORMATS),
+                            help="Output formats (default: all)")
+    run_parser.add_argument("--size-modes", type=parse_list, default=list(SIZE_MODES),
+                            help="Size modes: quality, max_size, compression (default: all)")
+    run_parser.add_argument("--presets", type=parse_list,
+                            help="Presets to time, the same ones as the GUI Quick Presets (default: all)")
+    run_parser.add_argument("--workers", type=parse_workers, help="Worker counts (default: 1 and CPU count)")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                            help=f"Runs per scenario, the median is kept (default: {DEFAULT_REPEAT})")
+    run_parser.add_argument("--backend", default="pillow", help="Converter backend (default: pillow)")
+    run_parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    run_parser.add_argument("--save-baseline", metavar="NAME", help="Store the results as benchmarks/baselines/NAME.json")
+    run_parser.add_argument("--compare", metavar="BASELINE", help="Compare with a baseline after running")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help=f"Regression threshold in percent (default: {DEFAULT_THRESHOLD:g})")
+
+    compare_parser = commands.add_parser("compare", help="Compare results with a baseline")
+    compare_parser.add_argument("baseline", help="Baseline name or results file")
+    compare_parser.add_argument("current", help="Results file (or baseline name) to check")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help=f"Regression threshold in percent (default: {DEFAULT_THRESHOLD:g})")
+
+    args = parser.parse_args()
+
+    if args.command == "corpus":
+        manifest = generate_corpus(args.corpus, args.profile, args.seed, args.kinds)
+        print(f"{len(manifest['files'])} files in {args.corpus} (digest {manifest['digest'][:12]})")
+        return
+
+    if args.command == "compare":
+        threshold = args.threshold
+        rows, regressions, notes = compare_results(load_results(args.baseline), load_results(args.current), threshold)
+        print_report(rows, regressions, notes, threshold)
+        sys.exit(1 if regressions else 0)
+
+    manifest = generate_corpus(args.corpus, args.profile, args.seed, args.kinds)
+    scenarios = build_scenarios(args.formats, args.size_modes, args.presets, args.workers, args.backend)
+
+    def progress(name, metrics):
+        print(f"{name:<32} {metrics['files_per_second']:>8.2f} files/s {metrics['megapixels_per_second']:>8.2f} MP/s "
+              f"{metrics['bytes_out'] / 1024:>10.1f} KB out")
+
+    try:
+        results = run_benchmarks(args.corpus, manifest, scenarios, args.repeat, args.kinds, progress)
+    except BenchmarkError as e:
+        sys.exit(f"error: {e}")
+
+    if args.output:
+        write_results(results, args.output)
+    if args.save_baseline:
+        write_results(results, baseline_path(args.save_baseline))
+        print(f"Baseline saved: {baseline_path(args.save_baseline)}")
+    if args.compare:
+        rows, regressions, notes = compare_results(load_results(args.compare), results, args.threshold)
+        print_report(rows, regressions, notes, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compare two benchmark result files and flag regressions beyond a threshold"""
+
+DEFAULT_THRESHOLD = 10.0
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare throughput and output size scenario by scenario
+    :param threshold: Allowed change in percent before a scenario counts as a regression
+    :return: (rows, regressions, notes) — rows are dicts per common scenario
+    """
+    notes = []
+    if baseline["corpus"]["digest"] != current["corpus"]["digest"]:
+        notes.append("corpus differs from the baseline (profile, seed or encoder output changed)")
+    if baseline["environment"] != current["environment"]:
+        notes.append("environment differs from the baseline: "
+                     + ", ".join(f"{key} {baseline['environment'].get(key)} -> {value}"
+                                 for key, value in current["environment"].items()
+                                 if baseline["environment"].get(key) != value))
+
+    rows = []
+    regressions = []
+    for name, old in baseline["scenarios"].items():
+        new = current["scenarios"].get(name)
+        if new is None:
+            continue
+        # A throughput drop or an output size increase beyond the threshold both count as regressions
+        speed_change = (new["files_per_second"] / old["files_per_second"] - 1) * 100
+        size_change = (new["bytes_out"] / old["bytes_out"] - 1) * 100 if old["bytes_out"] else 0.0
+        problems = []
+        if speed_change < -threshold:
+            problems.append(f"{-speed_change:.1f}% slower")
+        if size_change > threshold:
+            problems.append(f"{size_change:.1f}% larger output")
+
+        row = {"name": name, "speed_change": speed_change, "size_change": size_change, "problems": problems,
+               "old_files_per_second": old["files_per_second"], "new_files_per_second": new["files_per_second"]}
+        rows.append(row)
+        if problems:
+            regressions.append(row)
+
+    missing = sorted(set(baseline["scenarios"]) - set(current["scenarios"]))
+    if missing:
+        notes.append(f"{len(missing)} baseline scenarios were not run")
+    return rows, regressions, notes
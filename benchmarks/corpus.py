@@ -0,0 +1,183 @@
+"""
+Deterministic synthetic corpus for the benchmark suite.
+Every file is generated from a seeded random stream, so the same profile and seed
+produce the same pixels on every machine.
+"""
+
+import hashlib
+import json
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+CORPUS_VERSION = 1
+DEFAULT_SEED = 1234
+MANIFEST_NAME = "corpus.json"
+
+# kind -> (width, height, file format, count) for each profile
+PROFILES = {
+    "quick": {
+        "photo": (1600, 1067, "jpeg", 4),
+        "graphic": (1200, 800, "png", 3),
+        "alpha": (640, 640, "png", 3),
+        "icon": (48, 48, "png", 6),
+        "huge": (4096, 4096, "tiff", 1),
+    },
+    "full": {
+        "photo": (4000, 3000, "jpeg", 8),
+        "graphic": (2400, 1600, "png", 6),
+        "alpha": (1200, 1200, "png", 6),
+        "icon": (64, 64, "png", 20),
+        # Above TILED_MIN_PIXELS, so the strip-wise downscaling path is timed too
+        "huge": (8200, 8200, "tiff", 1),
+    },
+}
+EXTENSIONS = {"jpeg": "jpg", "png": "png", "tiff": "tif"}
+
+
+def _smooth_field(rng, size, mode="RGB"):
+    """Low-frequency colour field: a tiny random image upscaled with bicubic"""
+    bands = len(mode)
+    small = Image.frombytes(mode, (6, 4), rng.randbytes(6 * 4 * bands))
+    return small.resize(size, Image.Resampling.BICUBIC)
+
+
+def _noise(rng, size):
+    return Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+
+
+def _random_color(rng, alpha=None):
+    color = tuple(rng.randrange(256) for _ in range(3))
+    return color + (alpha,) if alpha is not None else color
+
+
+def make_photo(rng, size):
+    """Smooth gradients with sensor-like noise and a few soft objects"""
+    img = Image.blend(_smooth_field(rng, size), _noise(rng, size), 0.12)
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    for _ in range(6):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(min(size) // 20, min(size) // 5)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=_random_color(rng))
+    return img
+
+
+def make_graphic(rng, size):
+    """Flat colours, hard edges and text, like screenshots and diagrams"""
+    img = Image.new("RGB", size, (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    palette = [_random_color(rng) for _ in range(6)]
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(20, width // 3), y0 + rng.randrange(20, height // 3)
+        shape = draw.rectangle if rng.random() < 0.6 else draw.ellipse
+        shape((x0, y0, x1, y1), fill=rng.choice(palette), outline=(0, 0, 0))
+    for row in range(0, height, 40):
+        draw.text((10, row), f"Benchmark label {row}", fill=(0, 0, 0))
+    return img
+
+
+def make_alpha(rng, size):
+    """Transparent background with semi-transparent overlapping shapes"""
+    img = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img, "RGBA")
+    width, height = size
+    for _ in range(25):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(10, width // 2), y0 + rng.randrange(10, height // 2)
+        draw.ellipse((x0, y0, x1, y1), fill=_random_color(rng, rng.randrange(64, 256)))
+    return img
+
+
+def make_icon(rng, size):
+    img = make_alpha(rng, size)
+    ImageDraw.Draw(img).rectangle((0, 0, size[0] - 1, size[1] - 1), outline=_random_color(rng, 255))
+    return img
+
+
+def make_huge(rng, size):
+    """Gigapixel-style scan: smooth field plus a repeated noise tile (cheap to generate)"""
+    img = _smooth_field(rng, size)
+    tile = _noise(rng, (512, 512))
+    noise = Image.new("RGB", size)
+    for top in range(0, size[1], 512):
+        for left in range(0, size[0], 512):
+            noise.paste(tile, (left, top))
+    return Image.blend(img, noise, 0.1)
+
+
+GENERATORS = {
+    "photo": make_photo,
+    "graphic": make_graphic,
+    "alpha": make_alpha,
+    "icon": make_icon,
+    "huge": make_huge,
+}
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def generate_corpus(directory, profile="quick", seed=DEFAULT_SEED, kinds=None):
+    """
+    Generate the corpus in a directory, reusing files already generated with the same
+    profile and seed
+    :param kinds: Make sure these kinds exist (default: every kind of the profile)
+    :return: Manifest dict with one entry per file
+    """
+    previous = load_manifest(directory)
+    if not previous or (previous["version"], previous["profile"], previous["seed"]) != (CORPUS_VERSION, profile, seed):
+        previous = {"files": []}
+
+    existing = {}
+    for entry in previous["files"]:
+        existing.setdefault(entry["kind"], []).append(entry)
+
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for kind in sorted(set(kinds or PROFILES[profile]) | set(existing)):
+        entries = existing.get(kind)
+        if entries and all(os.path.exists(os.path.join(directory, entry["name"])) for entry in entries):
+            files.extend(entries)
+            continue
+
+        width, height, file_format, count = PROFILES[profile][kind]
+        for number in range(count):
+            # Each file has its own random stream: adding or removing a kind leaves the other files unchanged
+            rng = random.Random(f"{seed}:{kind}:{number}")
+            img = GENERATORS[kind](rng, (width, height))
+            name = f"{kind}_{number:02d}.{EXTENSIONS[file_format]}"
+            path = os.path.join(directory, name)
+            img.save(path, file_format.upper(), **({"quality": 90} if file_format == "jpeg" else {}))
+            files.append({
+                "name": name, "kind": kind, "width": width, "height": height,
+                "bytes": os.path.getsize(path), "sha256": _sha256(path),
+            })
+
+    manifest = {"version": CORPUS_VERSION, "profile": profile, "seed": seed,
+                "kinds": sorted({entry["kind"] for entry in files}), "digest": corpus_digest(files), "files": files}
+    with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def corpus_digest(files):
+    """Digest of a set of corpus files, changes when any pixel or encoder output changes"""
+    return hashlib.sha256("".join(entry["sha256"] for entry in files).encode("utf-8")).hexdigest()
+
+
+def load_manifest(directory):
+    """Corpus manifest of a directory, None if there is none"""
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,133 @@
+"""
+Time ImageFormatConverter over the synthetic corpus for every output format, size mode,
+preset and worker count, and report throughput (files/s, MP/s) and bytes written.
+"""
+
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+
+import PIL
+
+from app.controller.convert import ImageFormatConverter
+from app.controller.options import ConverterOptions
+from app.controller.presets import PRESETS
+
+from .corpus import corpus_digest
+
+RESULTS_VERSION = 1
+OUTPUT_FORMATS = ("jpeg", "png", "webp", "avif", "bmp", "tiff", "gif")
+# Size modes: options layered on top of the base options
+SIZE_MODES = {
+    "quality": {},
+    "max_size": {"max_size_kb": 100},
+    "compression": {"compression_percent": 50},
+}
+BASE_OPTIONS = {"quality": 85, "target_width": 1920, "target_height": 1920}
+DEFAULT_REPEAT = 3
+
+
+class BenchmarkError(RuntimeError):
+    """A corpus file failed to convert, so the timings would not cover the whole corpus"""
+
+
+def default_workers():
+    return sorted({1, os.cpu_count() or 1})
+
+
+def build_scenarios(formats=OUTPUT_FORMATS, size_modes=tuple(SIZE_MODES), presets=None,
+                    workers=None, backend="pillow"):
+    """
+    Scenario matrix: output format x size mode x workers, plus every preset x workers
+    :param presets: Preset names (default: all, the same presets as the GUI sidebar)
+    :return: List of (name, output format, ConverterOptions, workers)
+    """
+    if presets is None:
+        presets = list(PRESETS)
+    scenarios = []
+    for worker_count in workers or default_workers():
+        for fmt in formats:
+            for mode in size_modes:
+                options = ConverterOptions(backend=backend, **BASE_OPTIONS, **SIZE_MODES[mode])
+                scenarios.append((f"{fmt}/{mode}/w{worker_count}", fmt, options, worker_count))
+        for preset_name in presets:
+            preset = dict(PRESETS[preset_name])
+            fmt = preset.pop("format")
+            options = ConverterOptions(backend=backend, **preset)
+            scenarios.append((f"preset:{preset_name}/w{worker_count}", fmt, options, worker_count))
+    return scenarios
+
+
+def run_scenario(paths, megapixels, output_format, options, workers, repeat=DEFAULT_REPEAT, mode="auto"):
+    """
+    Convert the corpus `repeat` times and keep the median wall time
+    :return: Metrics dict for the scenario
+    :raises BenchmarkError: If any corpus file fails to convert
+    """
+    converter = ImageFormatConverter.from_options(options)
+    timings = []
+    bytes_out = 0
+
+    for _ in range(repeat):
+        output_folder = tempfile.mkdtemp(prefix="imageconverter-bench-")
+        try:
+            start = time.perf_counter()
+            results = converter.convert_multiple(paths, output_format, output_folder, workers=workers, mode=mode)
+            timings.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(output_folder, ignore_errors=True)
+        bytes_out = sum(result["new_size"] for result in results if result["success"])
+        failures = [result for result in results if not result["success"]]
+        if failures:
+            details = "; ".join(f"{os.path.basename(result['input_path'])}: {result.get('error')}"
+                                for result in failures)
+            raise BenchmarkError(f"{len(failures)} of {len(paths)} corpus files failed to convert ({details})")
+
+    seconds = statistics.median(timings)
+    return {
+        "seconds": seconds,
+        "files_per_second": len(paths) / seconds,
+        "megapixels_per_second": megapixels / seconds,
+        "bytes_out": bytes_out,
+        "files": len(paths),
+    }
+
+
+def run_benchmarks(corpus_dir, manifest, scenarios, repeat=DEFAULT_REPEAT, kinds=None, progress=None):
+    """
+    Run every scenario over the corpus
+    :param kinds: Only use corpus files of these kinds
+    :param progress: callable(name, metrics) called after each scenario
+    :return: Results dict (JSON serialisable), the format stored as a baseline
+    :raises BenchmarkError: If a corpus file fails to convert in any scenario
+    """
+    entries = [entry for entry in manifest["files"] if not kinds or entry["kind"] in kinds]
+    paths = [os.path.join(corpus_dir, entry["name"]) for entry in entries]
+    megapixels = sum(entry["width"] * entry["height"] for entry in entries) / 1e6
+
+    results = {}
+    for name, output_format, options, workers in scenarios:
+        try:
+            results[name] = run_scenario(paths, megapixels, output_format, options, workers, repeat)
+        except BenchmarkError as e:
+            raise BenchmarkError(f"{name}: {e}") from None
+        if progress is not None:
+            progress(name, results[name])
+
+    return {
+        "version": RESULTS_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "corpus": {"profile": manifest["profile"], "seed": manifest["seed"], "digest": corpus_digest(entries),
+                   "files": len(entries), "megapixels": megapixels},
+        "repeat": repeat,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scenarios": results,
+    }
@@ -8,15 +8,20 @@ Usage:
     CLI Mode: python main.py cli [options]
 """
 
+import os
 import sys
-import argparse
-from pathlib import Path
 
 # Add app to path
-sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 def main():
     """Main entry point for the application"""
+    # Required for worker processes in frozen (PyInstaller) executables; multiprocessing
+    # is only imported there so a plain CLI start stays fast
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    
     # Check if CLI mode is requested
     if len(sys.argv) > 1 and sys.argv[1] == 'cli':
         # Remove 'cli' from arguments and run CLI